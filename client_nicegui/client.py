@@ -1,44 +1,167 @@
-
 import websocket
 import atexit
 import asyncio
+import itertools
+import os
+import sys
+import threading
+from collections import OrderedDict, deque
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "webgpu"))
+from protocol import encode_message
 
 ws = websocket.create_connection("ws://localhost:8765")
 
+
+class Sender:
+    """Encodes and sends messages in background threads, such that the caller never waits for
+    serialization or network I/O.
+
+    Pending (not yet encoded) messages with the same key are coalesced, only the latest one is sent.
+    At most max_in_flight bytes of encoded messages wait for the network (the limit is exceeded by
+    at most one message), further messages stay pending and are coalesced meanwhile."""
+
+    def __init__(self, ws, max_in_flight=64 * 1024 * 1024):
+        self.ws = ws
+        self.max_in_flight = max_in_flight
+        self._pending = OrderedDict()  # key -> function returning the encoded message
+        self._frames = deque()
+        self._in_flight = 0
+        self._busy = 0  # messages taken from pending but not sent yet
+        self._error = None
+        self._unique_keys = itertools.count()
+        self._condition = threading.Condition()
+        threading.Thread(target=self._encode_loop, daemon=True).start()
+        threading.Thread(target=self._send_loop, daemon=True).start()
+
+    def submit(self, key, encode):
+        """Queue a message, encode() is called in the encoder thread and returns the binary frame.
+        A pending message with the same key is replaced (key None: never coalesced)."""
+        with self._condition:
+            self._raise_error()
+            if key is None:
+                key = ("unique", next(self._unique_keys))
+            self._pending[key] = encode
+            self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Wait until all queued messages are sent, returns False on timeout"""
+        with self._condition:
+            done = self._condition.wait_for(
+                lambda: self._error is not None
+                or not (self._pending or self._frames or self._busy),
+                timeout,
+            )
+            self._raise_error()
+            return done
+
+    async def flush_async(self, timeout=None):
+        """Awaitable version of flush"""
+        return await asyncio.to_thread(self.flush, timeout)
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("sending message failed") from error
+
+    def _encode_loop(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._pending and self._in_flight < self.max_in_flight
+                )
+                _, encode = self._pending.popitem(last=False)
+                self._busy += 1
+            try:
+                frame = encode()
+            except Exception as e:
+                with self._condition:
+                    self._error = e
+                    self._busy -= 1
+                    self._condition.notify_all()
+                continue
+            with self._condition:
+                self._frames.append(frame)
+                self._in_flight += len(frame)
+                self._condition.notify_all()
+
+    def _send_loop(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._frames)
+                frame = self._frames.popleft()
+            try:
+                self.ws.send(frame, opcode=websocket.ABNF.OPCODE_BINARY)
+            except Exception as e:
+                with self._condition:
+                    self._error = e
+            with self._condition:
+                self._in_flight -= len(frame)
+                self._busy -= 1
+                self._condition.notify_all()
+
+
+sender = Sender(ws)
+
+
 @atexit.register
 def close():
+    sender.flush(timeout=10)
     ws.close()
     
 from ngsolve import *
-import base64, pickle, json
+import pickle
+
+
+def _snapshot(gf):
+    # the caller may continue to modify gf while the message is encoded
+    copy = GridFunction(gf.space, name=gf.name)
+    copy.vec.data = gf.vec
+    return copy
+
 
-def Draw(obj1, *args, name=None, **kwargs):
+def _encode(message_type, data, objects):
+    # objects are pickled here (in the encoder thread) unless they were already pickled by Draw
+    return encode_message(
+        message_type,
+        data,
+        {name: obj if isinstance(obj, bytes) else pickle.dumps(obj) for name, obj in objects.items()},
+    )
+
+
+def Draw(obj1, *args, name=None, update=False, **kwargs):
+    """Draw a mesh or function in the NiceGUI app. With update=True the function values of the
+    already drawn function with the same name (and mesh) are replaced in place, e.g. for time stepping.
+
+    Returns immediately, the message is encoded and sent in the background (see Sender).
+    Unsent messages for the same name are dropped in favour of the latest one (unnamed objects are never dropped),
+    use Flush to wait until everything is sent."""
     data = {}
     if isinstance(obj1, Mesh):
-        d = pickle.dumps(obj1)
-        data["type"] = "draw_mesh"
-        
-        data["data"] = { "mesh" : base64.b64encode(d).decode("utf-8") }
-        if name is not None:
-            data["data"]["name"] = name
+        message_type = "draw_mesh"
+        key = None if name is None else ("mesh", name)
+        objects = { "mesh" : obj1 }
     elif isinstance(obj1, GridFunction):
-        print("draw gf")
-        d = pickle.dumps(obj1)
-        data["type"] = "draw_cf"
-        data["data"] = { "cf" : base64.b64encode(d).decode("utf-8") }
-        if name is not None:
-            data["data"]["name"] = name
+        message_type = "update_values" if update else "draw_cf"
+        key = None if name is None else ("cf", name)
+        objects = { "objects" : { "cf" : _snapshot(obj1), "mesh" : obj1.space.mesh } }
     elif isinstance(obj1, CoefficientFunction):
-        print("draw cf")
         assert "mesh" in kwargs or len(args) > 0 and isinstance(args[0], Mesh)
         mesh = kwargs["mesh"] if "mesh" in kwargs else args[0]
-        d = pickle.dumps({ "cf" : obj1, "mesh" : mesh })
-        data["type"] = "draw_cf"
-        data["data"] = { "objects" : base64.b64encode(d).decode("utf-8"),
-                        "name" : name }
+        message_type = "update_values" if update else "draw_cf"
+        key = None if name is None else ("cf", name)
+        # pickled now, the expression may contain GridFunctions the caller continues to modify
+        objects = { "objects" : pickle.dumps({ "cf" : obj1, "mesh" : mesh }) }
     else:
         raise ValueError("Unknown object type")
-    ws.send(json.dumps(data))
+    if name is not None:
+        data["name"] = name
+    sender.submit(key, lambda: _encode(message_type, data, objects))
+
+
+def Flush(timeout=None):
+    """Wait until all drawn objects are sent"""
+    return sender.flush(timeout)
 
 two = False
 m = Mesh(unit_square.GenerateMesh(maxh=0.2 if two else 0.1))
@@ -9,12 +9,17 @@ const files = [
   "input_handler.py",
   "main.py",
   "mesh.py",
+  "profiler.py",
+  "render_data.py",
+  "scene.py",
+  "scheduler.py",
   "shader.wgsl",
   "uniforms.py",
   "utils.py",
+  "wgsl.py",
 ];
 
-async function reload() {
+async function reload(ngsolve_ready) {
   try {
     pyodide.FS.mkdir("webgpu");
   } catch {}
@@ -25,13 +30,16 @@ async function reload() {
 
     pyodide.FS.writeFile("webgpu/" + file, data);
   }
+  webgpu_mark("webgpu");
+  // the example in webgpu.main evaluates the function on the client
+  await ngsolve_ready;
   await pyodide.runPythonAsync(
     "import webgpu.main; await webgpu.main.reload();",
   );
 }
 
 async function main() {
-  console.log("loading pyodide", performance.now());
+  webgpu_mark("start");
   // const blob = await (await fetch("./pyodide/snapshot.bin")).blob();
   // const decompressor = new DecompressionStream('gzip');
   // const stream = blob.stream().pipeThrough(decompressor);
@@ -43,10 +51,13 @@ async function main() {
   });
 
   pyodide.setDebug(true);
-  console.log("loaded pyodide", performance.now());
-  console.log(pyodide);
-  await pyodide.loadPackage(["netgen", "ngsolve", "packaging", "numpy"]);
-  console.log("loaded netgen", performance.now());
+  webgpu_mark("pyodide");
+  await pyodide.loadPackage(["packaging", "numpy"]);
+  webgpu_mark("packages");
+  // load ngsolve while the package files are fetched
+  const ngsolve_ready = pyodide
+    .loadPackage(["netgen", "ngsolve"])
+    .then(() => webgpu_mark("ngsolve"));
 
   try {
     const socket = new WebSocket("ws://localhost:6789");
@@ -55,11 +66,11 @@ async function main() {
     });
     socket.addEventListener("message", function (event) {
       console.log("Message from server ", event.data);
-      reload();
+      reload(ngsolve_ready);
     });
   } catch {
     console.log("WebSocket connection failed");
   }
-  reload();
+  reload(ngsolve_ready);
 }
 main();
@@ -2,6 +2,7 @@
 from nicegui.element import Element
 from webgpu_scene import WebGPUScene
 from nicegui import app, ui
+import asyncio
 import ngsolve as ngs
 import numpy as np
 
@@ -9,9 +10,13 @@ import numpy as np
 app.add_static_files("/pyodide", "../pyodide")
 app.add_static_files("/webgpu", "../webgpu")
 ui.add_head_html('<script type="text/javascript" src="./pyodide/pyodide.js"></script>')
+ui.add_head_html('<script type="text/javascript" src="./webgpu/timings.js"></script>')
 
 
 class GUI(Element):
+    # polynomial order of the drawn function values
+    order = 2
+
     def __init__(self):
         with ui.row():
             self.scene = WebGPUScene(width=800, height=600)
@@ -28,78 +33,155 @@ class GUI(Element):
                         }
         self.last_object = { "Geometry" : None, "Mesh" : None, "Solution" : None }
         
-    def select_obj_type(self, event):
+    async def select_obj_type(self, event):
         print(event)
         obj_type = event.args[1]["label"]
         self.selector.set_options(list(self.objects[obj_type].keys()))
         if self.selector.value not in self.objects[obj_type]:
             self.selector.set_value(self.last_object[obj_type])
-            self.select_object(self.last_object[obj_type])
+            await self.select_object(self.last_object[obj_type])
             
         
 
-    def register_handlers(self, message_handlers):
+    def register_handlers(self, message_handlers, executor=None):
         self._message_handlers = message_handlers
         self._message_handlers["draw_mesh"] = self.add_mesh
         self._message_handlers["draw_cf"] = self.add_cf
-        
-    def select_object(self, value):
+        self._message_handlers["update_values"] = self.update_values
+        # evaluations for UI events (and messages encoded again by the scene) run in the executor of the message handlers as well
+        self._executor = executor
+        self.scene.executor = executor
+
+    async def select_object(self, value):
         name = value if isinstance(value, str) else value.args["label"]
-        self.last_object[self.obj_type.value] = name
-        if self.obj_type.value == "Solution":
-            self._draw_cf(**self.cfs[name])
+        if name is None:
+            return
+        obj_type = self.obj_type.value
+        self.last_object[obj_type] = name
+        loop = asyncio.get_running_loop()
+        if obj_type == "Solution":
+            objects = self.cfs[name]
+            message = await loop.run_in_executor(
+                self._executor, self._encode_cf, objects["cf"], objects["mesh"]
+            )
         else:
-            self._draw_mesh(self.meshes[name])
+            message = await loop.run_in_executor(self._executor, self._encode_mesh, self.meshes[name])
+        # the user may have selected another object meanwhile
+        if self.obj_type.value == obj_type and self.last_object[obj_type] == name:
+            if obj_type != "Solution":
+                self.obj_type.set_value("Mesh")
+            self.scene.send(message)
+
+    # The message handlers (add_mesh, add_cf, update_values) run in a worker thread (see handle_connect in main.py),
+    # they do the expensive work and return a function which updates the UI on the event loop
+    # (it may return an awaitable, the next message is applied after it is done).
 
     def add_mesh(self, data):
         import pickle
         import ngsolve as ngs
-        import base64
-
-        mesh = pickle.loads(base64.b64decode(data["mesh"].encode("utf-8")))
-        name = data["name"] if "name" in data else "mesh" + str(len(self.meshes)+1)
-        self.meshes[name] = mesh
-        if name not in self.selector.options:
-            self.selector.set_options(list(self.meshes.keys()))
-        self.last_object["Mesh"] = name
-        self.selector.set_value(name)
-        self._draw_mesh(mesh)
-        
-    def _draw_mesh(self, mesh):
+
+        mesh = pickle.loads(data["mesh"])
+        message = self._encode_mesh(mesh)
+
+        def apply():
+            name = data["name"] if "name" in data else "mesh" + str(len(self.meshes)+1)
+            self.meshes[name] = mesh
+            if name not in self.selector.options:
+                self.selector.set_options(list(self.meshes.keys()))
+            self.last_object["Mesh"] = name
+            self.selector.set_value(name)
+            self.obj_type.set_value("Mesh")
+            self.scene.send(message)
+
+        return apply
+
+    def _encode_mesh(self, mesh):
         import sys
         sys.path.append("../webgpu")
         from render_data import create_mesh_data
-        self.obj_type.set_value("Mesh")
         data = create_mesh_data(mesh)
-        self.scene.draw_mesh(data)
-        
+        return self.scene.encode_draw_mesh(data)
+
     def add_cf(self, data):
         print("in add cf")
         import pickle
         import ngsolve as ngs
-        import base64
 
-        objects = pickle.loads(base64.b64decode(data["objects"].encode("utf-8")))
-        name = data["name"]
+        objects = pickle.loads(data["objects"])
+        objects["mesh_key"] = self._mesh_key(objects["mesh"])
+        message = self._encode_cf(objects["cf"], objects["mesh"])
+
+        def apply():
+            self._show_cf(data.get("name"), objects, message)
+
+        return apply
+
+    def _show_cf(self, name, objects, message):
+        if name is None:
+            name = "cf" + str(len(self.cfs) + 1)
         self.cfs[name] = objects
         self._change_obj_type("Solution")
         self.selector.set_value(name)
         self.last_object["Solution"] = name
-        self._draw_cf(objects["cf"], objects["mesh"])
-        
+        self.scene.send(message)
+
     def _change_obj_type(self, value):
         print("change obj types = ", value)
         print("current value = ")
         self.obj_type.set_value(value)
         print("selector options = ", self.objects[value].keys())
         self.selector.set_options(list(self.objects[value].keys()))
-                
-    def _draw_cf(self, cf, mesh):
+
+    def _encode_cf(self, cf, mesh):
         import sys
         sys.path.append("../webgpu")
         from render_data import create_cf_data
-        data = create_cf_data(cf, mesh, order=2)
-        self.scene.draw_cf(data)
+        data = create_cf_data(cf, mesh, order=self.order, workers=None)
+        return self.scene.encode_draw_cf(data)
+
+    def _mesh_key(self, mesh):
+        # every message unpickles a new mesh object, compare meshes by content (computed in the worker thread,
+        # memoized for the mesh object, create_cf_data uses it as well)
+        import sys
+        sys.path.append("../webgpu")
+        from render_data import geometry_cache
+        return geometry_cache.content_key(mesh)
 
+    def _is_shown(self, name, mesh_key):
+        current = self.cfs.get(name)
+        return (
+            current is not None
+            and self.obj_type.value == "Solution"
+            and self.selector.value == name
+            and current["mesh_key"] == mesh_key
+        )
 
-        
+    def update_values(self, data):
+        """Replace the function values of the currently drawn function (same name and mesh) without rebuilding the scene,
+        otherwise draw it like add_cf"""
+        import pickle
+        import sys
+        sys.path.append("../webgpu")
+        from render_data import create_cf_data
+
+        objects = pickle.loads(data["objects"])
+        objects["mesh_key"] = self._mesh_key(objects["mesh"])
+        name = data.get("name")
+        # the UI state is only read on the event loop (in apply), the values message is prepared here
+        # for the common case of a function which is shown already
+        cf_data = create_cf_data(objects["cf"], objects["mesh"], order=self.order, workers=None)
+        values_message = self.scene.encode_update_values(cf_data["cf"])
+
+        def apply():
+            if self._is_shown(name, objects["mesh_key"]):
+                self.cfs[name] = objects
+                self.scene.send(values_message)
+            else:
+                return self._draw_cf_data(name, objects, cf_data)
+
+        return apply
+
+    async def _draw_cf_data(self, name, objects, cf_data):
+        loop = asyncio.get_running_loop()
+        message = await loop.run_in_executor(self._executor, self.scene.encode_draw_cf, cf_data)
+        self._show_cf(name, objects, message)
@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
 
 from typing import Set
+from concurrent.futures import ThreadPoolExecutor
 import asyncio
-import json
+import inspect
+import itertools
+import logging
+import sys
+import time
 
 from nicegui import app, ui
 from nicegui.element import Element
@@ -12,18 +17,117 @@ from websockets.server import WebSocketServerProtocol
 
 import gui
 
+sys.path.append("../webgpu")
+from protocol import decode_header, decode_message
+
+logger = logging.getLogger(__name__)
 
 CONNECTIONS: Set[WebSocketServerProtocol] = set()
+# handlers are called in a worker thread with the message data, if they return a function
+# it is called on the event loop afterwards (to update the UI)
 message_handlers : dict[str, callable] = {}
+executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="message_handler")
+
+# messages for the same object supersede each other (draw_cf and update_values for the same name)
+_object_kind = {"draw_mesh": "mesh", "draw_cf": "cf", "update_values": "cf"}
+_generations: dict = {}
+_running: dict = {}
+_unique_keys = itertools.count()
+_tasks = set()
+# set when the last dispatched message is applied (or dropped), results are applied in the order of the messages
+_last_dispatch = None
+
+metrics = {
+    "queue_depth": 0,
+    "max_queue_depth": 0,
+    "handled": 0,
+    "superseded": 0,
+    "errors": 0,
+    "latency_total": 0.0,
+    "latency_max": 0.0,
+}
+
+
+def _get_key(message_type, data):
+    # unnamed objects never supersede each other
+    if data.get("name") is None:
+        return ("unique", next(_unique_keys))
+    return (_object_kind.get(message_type, message_type), data.get("name"))
+
+
+def _handle(handler, message):
+    _, data, arrays = decode_message(message)
+    return handler(data | arrays)
+
+
+async def _dispatch(message_type, key, message, t_received):
+    global _last_dispatch
+    generation = _generations[key] = _generations.get(key, 0) + 1
+    if key in _running:
+        # cancels the older message if its handler did not start yet, otherwise its result is discarded below
+        _running[key].cancel()
+
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(executor, _handle, message_handlers[message_type], message)
+    _running[key] = future
+    previous, done = _last_dispatch, loop.create_future()
+    _last_dispatch = done
+    metrics["queue_depth"] += 1
+    metrics["max_queue_depth"] = max(metrics["max_queue_depth"], metrics["queue_depth"])
+    try:
+        apply = await future
+        # handlers of different objects finish in any order, apply their results in the order of the messages
+        if previous is not None:
+            await previous
+        if _generations[key] != generation:
+            metrics["superseded"] += 1
+            return
+        if callable(apply):
+            result = apply()
+            if inspect.isawaitable(result):
+                await result
+        latency = time.perf_counter() - t_received
+        metrics["handled"] += 1
+        metrics["latency_total"] += latency
+        metrics["latency_max"] = max(metrics["latency_max"], latency)
+        logger.debug(
+            "%s %s: %.1f ms, queue depth %d", message_type, key[1], 1000 * latency, metrics["queue_depth"]
+        )
+    except asyncio.CancelledError:
+        metrics["superseded"] += 1
+    except Exception:
+        metrics["errors"] += 1
+        logger.exception("handling %s message for %s failed", message_type, key[1])
+    finally:
+        metrics["queue_depth"] -= 1
+        if _running.get(key) is future:
+            del _running[key]
+        if previous is None or previous.done():
+            done.set_result(None)
+        else:
+            previous.add_done_callback(lambda _: done.set_result(None))
+
+
+def get_metrics():
+    """Handler metrics, latency is measured from receiving the message until the UI is updated"""
+    handled = metrics["handled"]
+    return metrics | {"latency_mean": metrics["latency_total"] / handled if handled else 0.0}
+
 
 async def handle_connect(websocket: WebSocketServerProtocol):
-    """Register the new websocket connection, handle incoming messages and remove the connection when it is closed."""
+    """Register the new websocket connection, handle incoming messages and remove the connection when it is closed.
+    The handlers run in the executor, such that the event loop (and the UI) stays responsive."""
     try:
         CONNECTIONS.add(websocket)
-        async for data in websocket:
-            data = json.loads(data)
-            if data["type"] in message_handlers:
-                message_handlers[data["type"]](data["data"])
+        async for message in websocket:
+            t_received = time.perf_counter()
+            # only the header is decoded here, the arrays are decoded in the worker thread
+            message_type, data, _ = decode_header(message)
+            if message_type in message_handlers:
+                key = _get_key(message_type, data)
+                task = asyncio.create_task(_dispatch(message_type, key, message, t_received))
+                _tasks.add(task)
+                task.add_done_callback(_tasks.discard)
     finally:
         CONNECTIONS.remove(websocket)
 
@@ -34,7 +138,7 @@ async def start_websocket_server():
 app.on_startup(start_websocket_server)
 
 g = gui.GUI()
-g.register_handlers(message_handlers)
+g.register_handlers(message_handlers, executor)
 
 ui.run()
 
@@ -46,7 +150,6 @@ ui.run()
 
 
 def draw_function(expr):
-    import js
     import ngsolve as ngs
     import webgpu.main
     import webgpu.mesh
@@ -61,6 +164,6 @@ def draw_function(expr):
         gpu.device, cf, region, order
     )
     mesh_object = webgpu.mesh.MeshRenderObject(gpu, buffers, n_trigs)
+    webgpu.main.scene.replace(webgpu.main.mesh_object, mesh_object)
     webgpu.main.mesh_object = mesh_object
-    js.requestAnimationFrame(webgpu.main.render_function)
 
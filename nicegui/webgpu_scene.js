@@ -12,8 +12,11 @@ export default {
     canvas.width = this.width;
     canvas.height = this.height;
     console.log("mounted");
-    main();
+    webgpu_ready = main();
     this.is_initialized = false;
+    // draws are applied in the order of the messages (see draw)
+    this._last_draw = Promise.resolve();
+    this.$emit("init");
   },
 
   beforeDestroy() {
@@ -44,17 +47,40 @@ export default {
     },
 
     async run_user_function(data) {
+      // user functions evaluate on the client and need ngsolve
+      await load_ngsolve();
       const user_function = pyodide.runPython(
         "import webgpu.main; webgpu.main.user_function",
       );
       await user_function(data);
     },
-      async draw(data) {
-          const func_name = data['run_function'];
-        const draw_mesh = pyodide.runPython(
-            func_name
-        );
-        await draw_mesh('canvas', data);
+    draw(data) {
+      // binary message (see webgpu/protocol.py), passed as ArrayBuffer without copying
+      // codecs that webgpu/pyodide_code.py can decode (see webgpu/protocol.py), negotiated per fetch
+      const frame = fetch(data.url, {
+        headers: { "X-WebGPU-Compression": "shuffle-zlib" },
+      }).then((response) => {
+        if (!response.ok) {
+          // expired or dropped on the server, a newer message follows
+          console.warn(`webgpu: frame ${data.url} not available (${response.status})`);
+          return null;
+        }
+        return response.arrayBuffer();
+      });
+      // frames are downloaded concurrently, but applied in the order they were sent,
+      // such that a smaller, later frame cannot be overwritten by an older one
+      this._last_draw = this._last_draw
+        .then(async () => {
+          const buffer = await frame;
+          if (buffer === null) return;
+          await webgpu_ready;
+          const draw_func = pyodide.runPython(data.run_function);
+          // content hashes of the GPU buffers stored in (or evicted from) the browser
+          const changes = await draw_func("canvas", buffer);
+          if (changes) this.$emit("buffers", changes);
+        })
+        .catch((error) => console.error("webgpu: draw failed", error));
+      return this._last_draw;
     },
   },
 
@@ -67,6 +93,8 @@ export default {
 };
 
 let pyodide = null;
+let webgpu_ready = null;
+let ngsolve_ready = null;
 console.log("load init_webgpu.js");
 
 const files = [
@@ -78,9 +106,15 @@ const files = [
   "input_handler.py",
   "main.py",
   "mesh.py",
+  "profiler.py",
+  "protocol.py",
+  "render_data.py",
+  "scene.py",
+  "scheduler.py",
   "shader.wgsl",
   "uniforms.py",
   "utils.py",
+  "wgsl.py",
   "pyodide_code.py",
 ];
 
@@ -95,13 +129,23 @@ async function reload() {
 
     pyodide.FS.writeFile("webgpu/" + file, data);
   }
-  await pyodide.runPythonAsync(
-    "import webgpu.main; await webgpu.main.reload();",
-  );
+  // only the modules needed to draw precomputed buffers (no ngsolve)
+  await pyodide.runPythonAsync("import webgpu.pyodide_code");
+  webgpu_mark("webgpu");
+}
+
+async function load_ngsolve() {
+  await webgpu_ready;
+  if (ngsolve_ready === null) {
+    ngsolve_ready = pyodide
+      .loadPackage(["netgen", "ngsolve"])
+      .then(() => webgpu_mark("ngsolve"));
+  }
+  await ngsolve_ready;
 }
 
 async function main() {
-  console.log("loading pyodide", performance.now());
+  webgpu_mark("start");
   // const blob = await (await fetch("./pyodide/snapshot.bin")).blob();
   // const decompressor = new DecompressionStream('gzip');
   // const stream = blob.stream().pipeThrough(decompressor);
@@ -113,15 +157,10 @@ async function main() {
   });
 
   pyodide.setDebug(true);
-  console.log("loaded pyodide", performance.now());
-  console.log(pyodide);
-  await pyodide.loadPackage([
-    "netgen",
-    "ngsolve",
-    "packaging",
-    "numpy",
-  ]);
-  console.log("loaded netgen", performance.now());
+  webgpu_mark("pyodide");
+  // netgen/ngsolve are only needed for evaluations on the client, see load_ngsolve
+  await pyodide.loadPackage(["packaging", "numpy"]);
+  webgpu_mark("packages");
 
   //try {
   //  const socket = new WebSocket("ws://localhost:6789");
@@ -135,5 +174,5 @@ async function main() {
   //} catch {
   //  console.log("WebSocket connection failed");
   //}
-  reload();
+  await reload();
 }
@@ -12,10 +12,76 @@ from nicegui.events import (
 import asyncio
 import base64
 import marshal
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+import numpy as np
+from fastapi import Header, Response
+from nicegui import app
 from typing_extensions import Self
 
-def to_js(val):
-    return base64.b64encode(val).decode("utf-8")
+sys.path.append("../webgpu")
+from protocol import COMPRESSION_NONE, COMPRESSION_SHUFFLE_ZLIB, encode_message
+
+# encoded binary messages waiting to be fetched by the browser,
+# key -> (client id, time stored, frame, codec of the frame, function returning the uncompressed frame).
+# Frames stay available for FRAME_TTL seconds (all browsers showing a shared page fetch the same frame),
+# the oldest frames are dropped earlier if all frames together exceed MAX_FRAME_BYTES
+FRAME_TTL = 30.0
+MAX_FRAME_BYTES = 1024**3
+_frames: "OrderedDict[str, tuple]" = OrderedDict()
+_frames_nbytes = 0
+
+
+def _drop_frame(key):
+    global _frames_nbytes
+    _frames_nbytes -= len(_frames.pop(key)[2])
+
+
+def _store_frame(client_id, frame, codec=COMPRESSION_NONE, encode_uncompressed=None):
+    global _frames_nbytes
+    now = time.monotonic()
+    while _frames and (
+        next(iter(_frames.values()))[1] < now - FRAME_TTL
+        or _frames_nbytes + len(frame) > MAX_FRAME_BYTES
+    ):
+        _drop_frame(next(iter(_frames)))
+    key = uuid.uuid4().hex
+    _frames[key] = (client_id, now, frame, codec, encode_uncompressed)
+    _frames_nbytes += len(frame)
+    return key
+
+
+def _drop_client_frames(client):
+    for key, entry in list(_frames.items()):
+        if entry[0] == client.id:
+            _drop_frame(key)
+
+
+app.on_disconnect(_drop_client_frames)
+
+
+@app.get("/_webgpu_scene/frame/{key}")
+def _get_frame(key: str, x_webgpu_compression: str = Header("")):
+    # the codecs are negotiated per fetch (per browser connection): the request header lists the codecs
+    # the browser can decode, frames with other codecs are encoded again without compression
+    entry = _frames.get(key)
+    if entry is None or entry[1] < time.monotonic() - FRAME_TTL:
+        # expired, superseded by newer frames or the client disconnected
+        return Response(status_code=404)
+    _, _, frame, codec, encode_uncompressed = entry
+    if codec != COMPRESSION_NONE and codec not in x_webgpu_compression.split(","):
+        frame = encode_uncompressed()
+    return Response(content=memoryview(frame), media_type="application/octet-stream")
+
+
+def _values_order(values):
+    # polynomial order of function values (see render_data.evaluate_cf), the shader in the browser
+    # is compiled for orders up to this one. The second header entry is order + 256 * format, 0 for adaptive orders
+    return int(np.frombuffer(values, dtype=np.float32, count=2)[1]) & 0xFF
+
 
 class WebGPUScene(
     Element,
@@ -35,14 +101,18 @@ class WebGPUScene(
         on_drag_start: Optional[Handler[SceneDragEventArguments]] = None,
         on_drag_end: Optional[Handler[SceneDragEventArguments]] = None,
         background_color: str = "#eee",
+        compression: bool = True,
     ) -> None:
-        """Webgpu scene."""
+        """Webgpu scene.
+
+        :param compression: compress large buffers for browsers that support it (negotiated per fetch)
+        """
         super().__init__()
         self._props["width"] = width
         self._props["height"] = height
         self._props["background_color"] = background_color
 
-        self.on("init", self._handle_init)
+        self.on("buffers", self._handle_buffers)
         self.on("click3d", self._handle_click)
         self.on("dragstart", self._handle_drag)
         self.on("dragend", self._handle_drag)
@@ -50,6 +120,18 @@ class WebGPUScene(
         self._drag_start_handlers = [on_drag_start] if on_drag_start else []
         self._drag_end_handlers = [on_drag_end] if on_drag_end else []
         self.python_expression = ""
+        # preferred codec, browsers that cannot decode it get uncompressed frames (see _get_frame)
+        self.compression = COMPRESSION_SHUFFLE_ZLIB if compression else COMPRESSION_NONE
+        self.transfer_stats = {}
+        # content hashes of the buffers stored in the browser, sections with these hashes are not sent again.
+        # Updated on the event loop and read by the encoders in worker threads, guarded by _client_hashes_lock.
+        # This assumes one browser per scene: on shared pages (auto-index page, client.shared) all browsers
+        # see the same scene but have separate buffer stores, there all data is sent with every message
+        self._client_hashes = set()
+        self._client_hashes_lock = threading.Lock()
+        self._resend = None
+        # executor for encoding messages again (see _handle_buffers), None: default executor of the event loop
+        self.executor = None
 
     def on_click(self, callback: Handler[SceneClickEventArguments]) -> Self:
         """Add a callback to be invoked when a 3D object is clicked."""
@@ -71,9 +153,6 @@ class WebGPUScene(
         super().__enter__()
         return self
 
-    def _handle_init(self, e: GenericEventArguments) -> None:
-        pass
-
     async def initialized(self) -> None:
         """Wait until the scene is initialized."""
         event = asyncio.Event()
@@ -125,16 +204,113 @@ class WebGPUScene(
         data = [func, code]
         self.run_method("run_user_function", data)
 
+    def _uses_references(self):
+        return not self.client.shared
+
+    async def _handle_buffers(self, e: GenericEventArguments) -> None:
+        if not self._uses_references():
+            return
+        with self._client_hashes_lock:
+            if e.args["reset"]:
+                self._client_hashes.clear()
+            self._client_hashes.update(e.args["added"])
+            self._client_hashes.difference_update(e.args["removed"])
+            self._client_hashes.difference_update(e.args["missing"])
+        resend = self._resend
+        if e.args["missing"] and resend is not None:
+            # the browser evicted buffers the last message refers to, send it again with all data,
+            # encoded off the event loop like all other messages
+            message = await asyncio.get_running_loop().run_in_executor(self.executor, resend)
+            # unless a newer message was sent meanwhile
+            if self._resend is resend:
+                self.send(message)
+
+    def _encode(self, type, data, arrays, use_references=True, compression=None):
+        """Encodes a message for the function webgpu.pyodide_code.<type> in the browser,
+        does not touch the UI and can be called from any thread (see send).
+        With use_references sections already stored in the browser are sent as content hash only.
+        Returns (type, frame, stats, encode), encode(compression, use_references) encodes the message again."""
+        compression = self.compression if compression is None else compression
+        known_hashes = None
+        if use_references and self._uses_references():
+            with self._client_hashes_lock:
+                known_hashes = self._client_hashes.copy()
+        stats = {}
+        frame = encode_message(
+            type,
+            data,
+            arrays,
+            compression=compression,
+            stats=stats,
+            known_hashes=known_hashes,
+            hash_sections=True,
+        )
+        print(
+            f"{type}: {stats['raw_nbytes']} -> {stats['nbytes']} bytes "
+            f"(ratio {stats['ratio']:.2f}, {compression or 'uncompressed'}), "
+            f"encode {1000 * stats['encode_time']:.1f} ms"
+        )
+
+        def encode(compression=compression, use_references=use_references):
+            return self._encode(type, data, arrays, use_references, compression)
+
+        return type, frame, stats, encode
+
+    def send(self, message):
+        """Sends a message created by one of the encode_* methods (on the event loop),
+        the browser fetches it as raw bytes (no base64/json encoding of the arrays)"""
+        type, frame, stats, encode = message
+        key = _store_frame(
+            self.client.id, frame, self.compression, lambda: encode(COMPRESSION_NONE)[1]
+        )
+        self.transfer_stats = stats
+        self._resend = lambda: encode(use_references=False)
+        self.run_method(
+            "draw",
+            {
+                "run_function": f"import webgpu.pyodide_code; webgpu.pyodide_code.{type}",
+                "url": f"/_webgpu_scene/frame/{key}",
+            },
+        )
+
+    def encode_draw_mesh(self, data):
+        # typed arrays (instead of raw bytes) for the byte-shuffle filter of the compression
+        return self._encode(
+            "draw_mesh",
+            {"n_trigs": data["n_trigs"], "n_edges": data["n_edges"]},
+            {
+                "trigs": np.frombuffer(data["trigs"], dtype=np.float32),
+                "edges": np.frombuffer(data["edges"], dtype=np.float32),
+            },
+        )
+
+    def encode_draw_cf(self, data):
+        return self._encode(
+            "draw_cf",
+            {"n_trigs": data["n_trigs"], "n_edges": data["n_edges"], "order": _values_order(data["cf"])},
+            {
+                "trigs": np.frombuffer(data["trigs"], dtype=np.float32),
+                "edges": np.frombuffer(data["edges"], dtype=np.float32),
+                "trig_function_values": np.frombuffer(data["cf"], dtype=np.float32),
+            },
+        )
+
+    def encode_update_values(self, values):
+        # always with data, the browser writes the values into the existing buffer and does not look them up
+        return self._encode(
+            "update_values",
+            {"order": _values_order(values)},
+            {"trig_function_values": np.frombuffer(values, dtype=np.float32)},
+            use_references=False,
+        )
+
     def draw_mesh(self, data):
-        data["run_function"] = "import webgpu.pyodide_code; webgpu.pyodide_code.draw_mesh"
-        data["trigs"] = to_js(data["trigs"])
-        data["edges"] = to_js(data["edges"])
-        self.run_method("draw", data)
+        self.send(self.encode_draw_mesh(data))
 
     def draw_cf(self, data):
-        data["run_function"] = "import webgpu.pyodide_code; webgpu.pyodide_code.draw_cf"
-        data["trig_function_values"] = to_js(data.pop("cf"))
-        data["trigs"] = to_js(data["trigs"])
-        data["edges"] = to_js(data["edges"])
-        print("draw cf with data = ", data)
-        self.run_method("draw", data)
+        self.send(self.encode_draw_cf(data))
+
+    def update_values(self, values):
+        """Replace the function values of the function drawn by the last draw_cf call (same mesh),
+        values as returned by render_data.evaluate_cf"""
+        self.send(self.encode_update_values(values))
@@ -0,0 +1,335 @@
+"""Stand-in for the js and pyodide.ffi modules of Pyodide, such that webgpu.utils can be imported natively.
+
+Typed arrays are views of bytearrays, every copy between them is counted in stats.
+Views into the "WASM memory" (created by PyProxy.getBuffer) are detached when the memory grows,
+like in the browser, memory growth can be triggered on every allocation (grow_on_allocation).
+Promise callbacks are queued like microtasks and run by run_callbacks().
+"""
+
+import struct
+import types
+
+
+class Stats:
+    def __init__(self):
+        self.copies = 0
+        self.copied_bytes = 0
+        self.memory_generation = 0
+        self.grow_on_allocation = False
+        # settled promise callbacks waiting for run_callbacks
+        self.callbacks = []
+
+    def allocate(self):
+        if self.grow_on_allocation:
+            self.memory_generation += 1
+
+
+stats = Stats()
+
+
+class JsProxy:
+    pass
+
+
+class ArrayBuffer(JsProxy):
+    def __init__(self, size_or_data):
+        self.data = bytearray(size_or_data)
+        self.byteLength = len(self.data)
+
+    def to_bytes(self):
+        return bytes(self.data)
+
+
+class Promise(JsProxy):
+    def __init__(self):
+        self._callbacks = []
+        self._result = None
+
+    def then(self, on_resolved, on_rejected=None):
+        self._callbacks.append((on_resolved, on_rejected))
+        if self._result is not None:
+            self._schedule()
+
+    def resolve(self, value=None):
+        self._settle(0, value)
+
+    def reject(self, error):
+        self._settle(1, error)
+
+    def _settle(self, index, value):
+        assert self._result is None, "promise already settled"
+        self._result = (index, value)
+        self._schedule()
+
+    def _schedule(self):
+        index, value = self._result
+        for callbacks in self._callbacks:
+            if callbacks[index] is not None:
+                stats.callbacks.append(lambda callback=callbacks[index]: callback(value))
+        self._callbacks = []
+
+
+class Uint8Array(JsProxy):
+    def __init__(self, buffer, byte_offset=0, length=None, generation=None):
+        if isinstance(buffer, int):
+            buffer = ArrayBuffer(buffer)
+        self.buffer = buffer
+        self.byteOffset = byte_offset
+        self.length = len(buffer.data) - byte_offset if length is None else length
+        self.byteLength = self.length
+        # views into the WASM memory are detached when the memory grows
+        self._generation = generation
+
+    @classmethod
+    def new(cls, *args):
+        return cls(*args)
+
+    def _check(self):
+        if self._generation is not None and self._generation != stats.memory_generation:
+            raise TypeError("Cannot perform %TypedArray%.prototype.set on a detached ArrayBuffer")
+
+    def bytes(self):
+        self._check()
+        return bytes(self.buffer.data[self.byteOffset : self.byteOffset + self.length])
+
+    def set(self, source, offset=0):
+        self._check()
+        data = source.bytes()
+        start = self.byteOffset + offset
+        self.buffer.data[start : start + len(data)] = data
+        stats.copies += 1
+        stats.copied_bytes += len(data)
+
+
+class _WasmMemory:
+    # memoryview of a Python object exposed as ArrayBuffer (no copy)
+    def __init__(self, view):
+        self.data = view
+
+
+class _PyBuffer:
+    def __init__(self, view):
+        self.data = Uint8Array(
+            _WasmMemory(view), 0, view.nbytes, generation=stats.memory_generation
+        )
+        self.released = False
+
+    def release(self):
+        self.released = True
+
+
+class PyProxy:
+    def __init__(self, obj):
+        self.obj = obj
+        self.destroyed = False
+
+    def getBuffer(self, kind):
+        assert kind == "u8"
+        return _PyBuffer(memoryview(self.obj).cast("B"))
+
+    def destroy(self):
+        self.destroyed = True
+
+
+def create_proxy(obj):
+    return PyProxy(obj)
+
+
+def create_once_callable(func):
+    return func
+
+
+def to_js(value, dict_converter=None):
+    stats.allocate()
+    return value
+
+
+class GPUBufferUsage:
+    MAP_READ = 0x1
+    MAP_WRITE = 0x2
+    COPY_SRC = 0x4
+    COPY_DST = 0x8
+    INDEX = 0x10
+    VERTEX = 0x20
+    UNIFORM = 0x40
+    STORAGE = 0x80
+    INDIRECT = 0x100
+    QUERY_RESOLVE = 0x200
+
+
+class GPUBuffer:
+    def __init__(self, descriptor):
+        self.descriptor = descriptor
+        self.size = descriptor["size"]
+        self.label = descriptor.get("label", "")
+        self.usage = descriptor["usage"]
+        self.data = bytearray(self.size)
+        self.mapped = descriptor.get("mappedAtCreation", False)
+        self.destroyed = False
+        self._mapping = None
+
+    def mapAsync(self, mode, offset=0, size=None):
+        assert not self.mapped and self._mapping is None
+        self._mapping = Promise()
+        return self._mapping
+
+    def finish_mapping(self, error=None):
+        """Settles a pending mapAsync, rejected if the buffer was destroyed meanwhile or error is given"""
+        promise, self._mapping = self._mapping, None
+        if promise is None:
+            return
+        if error is None and self.destroyed:
+            error = "AbortError: buffer destroyed before mapping was resolved"
+        if error is None:
+            self.mapped = True
+            promise.resolve()
+        else:
+            promise.reject(error)
+
+    def getMappedRange(self, offset=0, size=None):
+        assert self.mapped
+        stats.allocate()
+        size = self.size - offset if size is None else size
+        buffer = ArrayBuffer(0)
+        buffer.data = memoryview(self.data)[offset : offset + size]
+        buffer.byteLength = size
+        return buffer
+
+    def unmap(self):
+        self.mapped = False
+
+    def destroy(self):
+        self.destroyed = True
+        self.mapped = False
+
+
+class GPUQueue:
+    def __init__(self):
+        self.submitted = []
+
+    def writeBuffer(self, buffer, offset, data):
+        payload = data.bytes()
+        buffer.data[offset : offset + len(payload)] = payload
+        stats.copies += 1
+        stats.copied_bytes += len(payload)
+
+    def submit(self, command_buffers):
+        self.submitted.append(command_buffers)
+
+
+class GPUObject:
+    def __init__(self, kind, descriptor):
+        self.kind = kind
+        self.descriptor = descriptor
+
+
+class GPUQuerySet(GPUObject):
+    def __init__(self, descriptor):
+        super().__init__("query_set", descriptor)
+        # values written by the passes (e.g. timestamps in ns), see write_timestamps
+        self.values = [0] * descriptor["count"]
+        self.destroyed = False
+
+    def destroy(self):
+        self.destroyed = True
+
+
+def write_timestamps(pass_descriptor, begin, end):
+    """Writes the timestamps of a pass with timestampWrites (as the GPU would do when the pass runs)"""
+    writes = pass_descriptor["timestampWrites"]
+    writes["querySet"].values[writes["beginningOfPassWriteIndex"]] = begin
+    writes["querySet"].values[writes["endOfPassWriteIndex"]] = end
+
+
+class GPUCommandEncoder:
+    def resolveQuerySet(self, query_set, first_query, query_count, destination, destination_offset):
+        data = struct.pack(f"<{query_count}Q", *query_set.values[first_query : first_query + query_count])
+        destination.data[destination_offset : destination_offset + len(data)] = data
+
+    def copyBufferToBuffer(self, source, source_offset, destination, destination_offset, size):
+        data = source.data[source_offset : source_offset + size]
+        destination.data[destination_offset : destination_offset + size] = data
+        stats.copies += 1
+        stats.copied_bytes += size
+
+
+class GPUSupportedFeatures(set):
+    def has(self, name):
+        return name in self
+
+
+class GPUDevice:
+    """Records the created objects per kind"""
+
+    def __init__(self, features=()):
+        self.queue = GPUQueue()
+        self.features = GPUSupportedFeatures(features)
+        self.created = {}
+
+    def finish_mappings(self, error=None):
+        """Settles all pending mapAsync calls (see GPUBuffer.finish_mapping)"""
+        for buffer in self.created.get("buffer", []):
+            buffer.finish_mapping(error)
+
+    def _create(self, kind, descriptor):
+        stats.allocate()
+        obj = GPUObject(kind, descriptor)
+        self.created.setdefault(kind, []).append(obj)
+        return obj
+
+    def createBuffer(self, descriptor):
+        stats.allocate()
+        buffer = GPUBuffer(descriptor)
+        self.created.setdefault("buffer", []).append(buffer)
+        return buffer
+
+    def createShaderModule(self, descriptor):
+        return self._create("shader_module", descriptor)
+
+    def createBindGroupLayout(self, descriptor):
+        return self._create("bind_group_layout", descriptor)
+
+    def createBindGroup(self, descriptor):
+        return self._create("bind_group", descriptor)
+
+    def createPipelineLayout(self, descriptor):
+        return self._create("pipeline_layout", descriptor)
+
+    def createRenderPipeline(self, descriptor):
+        return self._create("render_pipeline", descriptor)
+
+    def createQuerySet(self, descriptor):
+        query_set = GPUQuerySet(descriptor)
+        self.created.setdefault("query_set", []).append(query_set)
+        return query_set
+
+    def createCommandEncoder(self, descriptor=None):
+        return GPUCommandEncoder()
+
+
+def create_modules():
+    """The modules to put into sys.modules (js, pyodide, pyodide.ffi)"""
+    js = types.ModuleType("js")
+    js.Uint8Array = Uint8Array
+    js.GPUBufferUsage = GPUBufferUsage
+    js.Object = types.SimpleNamespace(fromEntries=dict)
+
+    ffi = types.ModuleType("pyodide.ffi")
+    ffi.JsProxy = JsProxy
+    ffi.create_proxy = create_proxy
+    ffi.create_once_callable = create_once_callable
+    ffi.to_js = to_js
+
+    pyodide = types.ModuleType("pyodide")
+    pyodide.ffi = ffi
+    return {"js": js, "pyodide": pyodide, "pyodide.ffi": ffi}
+
+
+def run_callbacks():
+    """Runs the callbacks of settled promises (including those queued by the callbacks)"""
+    while stats.callbacks:
+        stats.callbacks.pop(0)()
+
+
+def reset():
+    stats.__init__()
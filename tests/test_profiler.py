@@ -0,0 +1,118 @@
+import pytest
+
+import stand_in_js
+from webgpu.profiler import GpuProfiler
+
+
+@pytest.fixture(autouse=True)
+def reset_stats():
+    stand_in_js.reset()
+
+
+@pytest.fixture
+def device():
+    return stand_in_js.GPUDevice(features=["timestamp-query"])
+
+
+@pytest.fixture
+def profiler(device):
+    return GpuProfiler(device, ring_size=2, max_passes=2)
+
+
+def record_frame(profiler, device, durations):
+    """Records and submits a frame with one pass per duration [ms]"""
+    profiler.begin_frame()
+    encoder = device.createCommandEncoder()
+    for i, duration in enumerate(durations):
+        descriptor = profiler.timestamp_writes(f"pass{i}")
+        if descriptor:
+            # timestamps in ns, written by the GPU when the pass runs
+            stand_in_js.write_timestamps(descriptor, 1000, 1000 + round(duration * 1e6))
+    profiler.end_frame(encoder)
+    profiler.submitted()
+
+
+def finish_mappings(device, error=None):
+    device.finish_mappings(error)
+    stand_in_js.run_callbacks()
+
+
+def test_disabled_without_feature():
+    device = stand_in_js.GPUDevice()
+    profiler = GpuProfiler(device)
+    assert not profiler.enabled
+    record_frame(profiler, device, [1.0])
+    assert profiler.timestamp_writes("pass") == {}
+    assert "buffer" not in device.created
+    assert profiler.stats() == {}
+
+
+def test_skipped_frames(profiler, device):
+    record_frame(profiler, device, [1.0])
+    record_frame(profiler, device, [2.0])
+    # both slots are still mapping, the frame is not measured
+    record_frame(profiler, device, [3.0])
+    assert profiler.counters["skipped_frames"] == 1
+
+    finish_mappings(device)
+    assert profiler.counters["frames"] == 2
+    assert profiler.stats()["pass0"]["count"] == 2
+    assert not any(buffer.mapped for buffer in device.created["buffer"])
+
+    record_frame(profiler, device, [4.0])
+    finish_mappings(device)
+    assert profiler.counters["skipped_frames"] == 1
+    assert profiler.stats()["pass0"]["latest"] == pytest.approx(4.0)
+
+
+def test_dropped_passes(profiler, device):
+    record_frame(profiler, device, [1.0, 2.0, 3.0])
+    assert profiler.counters["dropped_passes"] == 1
+    finish_mappings(device)
+    stats = profiler.stats()
+    assert set(stats) == {"pass0", "pass1"}
+    assert stats["pass1"]["latest"] == pytest.approx(2.0)
+
+
+def test_statistics(profiler, device):
+    for i in range(1, 21):
+        record_frame(profiler, device, [float(i)])
+        finish_mappings(device)
+    stats = profiler.stats()["pass0"]
+    assert stats["count"] == 20
+    assert stats["latest"] == pytest.approx(20.0)
+    assert stats["mean"] == pytest.approx(10.5)
+    assert stats["p95"] == pytest.approx(19.0)
+
+
+def test_failed_mapping_frees_slot(profiler, device):
+    record_frame(profiler, device, [1.0])
+    record_frame(profiler, device, [1.0])
+    finish_mappings(device, error="device lost")
+    assert profiler.counters["frames"] == 0
+
+    # both slots are free again
+    record_frame(profiler, device, [1.0])
+    record_frame(profiler, device, [1.0])
+    assert profiler.counters["skipped_frames"] == 0
+    finish_mappings(device)
+    assert profiler.counters["frames"] == 2
+
+
+def test_destroy_while_mapping(profiler, device):
+    record_frame(profiler, device, [1.0])
+    profiler.destroy()
+    assert all(buffer.destroyed for buffer in device.created["buffer"])
+    finish_mappings(device)
+    assert profiler.counters["frames"] == 0
+    assert profiler.stats() == {}
+
+
+def test_read_after_destroy(profiler, device):
+    record_frame(profiler, device, [1.0])
+    # mapping succeeded, but the callback runs only after destroy
+    device.finish_mappings()
+    profiler.destroy()
+    stand_in_js.run_callbacks()
+    assert profiler.counters["frames"] == 0
+    assert profiler.stats() == {}
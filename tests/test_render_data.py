@@ -0,0 +1,188 @@
+import math
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+import ngsolve as ngs
+import ngsolve.webgui
+import numpy as np
+import pytest
+from netgen.geom2d import unit_square
+
+from webgpu.render_data import (
+    FORMAT_F16,
+    FORMAT_UNORM16,
+    VALUES_OFFSET,
+    GeometryCache,
+    _create_mesh_data,
+    decode_values,
+    encode_values,
+    evaluate_cf,
+)
+
+
+@pytest.fixture(scope="module")
+def mesh():
+    return ngs.Mesh(unit_square.GenerateMesh(maxh=0.2))
+
+
+def _evaluate_cf_reference(cf, region, order):
+    """The original implementation (ngs.Matrix product per component), defines the buffer layout"""
+    comps = cf.dim
+    int_points = ngsolve.webgui._make_trig(order)
+    intrule = ngs.IntegrationRule(int_points, [0] * len(int_points))
+    ndtrig = (order + 1) * (order + 2) // 2
+    mat = ngs.Matrix(ndtrig, ndtrig)
+    fac_n = math.factorial(order)
+    for row, ip in enumerate(intrule):
+        col = 0
+        x = ip.point[0]
+        y = ip.point[1]
+        z = 1.0 - x - y
+        for i in range(order + 1):
+            factor = fac_n / math.factorial(i) * x**i
+            for j in range(order + 1 - i):
+                k = order - i - j
+                factor2 = 1.0 / (math.factorial(j) * math.factorial(k))
+                mat[row, col] = factor * factor2 * y**j * z**k
+                col += 1
+    ibmat = mat.I
+    ndof = ibmat.h
+
+    pts = region.mesh.MapToAllElements({ngs.ET.TRIG: intrule, ngs.ET.QUAD: intrule}, region)
+    pmat = cf(pts).reshape(-1, ndof, comps)
+    values = np.zeros((ndof, pmat.shape[0], comps), dtype=np.float32)
+    for i in range(comps):
+        values[:, :, i] = ibmat * ngs.Matrix(pmat[:, :, i].transpose())
+    values = values.transpose((1, 0, 2)).flatten()
+    return np.concatenate(([np.float32(cf.dim), np.float32(order)], values))
+
+
+functions = {
+    "scalar": ngs.sin(3 * ngs.x) * ngs.y,
+    "vector": ngs.CF((ngs.x * ngs.y, ngs.exp(ngs.x), ngs.y**2)),
+}
+
+
+@pytest.mark.parametrize("order", [1, 2, 3, 4, 6])
+@pytest.mark.parametrize("name", functions)
+def test_evaluate_cf_matches_reference_layout(mesh, name, order):
+    cf = functions[name]
+    region = mesh.Region(ngs.VOL)
+    expected = _evaluate_cf_reference(cf, region, order)
+    values = evaluate_cf(cf, region, order)
+
+    assert values.dtype == np.float32
+    assert values.shape == expected.shape
+    assert values[0] == cf.dim and values[1] == order
+    # identical up to the summation order of the matrix products, which only shows as
+    # rounding noise (~1e-17) in coefficients that are exactly zero
+    np.testing.assert_allclose(values, expected, rtol=np.finfo(np.float32).eps, atol=1e-12)
+
+
+@pytest.mark.parametrize("name", functions)
+def test_evaluate_cf_independent_of_chunks_and_workers(mesh, name):
+    cf = functions[name]
+    region = mesh.Region(ngs.VOL)
+    values = evaluate_cf(cf, region, 3)
+    np.testing.assert_array_equal(evaluate_cf(cf, region, 3, chunk_size=7), values)
+    np.testing.assert_array_equal(evaluate_cf(cf, region, 3, chunk_size=7, workers=3), values)
+    np.testing.assert_array_equal(evaluate_cf(cf, region, 3, workers=4), values)
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_evaluate_cf_empty_region(mesh, workers):
+    region = mesh.Materials("does_not_exist")
+    values = evaluate_cf(functions["vector"], region, 3, workers=workers)
+    np.testing.assert_array_equal(values, [3, 3])
+
+
+def test_mesh_data_rejects_quads():
+    mesh = ngs.Mesh(unit_square.GenerateMesh(maxh=0.5, quad_dominated=True))
+    with pytest.raises(ValueError, match="triangle"):
+        _create_mesh_data(mesh)
+
+
+def test_geometry_cache_shared_by_mesh_copies(mesh):
+    cache = GeometryCache()
+    data = cache.get(mesh, "trigs", _create_mesh_data)
+    # the NiceGUI app unpickles a new mesh object for every draw call
+    copy = pickle.loads(pickle.dumps(mesh))
+    assert cache.get(copy, "trigs", _create_mesh_data) == data
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 1
+
+    refined = ngs.Mesh(unit_square.GenerateMesh(maxh=0.1))
+    cache.get(refined, "trigs", _create_mesh_data)
+    assert cache.stats["misses"] == 2
+
+
+def _values(data, ncomp=1, order=1):
+    # evaluate_cf layout: header (ncomp, order) followed by the coefficients
+    return np.concatenate(([ncomp, order], data)).astype(np.float32)
+
+
+def _random_values(n_elements=501, order=2, seed=0):
+    rng = np.random.default_rng(seed)
+    ndof = (order + 1) * (order + 2) // 2
+    # magnitudes from float16 subnormals up to 1e4, both signs
+    data = rng.choice([-1, 1], ndof * n_elements) * 10.0 ** rng.uniform(-9, 4, ndof * n_elements)
+    return _values(data, order=order)
+
+
+def test_geometry_cache_concurrent_access(mesh):
+    cache = GeometryCache(max_entries=3)
+
+    def worker(offset):
+        for i in range(300):
+            kind = (i + offset) % 7
+            assert cache.get(mesh, kind, lambda mesh: {"data": bytes(kind + 1)}) == {
+                "data": bytes(kind + 1)
+            }
+
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(worker, range(4)))
+    stats = cache.stats
+    assert stats["hits"] + stats["misses"] == 1200
+    assert stats["entries"] <= 3
+    assert stats["nbytes"] == sum(nbytes for _, nbytes in cache._entries.values())
+
+
+def test_encode_values_f16_error_bound():
+    values = _random_values()
+    decoded = decode_values(encode_values(values, FORMAT_F16))
+    assert decoded.shape == values.shape
+    np.testing.assert_array_equal(decoded[:VALUES_OFFSET], values[:VALUES_OFFSET])
+    data = values[VALUES_OFFSET:].astype(np.float64)
+    error = np.abs(decoded[VALUES_OFFSET:] - data)
+    normal = np.abs(data) >= 2**-14
+    assert normal.any() and (~normal).any()
+    assert np.all(error[normal] <= 2**-11 * np.abs(data[normal]))
+    assert np.all(error[~normal] <= 2**-25)
+
+
+def test_encode_values_unorm16_error_bound():
+    values = _random_values()
+    decoded = decode_values(encode_values(values, FORMAT_UNORM16))
+    assert decoded.shape == values.shape
+    data = values[VALUES_OFFSET:].astype(np.float64)
+    bound = (data.max() - data.min()) / 131070 + 2**-23 * np.abs(data).max()
+    assert np.abs(decoded[VALUES_OFFSET:] - data).max() <= bound
+
+
+@pytest.mark.parametrize("format", [FORMAT_F16, FORMAT_UNORM16])
+def test_encode_values_constant(format):
+    values = _values(np.full(15, 0.1234))
+    np.testing.assert_array_equal(
+        decode_values(encode_values(values, format)),
+        values if format == FORMAT_UNORM16 else values.astype(np.float16),
+    )
+
+
+def test_encode_values_non_finite():
+    data = np.array([1.0, np.nan, np.inf, -np.inf, -2.0, 0.5])
+    decoded = decode_values(encode_values(_values(data), FORMAT_F16))
+    np.testing.assert_array_equal(decoded[VALUES_OFFSET:], data)
+
+    with pytest.raises(ValueError):
+        encode_values(_values(data), FORMAT_UNORM16)
+    with pytest.raises(ValueError):
+        encode_values(_values([1e5, 0.0, 1.0]), FORMAT_F16)
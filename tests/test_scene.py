@@ -0,0 +1,119 @@
+from webgpu.scene import Scene
+
+
+class RenderPass:
+    def __init__(self, calls, load_op):
+        self.calls = calls
+        self.calls.append(("begin", load_op))
+
+    def setPipeline(self, pipeline):
+        self.calls.append(("pipeline", pipeline))
+
+    def setBindGroup(self, index, bind_group):
+        self.calls.append(("bind_group", bind_group))
+
+    def end(self):
+        self.calls.append(("end",))
+
+
+class GPU:
+    def __init__(self):
+        self.calls = []
+        self.invalidations = 0
+
+    def invalidate(self):
+        self.invalidations += 1
+
+    def begin_render_pass(self, encoder, loadOp="clear", label=None):
+        return RenderPass(self.calls, loadOp)
+
+
+class DrawObject:
+    def __init__(self, name, pipeline, bind_group):
+        self.name = name
+        self.pipeline = pipeline
+        self.bind_group = bind_group
+
+    def draw(self, render_pass):
+        render_pass.calls.append(("draw", self.name))
+
+
+class PassObject:
+    """Object rendering its own passes (like MeshRenderObjectDeferred)"""
+
+    render_passes = 2
+
+    def __init__(self, gpu):
+        self.gpu = gpu
+
+    def render(self, encoder):
+        self.gpu.calls.append(("render",))
+
+
+def test_draws_sorted_by_pipeline_and_bind_group():
+    gpu = GPU()
+    objects = [
+        DrawObject("a", "p1", "b1"),
+        DrawObject("b", "p2", "b2"),
+        DrawObject("c", "p1", "b2"),
+        DrawObject("d", "p2", "b1"),
+        DrawObject("e", "p1", "b1"),
+    ]
+    scene = Scene(gpu, objects)
+    scene.render(encoder=None)
+    # pipelines and bind groups in order of first appearance, stable within equal keys
+    assert gpu.calls == [
+        ("begin", "clear"),
+        ("pipeline", "p1"),
+        ("bind_group", "b1"),
+        ("draw", "a"),
+        ("draw", "e"),
+        ("bind_group", "b2"),
+        ("draw", "c"),
+        ("pipeline", "p2"),
+        ("bind_group", "b1"),
+        ("draw", "d"),
+        ("bind_group", "b2"),
+        ("draw", "b"),
+        ("end",),
+    ]
+    assert scene.stats == {
+        "passes": 1,
+        "draws": 5,
+        "pipeline_changes": 2,
+        "bind_group_changes": 4,
+    }
+
+
+def test_shared_state_set_once():
+    gpu = GPU()
+    scene = Scene(gpu, [DrawObject(name, "pipeline", "bind_group") for name in "abc"])
+    scene.render(encoder=None)
+    assert [call[0] for call in gpu.calls].count("pipeline") == 1
+    assert [call[0] for call in gpu.calls].count("bind_group") == 1
+    assert scene.stats["draws"] == 3
+
+
+def test_render_objects_before_shared_pass():
+    gpu = GPU()
+    scene = Scene(gpu, [DrawObject("a", "p", "b"), PassObject(gpu)])
+    scene.render(encoder=None)
+    # the shared pass loads the result of the own passes
+    assert gpu.calls[:2] == [("render",), ("begin", "load")]
+    assert scene.stats["passes"] == 3
+
+
+def test_empty_scene_clears():
+    gpu = GPU()
+    scene = Scene(gpu)
+    scene.render(encoder=None)
+    assert gpu.calls == [("begin", "clear"), ("end",)]
+    assert scene.stats["passes"] == 1 and scene.stats["draws"] == 0
+
+    # no extra pass if only objects with own passes are drawn
+    gpu.calls.clear()
+    scene.add(PassObject(gpu))
+    scene.render(encoder=None)
+    assert gpu.calls == [("render",)]
+    assert scene.stats["passes"] == 2
+    assert gpu.invalidations == 1
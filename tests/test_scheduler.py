@@ -0,0 +1,118 @@
+import pytest
+
+from webgpu.scheduler import FrameScheduler
+
+
+class FrameQueue:
+    """Fake requestAnimationFrame/cancelAnimationFrame, frames run when run_frame is called"""
+
+    def __init__(self):
+        self.callbacks = {}
+        self.next_id = 0
+        self.cancelled = []
+
+    def request(self, callback):
+        self.next_id += 1
+        self.callbacks[self.next_id] = callback
+        return self.next_id
+
+    def cancel(self, frame_id):
+        self.cancelled.append(frame_id)
+        del self.callbacks[frame_id]
+
+    def run_frame(self, timestamp=0.0):
+        callbacks, self.callbacks = self.callbacks, {}
+        for callback in callbacks.values():
+            callback(timestamp)
+
+
+class FakeClock:
+    def __init__(self, step=2.0):
+        self.time = 0.0
+        self.step = step
+
+    def __call__(self):
+        self.time += self.step
+        return self.time
+
+
+@pytest.fixture
+def queue():
+    return FrameQueue()
+
+
+def create_scheduler(queue, render):
+    scheduler = None
+
+    def request_frame():
+        return queue.request(scheduler.on_frame)
+
+    scheduler = FrameScheduler(render, request_frame, queue.cancel, clock=FakeClock())
+    return scheduler
+
+
+def test_invalidations_coalesce(queue):
+    rendered = []
+    scheduler = create_scheduler(queue, rendered.append)
+    for _ in range(10):
+        scheduler.invalidate()
+    assert len(queue.callbacks) == 1
+    assert scheduler.stats["requests"] == 1
+    assert scheduler.stats["invalidations"] == 10
+
+    queue.run_frame(16.0)
+    assert rendered == [16.0]
+    assert not scheduler.pending and not scheduler.dirty
+    assert scheduler.stats["frames"] == 1
+    assert scheduler.stats["last_render_time"] == 2.0
+
+
+def test_no_render_when_clean(queue):
+    rendered = []
+    scheduler = create_scheduler(queue, rendered.append)
+    assert not scheduler.on_frame(0.0)
+    scheduler.invalidate()
+    queue.run_frame()
+    # no further frames are requested or rendered without invalidation
+    assert not queue.callbacks
+    for _ in range(3):
+        queue.run_frame()
+    assert not scheduler.on_frame(0.0)
+    assert len(rendered) == 1
+    assert scheduler.stats["frames"] == 1
+
+
+def test_invalidate_during_render(queue):
+    rendered = []
+    scheduler = None
+
+    def render(timestamp):
+        rendered.append(timestamp)
+        if len(rendered) < 3:
+            # e.g. an animation
+            scheduler.invalidate()
+
+    scheduler = create_scheduler(queue, render)
+    scheduler.invalidate()
+    for timestamp in range(5):
+        queue.run_frame(float(timestamp))
+    assert rendered == [0.0, 1.0, 2.0]
+    assert scheduler.stats["requests"] == 3
+    assert not scheduler.dirty and not scheduler.pending
+
+
+def test_cancel_keeps_dirty(queue):
+    rendered = []
+    scheduler = create_scheduler(queue, rendered.append)
+    scheduler.invalidate()
+    scheduler.cancel()
+    assert queue.cancelled == [1]
+    assert scheduler.dirty and not scheduler.pending
+    queue.run_frame()
+    assert rendered == []
+
+    # the next invalidation requests a new frame, which renders the changes
+    scheduler.invalidate()
+    assert scheduler.stats["requests"] == 2
+    queue.run_frame(5.0)
+    assert rendered == [5.0]
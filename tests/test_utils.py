@@ -0,0 +1,118 @@
+import importlib
+import sys
+
+import numpy as np
+import pytest
+
+import stand_in_js
+
+
+@pytest.fixture(scope="module")
+def utils():
+    """webgpu.utils imported with the stand-in js module"""
+    with pytest.MonkeyPatch.context() as mp:
+        for name, module in stand_in_js.create_modules().items():
+            mp.setitem(sys.modules, name, module)
+        yield importlib.import_module("webgpu.utils")
+        sys.modules.pop("webgpu.utils", None)
+
+
+@pytest.fixture(autouse=True)
+def reset_stats():
+    stand_in_js.reset()
+
+
+@pytest.fixture
+def device(utils):
+    return utils.Device(stand_in_js.GPUDevice())
+
+
+def test_create_buffer_copies_once(device):
+    values = np.linspace(0, 1, 1001, dtype=np.float32)
+    buffer = device.create_buffer(values)
+    assert stand_in_js.stats.copies == 1
+    assert stand_in_js.stats.copied_bytes == values.nbytes
+    assert bytes(buffer.data) == values.tobytes()
+    assert not buffer.mapped
+
+
+def test_create_buffer_pads_to_multiple_of_4(device):
+    buffer = device.create_buffer(b"abcde")
+    assert buffer.size == 8
+    assert bytes(buffer.data[:5]) == b"abcde"
+    assert stand_in_js.stats.copied_bytes == 5
+
+
+def test_create_buffer_from_js_array(device):
+    source = stand_in_js.Uint8Array(stand_in_js.ArrayBuffer(b"x" * 64), 16, 32)
+    buffer = device.create_buffer(source)
+    assert buffer.size == 32
+    assert stand_in_js.stats.copies == 1
+
+
+def test_create_buffer_with_growing_memory(device):
+    # allocations in to_js, createBuffer and getMappedRange detach earlier views into the WASM memory
+    stand_in_js.stats.grow_on_allocation = True
+    values = np.arange(100, dtype=np.uint32)
+    buffer = device.create_buffer(values)
+    assert bytes(buffer.data) == values.tobytes()
+    assert stand_in_js.stats.copies == 1
+
+
+def test_write_buffer_copies_once(device):
+    buffer = device.create_buffer(64, stand_in_js.GPUBufferUsage.COPY_DST)
+    values = np.arange(8, dtype=np.float64)
+    device.write_buffer(buffer, values)
+    assert stand_in_js.stats.copies == 1
+    assert bytes(buffer.data) == values.tobytes()
+
+
+def _pipeline_descriptor(device, entry_point="mainVertex", format="bgra8unorm", depth=True):
+    shader = device.compile_code("@vertex fn mainVertex() {}")
+    bind_layout, _ = device.create_bind_group([])
+    descriptor = {
+        "label": "test",
+        "layout": device.create_pipeline_layout(bind_layout),
+        "vertex": {"module": shader, "entryPoint": entry_point},
+        "fragment": {"module": shader, "entryPoint": "mainFragment", "targets": [{"format": format}]},
+        "primitive": {"topology": "triangle-list"},
+    }
+    if depth:
+        descriptor["depthStencil"] = {
+            "format": "depth24plus",
+            "depthWriteEnabled": True,
+            "depthCompare": "less",
+        }
+    return descriptor
+
+
+def test_pipeline_cache_hits(device):
+    pipeline = device.create_render_pipeline(_pipeline_descriptor(device))
+    descriptor = _pipeline_descriptor(device) | {"label": "other label"}
+    assert device.create_render_pipeline(descriptor) is pipeline
+
+    stats = device.pipeline_cache.stats
+    assert stats["pipeline_misses"] == 1 and stats["pipeline_hits"] == 1
+    assert stats["shader_misses"] == 1 and stats["shader_hits"] == 1
+    assert stats["compile_time"] >= 0
+    assert len(device.device.created["render_pipeline"]) == 1
+    assert len(device.device.created["shader_module"]) == 1
+    assert len(device.device.created["pipeline_layout"]) == 1
+
+
+@pytest.mark.parametrize(
+    "changes",
+    [{"entry_point": "mainVertex2"}, {"format": "rgba8unorm"}, {"depth": False}],
+)
+def test_pipeline_cache_misses(device, changes):
+    pipeline = device.create_render_pipeline(_pipeline_descriptor(device))
+    assert device.create_render_pipeline(_pipeline_descriptor(device, **changes)) is not pipeline
+    assert device.pipeline_cache.stats["pipeline_misses"] == 2
+
+
+def test_pipeline_cache_unknown_layout(device):
+    descriptor = _pipeline_descriptor(device)
+    # created directly on the device, not by the cache
+    descriptor["layout"] = device.device.createPipelineLayout({"bindGroupLayouts": []})
+    with pytest.raises(ValueError, match="not created by this cache"):
+        device.create_render_pipeline(descriptor)
@@ -0,0 +1,127 @@
+import pytest
+
+from webgpu import wgsl
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    wgsl.clear_cache()
+    yield
+    wgsl.clear_cache()
+
+
+def write(directory, name, code):
+    path = directory / name
+    path.write_text(code)
+    return path
+
+
+def test_define_selection():
+    code = """
+#if MAX_ORDER >= 2 and FORMAT == 1
+fn a() {}
+#else
+fn b() {}
+#endif
+#ifdef DEBUG
+fn debug() {}
+#endif
+#ifndef DEBUG
+fn release() -> u32 { return MAX_ORDER; }
+#endif
+"""
+    result = wgsl.preprocess(code, {"MAX_ORDER": 2, "FORMAT": 1})
+    assert "fn a()" in result and "fn b()" not in result
+    assert "fn debug()" not in result
+    assert "return 2;" in result
+
+    result = wgsl.preprocess(code, {"MAX_ORDER": 1, "FORMAT": 1, "DEBUG": 1})
+    assert "fn a()" not in result and "fn b()" in result
+    assert "fn debug()" in result and "fn release()" not in result
+
+
+def test_define_directive():
+    result = wgsl.preprocess("#define N 4\nconst n = N;")
+    assert result.strip() == "const n = 4;"
+
+
+def test_unbalanced_conditionals():
+    with pytest.raises(SyntaxError, match="missing #endif"):
+        wgsl.preprocess("#if 1\nfn a() {}")
+    with pytest.raises(SyntaxError, match="#endif without #if"):
+        wgsl.preprocess("#endif")
+
+
+def test_include_once(tmp_path):
+    write(tmp_path, "common.wgsl", "fn common() {}\n")
+    write(tmp_path, "b.wgsl", '#include "common.wgsl"\nfn b() { common(); }\n')
+    main = write(tmp_path, "main.wgsl", '#include "common.wgsl"\n#include "b.wgsl"\n')
+    result = wgsl.assemble([main])
+    assert result.count("fn common()") == 1
+    assert "fn b()" in result
+
+
+def test_include_cycle(tmp_path):
+    write(tmp_path, "a.wgsl", '#include "b.wgsl"\nfn a() {}\n')
+    write(tmp_path, "b.wgsl", '#include "a.wgsl"\nfn b() {}\n')
+    with pytest.raises(SyntaxError, match="#include cycle a.wgsl -> b.wgsl -> a.wgsl"):
+        wgsl.assemble([tmp_path / "a.wgsl"])
+
+
+def test_strip_unused():
+    code = """
+struct Data { value: f32 }
+const SCALE: f32 = 2.0;
+@group(0) @binding(0) var<storage> data: array<Data>;
+fn helper(x: f32) -> f32 { return SCALE * x; }
+fn unused(x: f32) -> f32 { return x; }
+// comments are removed
+@compute @workgroup_size(64)
+fn main(@builtin(global_invocation_id) id: vec3<u32>) {
+    let v = helper(data[id.x].value);
+}
+@compute @workgroup_size(64)
+fn other() {}
+"""
+    result = wgsl.strip_unused(code, ["main"])
+    for name in ["struct Data", "const SCALE", "var<storage> data", "fn helper", "fn main"]:
+        assert name in result
+    assert "fn unused" not in result and "fn other" not in result
+    assert "comments" not in result
+
+    with pytest.raises(ValueError, match="missing_entry"):
+        wgsl.strip_unused(code, ["missing_entry"])
+
+
+def test_assemble_cached(tmp_path):
+    path = write(tmp_path, "main.wgsl", "fn main() {}\nfn other() {}\n")
+    result = wgsl.assemble([path], ["main"])
+    # files are read only once
+    path.write_text("fn changed() {}\n")
+    assert wgsl.assemble([path], ["main"]) is result
+    assert wgsl.assemble([path], None) == "fn main() {}\nfn other() {}"
+    wgsl.clear_cache()
+    assert "fn changed" in wgsl.assemble([path])
+
+
+def test_size_report(tmp_path):
+    path = write(
+        tmp_path,
+        "main.wgsl",
+        "fn a() {}\nfn b() { a(); }\n#if ORDER > 1\nfn c() {}\n#endif\n",
+    )
+    report = wgsl.size_report([path], ["b"], {"ORDER": 2})
+    assert report["full_functions"] == 3
+    assert report["stripped_functions"] == 2
+    assert report["stripped_bytes"] == len(wgsl.assemble([path], ["b"], {"ORDER": 2}))
+    assert report["full_bytes"] == len(wgsl.assemble([path], None, {"ORDER": 2}))
+    assert report["stripped_bytes"] < report["full_bytes"]
+
+
+def test_shader_module_orders():
+    # the shaders of this package: fewer evaluation functions for lower orders
+    entry_points = ["mainVertexTrigP1", "mainFragmentTrig"]
+    low = wgsl.size_report(["shader.wgsl"], entry_points, {"MAX_ORDER": 1})
+    high = wgsl.size_report(["shader.wgsl"], entry_points, {"MAX_ORDER": 6})
+    assert low["stripped_functions"] <= high["stripped_functions"]
+    assert low["stripped_bytes"] < low["full_bytes"]
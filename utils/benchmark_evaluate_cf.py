@@ -0,0 +1,63 @@
+"""Benchmark serial vs. parallel evaluation of coefficient functions (render_data.evaluate_cf)
+
+Usage: python benchmark_evaluate_cf.py [--maxh 0.003] [--orders 2 4 6] [--workers 1 2 4 8] [--processes]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import ngsolve as ngs
+import numpy as np
+from netgen.occ import unit_square
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "webgpu"))
+from render_data import evaluate_cf
+
+
+def timeit(func, repeat):
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - t)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--maxh", type=float, default=0.003)
+    parser.add_argument("--orders", type=int, nargs="+", default=[2, 3, 4, 5, 6])
+    n_cores = os.cpu_count() or 1
+    default_workers = sorted({1, 2, 4, n_cores} & set(range(1, n_cores + 1)))
+    parser.add_argument("--workers", type=int, nargs="+", default=default_workers)
+    parser.add_argument("--processes", action="store_true", help="use process pool")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    mesh = ngs.Mesh(unit_square.GenerateMesh(maxh=args.maxh))
+    region = mesh.Region(ngs.VOL)
+    cf = ngs.sin(10 * ngs.x) * ngs.cos(10 * ngs.y) * ngs.exp(ngs.x * ngs.y)
+    print(f"{mesh.ne} elements, {n_cores} cores")
+    print(f"{'order':>5} {'workers':>7} {'time [s]':>10} {'speedup':>8}")
+
+    for order in args.orders:
+        t_serial, reference = timeit(lambda: evaluate_cf(cf, region, order), args.repeat)
+        print(f"{order:>5} {1:>7} {t_serial:>10.4f} {1.0:>8.2f}")
+        for workers in args.workers:
+            if workers == 1:
+                continue
+            t, values = timeit(
+                lambda: evaluate_cf(
+                    cf, region, order, workers=workers, use_processes=args.processes
+                ),
+                args.repeat,
+            )
+            if not np.array_equal(values, reference):
+                raise RuntimeError("parallel result differs from serial evaluation")
+            print(f"{order:>5} {workers:>7} {t:>10.4f} {t_serial / t:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Benchmark of the host-side data pipeline (mesh geometry, function evaluation and payload encoding)
+
+Runs headless (NGSolve + NumPy, no GPU or browser needed) and reports for each stage
+wall time, peak memory of Python/NumPy allocations (tracemalloc) and output bytes per triangle.
+
+Usage:
+    python benchmark_pipeline.py                                # run default sweep
+    python benchmark_pipeline.py --save-baseline baseline.json  # store results
+    python benchmark_pipeline.py --baseline baseline.json       # compare, exit code 1 on regressions
+"""
+
+import argparse
+import base64
+import json
+import os
+import pickle
+import sys
+import time
+import tracemalloc
+
+import ngsolve as ngs
+import numpy as np
+from netgen.occ import unit_square
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "webgpu"))
+import protocol
+import render_data
+
+
+def _get_cf(comps):
+    components = [
+        ngs.sin(10 * ngs.x) * ngs.cos(10 * ngs.y),
+        ngs.exp(ngs.x * ngs.y),
+        ngs.x * ngs.x - ngs.y,
+    ]
+    return ngs.CF(tuple(components[:comps])) if comps > 1 else components[0]
+
+
+def _encode_data(data):
+    # same as webgpu.jupyter._encode_data, not imported from there since importing webgpu.jupyter
+    # outside the browser writes the package archive to its cache_dir and displays the loader script
+    return base64.b64encode(pickle.dumps(data)).decode("utf-8")
+
+
+def _scene_frame(data, compression=protocol.COMPRESSION_NONE, known_hashes=None):
+    # binary message as sent by WebGPUScene.draw_cf (nicegui/webgpu_scene.py)
+    return protocol.encode_message(
+        "draw",
+        {"n_trigs": data["n_trigs"], "n_edges": data["n_edges"]},
+        {
+            key: np.frombuffer(data[name], dtype=np.float32)
+            for key, name in [("trigs", "trigs"), ("edges", "edges"), ("trig_function_values", "cf")]
+        },
+        compression=compression,
+        hash_sections=True,
+        known_hashes=known_hashes,
+    )
+
+
+def _output_size(result):
+    if isinstance(result, (bytes, bytearray, str)):
+        return len(result)
+    if isinstance(result, dict):
+        return sum(_output_size(v) for v in result.values())
+    if hasattr(result, "nbytes"):
+        return result.nbytes
+    return 0
+
+
+def get_stages(mesh, order, comps):
+    """Stage name -> function, each stage is measured separately"""
+    region = mesh.Region(ngs.VOL)
+    cf = _get_cf(comps)
+
+    def bernstein():
+        render_data.clear_bernstein_cache()
+        return render_data.get_bernstein_trig(order).ibmat
+
+    def create_cf_data():
+        render_data.geometry_cache.clear()
+        return render_data.create_cf_data(cf, mesh, order)
+
+    cf_data = render_data.create_cf_data(cf, mesh, order)
+    # redraw of a new function on the same mesh, the browser already has the geometry buffers
+    mesh_hashes = {
+        protocol.section_hash(np.frombuffer(cf_data[name], dtype=np.float32))
+        for name in ["trigs", "edges"]
+    }
+
+    return {
+        "bernstein_matrix": bernstein,
+        "create_mesh_data": lambda: render_data.create_mesh_data(mesh, use_cache=False),
+        "create_indexed_mesh_data": lambda: render_data.create_indexed_mesh_data(
+            mesh, use_cache=False
+        ),
+        "evaluate_cf": lambda: render_data.evaluate_cf(cf, region, order),
+        "create_cf_data": create_cf_data,
+        "jupyter_encode_data": lambda: _encode_data({"cf": cf, "mesh": mesh}),
+        "scene_frame": lambda: _scene_frame(cf_data),
+        "scene_frame_compressed": lambda: _scene_frame(
+            cf_data, protocol.COMPRESSION_SHUFFLE_ZLIB
+        ),
+        "scene_frame_redraw": lambda: _scene_frame(cf_data, known_hashes=mesh_hashes),
+    }
+
+
+def measure(func, repeat):
+    """Returns best wall time [s], peak traced memory [bytes] and the result of the last call"""
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - t)
+        del result
+
+    tracemalloc.start()
+    result = func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak, result
+
+
+def run(maxhs, orders, comps_list, repeat):
+    results = {}
+    for maxh in maxhs:
+        mesh = ngs.Mesh(unit_square.GenerateMesh(maxh=maxh))
+        n_trigs = mesh.ne
+        for order in orders:
+            for comps in comps_list:
+                for stage, func in get_stages(mesh, order, comps).items():
+                    wall_time, peak, result = measure(func, repeat)
+                    key = f"{stage}/maxh={maxh}/order={order}/comps={comps}"
+                    results[key] = {
+                        "n_trigs": n_trigs,
+                        "time": wall_time,
+                        "peak_memory": peak,
+                        "bytes_per_trig": _output_size(result) / n_trigs,
+                    }
+                    print(
+                        f"{key:<55} {n_trigs:>8} trigs {1000 * wall_time:>10.2f} ms "
+                        f"{peak / 1024**2:>9.2f} MB peak {results[key]['bytes_per_trig']:>9.1f} B/trig"
+                    )
+    return results
+
+
+def compare(results, baseline, threshold, min_time):
+    """Returns list of regressions (time, peak memory or output size worse than baseline by more than threshold)"""
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        base = baseline[key]
+        for metric in ["time", "peak_memory", "bytes_per_trig"]:
+            if metric == "time" and base["time"] < min_time:
+                # too short to measure reliably
+                continue
+            if result[metric] > base[metric] * (1 + threshold) and result[metric] > 0:
+                ratio = result[metric] / base[metric] if base[metric] else float("inf")
+                regressions.append(
+                    f"{key} {metric}: {base[metric]:.4g} -> {result[metric]:.4g} ({ratio:.2f}x)"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--maxh", type=float, nargs="+", default=[0.1, 0.03, 0.01])
+    parser.add_argument("--orders", type=int, nargs="+", default=[1, 2, 6])
+    parser.add_argument("--comps", type=int, nargs="+", default=[1, 3])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", help="compare against results stored in this json file")
+    parser.add_argument("--save-baseline", help="store results in this json file")
+    parser.add_argument(
+        "--threshold", type=float, default=0.25, help="allowed relative slowdown/growth"
+    )
+    parser.add_argument(
+        "--min-time", type=float, default=1e-3, help="ignore timings of faster stages [s]"
+    )
+    args = parser.parse_args()
+
+    results = run(args.maxh, args.orders, args.comps, args.repeat)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print("saved baseline to", args.save_baseline)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_time)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            sys.exit(1)
+        print("no regressions compared to", args.baseline)
+
+
+if __name__ == "__main__":
+    main()
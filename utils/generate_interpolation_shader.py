@@ -42,15 +42,41 @@ def getReferenceRules(order, sd):
     return res
 
 
+_get_value_template = """
+fn get{eltype}Value(i: u32, format: u32) -> f32 {{
+    if format == FORMAT_F16 {{
+        let k: u32 = i - VALUES_OFFSET;
+        return unpack2x16float({values}[VALUES_OFFSET + k / 2])[k % 2];
+    }}
+    if format == FORMAT_UNORM16 {{
+        let k: u32 = i - VALUES_OFFSET;
+        let vmin: f32 = bitcast<f32>({values}[VALUES_OFFSET]);
+        let vmax: f32 = bitcast<f32>({values}[VALUES_OFFSET + 1]);
+        let v: f32 = unpack2x16unorm({values}[VALUES_OFFSET + 2 + k / 2])[k % 2];
+        return vmin + v * (vmax - vmin);
+    }}
+    return bitcast<f32>({values}[i]);
+}}
+"""
+
 _eval_template = """
 fn eval{eltype}{suffix}(id: u32, icomp: u32, lam: {lam_type}) -> f32 {{
-    let order: u32 = u32(trig_function_values[1]);
-    let ncomp: u32 = u32(trig_function_values[0]);
+    let ncomp: u32 = u32(bitcast<f32>(trig_function_values[0]));
+    let order_format: u32 = u32(bitcast<f32>(trig_function_values[1]));
+    var order: u32 = order_format & 0xffu;
+    let format: u32 = order_format >> 8u;
     let ndof: u32 = {ndof_expr};
 
-    let offset: u32 = ndof * id + VALUES_OFFSET;
+    var offset: u32 = ndof * id + VALUES_OFFSET;
     let stride: u32 = ncomp;
 
+    if order == 0 {{
+        // adaptive order, the element table after the header stores (offset << 3) | order
+        let entry: u32 = {values}[VALUES_OFFSET + id];
+        order = entry & 7u;
+        offset = entry >> 3u;
+    }}
+
 {switch_order}
     return 0.0;
 }}
@@ -267,10 +293,10 @@ def GenerateInterpolationFunction(et, orders, scal_dims):
 
         def code_get_vec(dim, i=0):
             if dim == 1:
-                return f"{eltype.lower()}_function_values[offset+{i}*stride]"
+                return f"get{eltype}Value(offset+{i}*stride, format)"
             code = f"vec{dim}<f32>("
             for i in range(dim):
-                code += f"{eltype.lower()}_function_values[offset+{i}*stride]"
+                code += f"get{eltype}Value(offset+{i}*stride, format)"
                 if i < dim - 1:
                     code += ", "
             code += ")"
@@ -285,7 +311,7 @@ def GenerateInterpolationFunction(et, orders, scal_dims):
                 scal = f"vec{scal_dim}<f32>"
                 suffix = f"V{scal_dim}"
 
-            code += f"fn eval{eltype}P{p}{suffix}(offset: u32, stride: u32, lam: {lam_type}) -> {scal} {{\n"
+            code += f"fn eval{eltype}P{p}{suffix}(offset: u32, stride: u32, format: u32, lam: {lam_type}) -> {scal} {{\n"
             code += f"    let basis = eval{eltype}P{p}Basis(lam);\n"
             code += f"    var result: {scal} = basis[0] * {code_get_vec(scal_dim)};\n"
             for i in range(1, ndof):
@@ -294,6 +320,9 @@ def GenerateInterpolationFunction(et, orders, scal_dims):
             code += f"}}\n\n"
         result += code
 
+    result += _get_value_template.format(
+        eltype=eltype, values=f"{eltype.lower()}_function_values"
+    )
     for scal_dim in scal_dims:
         if scal_dim == 1:
             scal = "f32"
@@ -302,14 +331,25 @@ def GenerateInterpolationFunction(et, orders, scal_dims):
             scal = f"vec{scal_dim}<f32>"
             suffix = f"V{scal_dim}"
         switch_order = ""
+        values = f"{eltype.lower()}_function_values"
         orders_ = sorted(list(set(list(orders) + [1])))
         for p in orders_:
-            switch_order += f"    if order == {p} {{ return eval{eltype}P{p}{suffix}(offset, stride, lam); }}\n"
+            if p > 1:
+                switch_order += f"#if MAX_ORDER >= {p}\n"
+            switch_order += f"    if order == {p} {{ return eval{eltype}P{p}{suffix}(offset, stride, format, lam); }}\n"
+            if p > 1:
+                switch_order += "#endif\n"
         result += _eval_template.format(**locals())
     return result
 
 
-code = ""
+# MAX_ORDER can be defined when the shader is assembled (see webgpu/wgsl.py)
+code = """// highest polynomial order of the function values, lower values strip the evaluation of higher orders
+#ifndef MAX_ORDER
+#define MAX_ORDER 6
+#endif
+
+"""
 for et in [ET.SEGM, ET.TRIG, ET.TET][0:2]:
     code += GenerateInterpolationFunction(et, orders=range(1, 7), scal_dims=range(1, 2))
 
@@ -1,12 +1,17 @@
+// highest polynomial order of the function values, lower values strip the evaluation of higher orders
+#ifndef MAX_ORDER
+#define MAX_ORDER 6
+#endif
+
 fn evalSegP1Basis(x: f32) -> array<f32, 2> {
     let y = 1.0 - x;
     return array(x, y);
 }
 
-fn evalSegP1(offset: u32, stride: u32, lam: f32) -> f32 {
+fn evalSegP1(offset: u32, stride: u32, format: u32, lam: f32) -> f32 {
     let basis = evalSegP1Basis(lam);
-    var result: f32 = basis[0] * seg_function_values[offset + 0 * stride];
-    result += basis[1] * seg_function_values[offset + 1 * stride];
+    var result: f32 = basis[0] * getSegValue(offset + 0 * stride, format);
+    result += basis[1] * getSegValue(offset + 1 * stride, format);
     return result;
 }
 
@@ -15,11 +20,11 @@ fn evalSegP2Basis(x: f32) -> array<f32, 3> {
     return array(x * x, 2.0 * x * y, y * y);
 }
 
-fn evalSegP2(offset: u32, stride: u32, lam: f32) -> f32 {
+fn evalSegP2(offset: u32, stride: u32, format: u32, lam: f32) -> f32 {
     let basis = evalSegP2Basis(lam);
-    var result: f32 = basis[0] * seg_function_values[offset + 0 * stride];
-    result += basis[1] * seg_function_values[offset + 1 * stride];
-    result += basis[2] * seg_function_values[offset + 2 * stride];
+    var result: f32 = basis[0] * getSegValue(offset + 0 * stride, format);
+    result += basis[1] * getSegValue(offset + 1 * stride, format);
+    result += basis[2] * getSegValue(offset + 2 * stride, format);
     return result;
 }
 
@@ -28,12 +33,12 @@ fn evalSegP3Basis(x: f32) -> array<f32, 4> {
     return array(x * x * x, 3.0 * x * x * y, 3.0 * x * y * y, y * y * y);
 }
 
-fn evalSegP3(offset: u32, stride: u32, lam: f32) -> f32 {
+fn evalSegP3(offset: u32, stride: u32, format: u32, lam: f32) -> f32 {
     let basis = evalSegP3Basis(lam);
-    var result: f32 = basis[0] * seg_function_values[offset + 0 * stride];
-    result += basis[1] * seg_function_values[offset + 1 * stride];
-    result += basis[2] * seg_function_values[offset + 2 * stride];
-    result += basis[3] * seg_function_values[offset + 3 * stride];
+    var result: f32 = basis[0] * getSegValue(offset + 0 * stride, format);
+    result += basis[1] * getSegValue(offset + 1 * stride, format);
+    result += basis[2] * getSegValue(offset + 2 * stride, format);
+    result += basis[3] * getSegValue(offset + 3 * stride, format);
     return result;
 }
 
@@ -42,13 +47,13 @@ fn evalSegP4Basis(x: f32) -> array<f32, 5> {
     return array(x * x * x * x, 4.0 * x * x * x * y, 6.0 * x * x * y * y, 4.0 * x * y * y * y, y * y * y * y);
 }
 
-fn evalSegP4(offset: u32, stride: u32, lam: f32) -> f32 {
+fn evalSegP4(offset: u32, stride: u32, format: u32, lam: f32) -> f32 {
     let basis = evalSegP4Basis(lam);
-    var result: f32 = basis[0] * seg_function_values[offset + 0 * stride];
-    result += basis[1] * seg_function_values[offset + 1 * stride];
-    result += basis[2] * seg_function_values[offset + 2 * stride];
-    result += basis[3] * seg_function_values[offset + 3 * stride];
-    result += basis[4] * seg_function_values[offset + 4 * stride];
+    var result: f32 = basis[0] * getSegValue(offset + 0 * stride, format);
+    result += basis[1] * getSegValue(offset + 1 * stride, format);
+    result += basis[2] * getSegValue(offset + 2 * stride, format);
+    result += basis[3] * getSegValue(offset + 3 * stride, format);
+    result += basis[4] * getSegValue(offset + 4 * stride, format);
     return result;
 }
 
@@ -57,14 +62,14 @@ fn evalSegP5Basis(x: f32) -> array<f32, 6> {
     return array(x * x * x * x * x, 5.0 * x * x * x * x * y, 10.0 * x * x * x * y * y, 10.0 * x * x * y * y * y, 5.0 * x * y * y * y * y, y * y * y * y * y);
 }
 
-fn evalSegP5(offset: u32, stride: u32, lam: f32) -> f32 {
+fn evalSegP5(offset: u32, stride: u32, format: u32, lam: f32) -> f32 {
     let basis = evalSegP5Basis(lam);
-    var result: f32 = basis[0] * seg_function_values[offset + 0 * stride];
-    result += basis[1] * seg_function_values[offset + 1 * stride];
-    result += basis[2] * seg_function_values[offset + 2 * stride];
-    result += basis[3] * seg_function_values[offset + 3 * stride];
-    result += basis[4] * seg_function_values[offset + 4 * stride];
-    result += basis[5] * seg_function_values[offset + 5 * stride];
+    var result: f32 = basis[0] * getSegValue(offset + 0 * stride, format);
+    result += basis[1] * getSegValue(offset + 1 * stride, format);
+    result += basis[2] * getSegValue(offset + 2 * stride, format);
+    result += basis[3] * getSegValue(offset + 3 * stride, format);
+    result += basis[4] * getSegValue(offset + 4 * stride, format);
+    result += basis[5] * getSegValue(offset + 5 * stride, format);
     return result;
 }
 
@@ -73,33 +78,68 @@ fn evalSegP6Basis(x: f32) -> array<f32, 7> {
     return array(x * x * x * x * x * x, 6.0 * x * x * x * x * x * y, 15.0 * x * x * x * x * y * y, 20.0 * x * x * x * y * y * y, 15.0 * x * x * y * y * y * y, 6.0 * x * y * y * y * y * y, y * y * y * y * y * y);
 }
 
-fn evalSegP6(offset: u32, stride: u32, lam: f32) -> f32 {
+fn evalSegP6(offset: u32, stride: u32, format: u32, lam: f32) -> f32 {
     let basis = evalSegP6Basis(lam);
-    var result: f32 = basis[0] * seg_function_values[offset + 0 * stride];
-    result += basis[1] * seg_function_values[offset + 1 * stride];
-    result += basis[2] * seg_function_values[offset + 2 * stride];
-    result += basis[3] * seg_function_values[offset + 3 * stride];
-    result += basis[4] * seg_function_values[offset + 4 * stride];
-    result += basis[5] * seg_function_values[offset + 5 * stride];
-    result += basis[6] * seg_function_values[offset + 6 * stride];
+    var result: f32 = basis[0] * getSegValue(offset + 0 * stride, format);
+    result += basis[1] * getSegValue(offset + 1 * stride, format);
+    result += basis[2] * getSegValue(offset + 2 * stride, format);
+    result += basis[3] * getSegValue(offset + 3 * stride, format);
+    result += basis[4] * getSegValue(offset + 4 * stride, format);
+    result += basis[5] * getSegValue(offset + 5 * stride, format);
+    result += basis[6] * getSegValue(offset + 6 * stride, format);
     return result;
 }
 
 
+fn getSegValue(i: u32, format: u32) -> f32 {
+    if format == FORMAT_F16 {
+        let k: u32 = i - VALUES_OFFSET;
+        return unpack2x16float(seg_function_values[VALUES_OFFSET + k / 2])[k % 2];
+    }
+    if format == FORMAT_UNORM16 {
+        let k: u32 = i - VALUES_OFFSET;
+        let vmin: f32 = bitcast<f32>(seg_function_values[VALUES_OFFSET]);
+        let vmax: f32 = bitcast<f32>(seg_function_values[VALUES_OFFSET + 1]);
+        let v: f32 = unpack2x16unorm(seg_function_values[VALUES_OFFSET + 2 + k / 2])[k % 2];
+        return vmin + v * (vmax - vmin);
+    }
+    return bitcast<f32>(seg_function_values[i]);
+}
+
+
 fn evalSeg(id: u32, icomp: u32, lam: f32) -> f32 {
-    let order: u32 = u32(trig_function_values[1]);
-    let ncomp: u32 = u32(trig_function_values[0]);
+    let ncomp: u32 = u32(bitcast<f32>(trig_function_values[0]));
+    let order_format: u32 = u32(bitcast<f32>(trig_function_values[1]));
+    var order: u32 = order_format & 0xffu;
+    let format: u32 = order_format >> 8u;
     let ndof: u32 = order + 1;
 
-    let offset: u32 = ndof * id + VALUES_OFFSET;
+    var offset: u32 = ndof * id + VALUES_OFFSET;
     let stride: u32 = ncomp;
 
-    if order == 1 { return evalSegP1(offset, stride, lam); }
-    if order == 2 { return evalSegP2(offset, stride, lam); }
-    if order == 3 { return evalSegP3(offset, stride, lam); }
-    if order == 4 { return evalSegP4(offset, stride, lam); }
-    if order == 5 { return evalSegP5(offset, stride, lam); }
-    if order == 6 { return evalSegP6(offset, stride, lam); }
+    if order == 0 {
+        // adaptive order, the element table after the header stores (offset << 3) | order
+        let entry: u32 = seg_function_values[VALUES_OFFSET + id];
+        order = entry & 7u;
+        offset = entry >> 3u;
+    }
+
+    if order == 1 { return evalSegP1(offset, stride, format, lam); }
+#if MAX_ORDER >= 2
+    if order == 2 { return evalSegP2(offset, stride, format, lam); }
+#endif
+#if MAX_ORDER >= 3
+    if order == 3 { return evalSegP3(offset, stride, format, lam); }
+#endif
+#if MAX_ORDER >= 4
+    if order == 4 { return evalSegP4(offset, stride, format, lam); }
+#endif
+#if MAX_ORDER >= 5
+    if order == 5 { return evalSegP5(offset, stride, format, lam); }
+#endif
+#if MAX_ORDER >= 6
+    if order == 6 { return evalSegP6(offset, stride, format, lam); }
+#endif
 
     return 0.0;
 }
@@ -110,11 +150,11 @@ fn evalTrigP1Basis(lam: vec2<f32>) -> array<f32, 3> {
     return array(x, y, z);
 }
 
-fn evalTrigP1(offset: u32, stride: u32, lam: vec2<f32>) -> f32 {
+fn evalTrigP1(offset: u32, stride: u32, format: u32, lam: vec2<f32>) -> f32 {
     let basis = evalTrigP1Basis(lam);
-    var result: f32 = basis[0] * trig_function_values[offset + 0 * stride];
-    result += basis[1] * trig_function_values[offset + 1 * stride];
-    result += basis[2] * trig_function_values[offset + 2 * stride];
+    var result: f32 = basis[0] * getTrigValue(offset + 0 * stride, format);
+    result += basis[1] * getTrigValue(offset + 1 * stride, format);
+    result += basis[2] * getTrigValue(offset + 2 * stride, format);
     return result;
 }
 
@@ -126,14 +166,14 @@ fn evalTrigP2Basis(lam: vec2<f32>) -> array<f32, 6> {
     return array(x * x, x0 * y, y * y, x0 * z, 2.0 * y * z, z * z);
 }
 
-fn evalTrigP2(offset: u32, stride: u32, lam: vec2<f32>) -> f32 {
+fn evalTrigP2(offset: u32, stride: u32, format: u32, lam: vec2<f32>) -> f32 {
     let basis = evalTrigP2Basis(lam);
-    var result: f32 = basis[0] * trig_function_values[offset + 0 * stride];
-    result += basis[1] * trig_function_values[offset + 1 * stride];
-    result += basis[2] * trig_function_values[offset + 2 * stride];
-    result += basis[3] * trig_function_values[offset + 3 * stride];
-    result += basis[4] * trig_function_values[offset + 4 * stride];
-    result += basis[5] * trig_function_values[offset + 5 * stride];
+    var result: f32 = basis[0] * getTrigValue(offset + 0 * stride, format);
+    result += basis[1] * getTrigValue(offset + 1 * stride, format);
+    result += basis[2] * getTrigValue(offset + 2 * stride, format);
+    result += basis[3] * getTrigValue(offset + 3 * stride, format);
+    result += basis[4] * getTrigValue(offset + 4 * stride, format);
+    result += basis[5] * getTrigValue(offset + 5 * stride, format);
     return result;
 }
 
@@ -147,18 +187,18 @@ fn evalTrigP3Basis(lam: vec2<f32>) -> array<f32, 10> {
     return array(x * x * x, x0 * y, x * x1, y * y * y, x0 * z, 6.0 * x * y * z, x1 * z, x * x2, x2 * y, z * z * z);
 }
 
-fn evalTrigP3(offset: u32, stride: u32, lam: vec2<f32>) -> f32 {
+fn evalTrigP3(offset: u32, stride: u32, format: u32, lam: vec2<f32>) -> f32 {
     let basis = evalTrigP3Basis(lam);
-    var result: f32 = basis[0] * trig_function_values[offset + 0 * stride];
-    result += basis[1] * trig_function_values[offset + 1 * stride];
-    result += basis[2] * trig_function_values[offset + 2 * stride];
-    result += basis[3] * trig_function_values[offset + 3 * stride];
-    result += basis[4] * trig_function_values[offset + 4 * stride];
-    result += basis[5] * trig_function_values[offset + 5 * stride];
-    result += basis[6] * trig_function_values[offset + 6 * stride];
-    result += basis[7] * trig_function_values[offset + 7 * stride];
-    result += basis[8] * trig_function_values[offset + 8 * stride];
-    result += basis[9] * trig_function_values[offset + 9 * stride];
+    var result: f32 = basis[0] * getTrigValue(offset + 0 * stride, format);
+    result += basis[1] * getTrigValue(offset + 1 * stride, format);
+    result += basis[2] * getTrigValue(offset + 2 * stride, format);
+    result += basis[3] * getTrigValue(offset + 3 * stride, format);
+    result += basis[4] * getTrigValue(offset + 4 * stride, format);
+    result += basis[5] * getTrigValue(offset + 5 * stride, format);
+    result += basis[6] * getTrigValue(offset + 6 * stride, format);
+    result += basis[7] * getTrigValue(offset + 7 * stride, format);
+    result += basis[8] * getTrigValue(offset + 8 * stride, format);
+    result += basis[9] * getTrigValue(offset + 9 * stride, format);
     return result;
 }
 
@@ -177,23 +217,23 @@ fn evalTrigP4Basis(lam: vec2<f32>) -> array<f32, 15> {
     return array(x * x * x * x, x0 * y, x1 * x3, x * x4, y * y * y * y, x0 * z, x2 * x5 * y, x * x1 * x5, x4 * z, x3 * x6, 12.0 * x * x6 * y, 6.0 * x1 * x6, x * x7, x7 * y, z * z * z * z);
 }
 
-fn evalTrigP4(offset: u32, stride: u32, lam: vec2<f32>) -> f32 {
+fn evalTrigP4(offset: u32, stride: u32, format: u32, lam: vec2<f32>) -> f32 {
     let basis = evalTrigP4Basis(lam);
-    var result: f32 = basis[0] * trig_function_values[offset + 0 * stride];
-    result += basis[1] * trig_function_values[offset + 1 * stride];
-    result += basis[2] * trig_function_values[offset + 2 * stride];
-    result += basis[3] * trig_function_values[offset + 3 * stride];
-    result += basis[4] * trig_function_values[offset + 4 * stride];
-    result += basis[5] * trig_function_values[offset + 5 * stride];
-    result += basis[6] * trig_function_values[offset + 6 * stride];
-    result += basis[7] * trig_function_values[offset + 7 * stride];
-    result += basis[8] * trig_function_values[offset + 8 * stride];
-    result += basis[9] * trig_function_values[offset + 9 * stride];
-    result += basis[10] * trig_function_values[offset + 10 * stride];
-    result += basis[11] * trig_function_values[offset + 11 * stride];
-    result += basis[12] * trig_function_values[offset + 12 * stride];
-    result += basis[13] * trig_function_values[offset + 13 * stride];
-    result += basis[14] * trig_function_values[offset + 14 * stride];
+    var result: f32 = basis[0] * getTrigValue(offset + 0 * stride, format);
+    result += basis[1] * getTrigValue(offset + 1 * stride, format);
+    result += basis[2] * getTrigValue(offset + 2 * stride, format);
+    result += basis[3] * getTrigValue(offset + 3 * stride, format);
+    result += basis[4] * getTrigValue(offset + 4 * stride, format);
+    result += basis[5] * getTrigValue(offset + 5 * stride, format);
+    result += basis[6] * getTrigValue(offset + 6 * stride, format);
+    result += basis[7] * getTrigValue(offset + 7 * stride, format);
+    result += basis[8] * getTrigValue(offset + 8 * stride, format);
+    result += basis[9] * getTrigValue(offset + 9 * stride, format);
+    result += basis[10] * getTrigValue(offset + 10 * stride, format);
+    result += basis[11] * getTrigValue(offset + 11 * stride, format);
+    result += basis[12] * getTrigValue(offset + 12 * stride, format);
+    result += basis[13] * getTrigValue(offset + 13 * stride, format);
+    result += basis[14] * getTrigValue(offset + 14 * stride, format);
     return result;
 }
 
@@ -218,29 +258,29 @@ fn evalTrigP5Basis(lam: vec2<f32>) -> array<f32, 21> {
     return array(x * x * x * x * x, x0 * y, x1 * x3, x4 * x6, x * x7, y * y * y * y * y, x0 * z, x2 * x8 * y, x1 * x9 * z, x * x5 * x8, x7 * z, x10 * x3, x10 * x9 * y, 30.0 * x * x1 * x10, x10 * x6, x12 * x4, 20.0 * x * x11 * y, x1 * x12, x * x13, x13 * y, z * z * z * z * z);
 }
 
-fn evalTrigP5(offset: u32, stride: u32, lam: vec2<f32>) -> f32 {
+fn evalTrigP5(offset: u32, stride: u32, format: u32, lam: vec2<f32>) -> f32 {
     let basis = evalTrigP5Basis(lam);
-    var result: f32 = basis[0] * trig_function_values[offset + 0 * stride];
-    result += basis[1] * trig_function_values[offset + 1 * stride];
-    result += basis[2] * trig_function_values[offset + 2 * stride];
-    result += basis[3] * trig_function_values[offset + 3 * stride];
-    result += basis[4] * trig_function_values[offset + 4 * stride];
-    result += basis[5] * trig_function_values[offset + 5 * stride];
-    result += basis[6] * trig_function_values[offset + 6 * stride];
-    result += basis[7] * trig_function_values[offset + 7 * stride];
-    result += basis[8] * trig_function_values[offset + 8 * stride];
-    result += basis[9] * trig_function_values[offset + 9 * stride];
-    result += basis[10] * trig_function_values[offset + 10 * stride];
-    result += basis[11] * trig_function_values[offset + 11 * stride];
-    result += basis[12] * trig_function_values[offset + 12 * stride];
-    result += basis[13] * trig_function_values[offset + 13 * stride];
-    result += basis[14] * trig_function_values[offset + 14 * stride];
-    result += basis[15] * trig_function_values[offset + 15 * stride];
-    result += basis[16] * trig_function_values[offset + 16 * stride];
-    result += basis[17] * trig_function_values[offset + 17 * stride];
-    result += basis[18] * trig_function_values[offset + 18 * stride];
-    result += basis[19] * trig_function_values[offset + 19 * stride];
-    result += basis[20] * trig_function_values[offset + 20 * stride];
+    var result: f32 = basis[0] * getTrigValue(offset + 0 * stride, format);
+    result += basis[1] * getTrigValue(offset + 1 * stride, format);
+    result += basis[2] * getTrigValue(offset + 2 * stride, format);
+    result += basis[3] * getTrigValue(offset + 3 * stride, format);
+    result += basis[4] * getTrigValue(offset + 4 * stride, format);
+    result += basis[5] * getTrigValue(offset + 5 * stride, format);
+    result += basis[6] * getTrigValue(offset + 6 * stride, format);
+    result += basis[7] * getTrigValue(offset + 7 * stride, format);
+    result += basis[8] * getTrigValue(offset + 8 * stride, format);
+    result += basis[9] * getTrigValue(offset + 9 * stride, format);
+    result += basis[10] * getTrigValue(offset + 10 * stride, format);
+    result += basis[11] * getTrigValue(offset + 11 * stride, format);
+    result += basis[12] * getTrigValue(offset + 12 * stride, format);
+    result += basis[13] * getTrigValue(offset + 13 * stride, format);
+    result += basis[14] * getTrigValue(offset + 14 * stride, format);
+    result += basis[15] * getTrigValue(offset + 15 * stride, format);
+    result += basis[16] * getTrigValue(offset + 16 * stride, format);
+    result += basis[17] * getTrigValue(offset + 17 * stride, format);
+    result += basis[18] * getTrigValue(offset + 18 * stride, format);
+    result += basis[19] * getTrigValue(offset + 19 * stride, format);
+    result += basis[20] * getTrigValue(offset + 20 * stride, format);
     return result;
 }
 
@@ -271,54 +311,89 @@ fn evalTrigP6Basis(lam: vec2<f32>) -> array<f32, 28> {
     return array(x * x * x * x * x * x, x0 * y, x1 * x3, x4 * x6, x7 * x9, x * x10, y * y * y * y * y * y, x0 * z, x11 * x2 * y, x1 * x12 * x5, x12 * x4 * x7, x * x11 * x8, x10 * z, x13 * x3, x14 * x5 * y, 90.0 * x1 * x13 * x7, x * x14 * x4, x13 * x9, x15 * x6, x16 * x7 * y, x * x1 * x16, 20.0 * x15 * x4, x18 * x7, 30.0 * x * x17 * y, x1 * x18, x * x19, x19 * y, z * z * z * z * z * z);
 }
 
-fn evalTrigP6(offset: u32, stride: u32, lam: vec2<f32>) -> f32 {
+fn evalTrigP6(offset: u32, stride: u32, format: u32, lam: vec2<f32>) -> f32 {
     let basis = evalTrigP6Basis(lam);
-    var result: f32 = basis[0] * trig_function_values[offset + 0 * stride];
-    result += basis[1] * trig_function_values[offset + 1 * stride];
-    result += basis[2] * trig_function_values[offset + 2 * stride];
-    result += basis[3] * trig_function_values[offset + 3 * stride];
-    result += basis[4] * trig_function_values[offset + 4 * stride];
-    result += basis[5] * trig_function_values[offset + 5 * stride];
-    result += basis[6] * trig_function_values[offset + 6 * stride];
-    result += basis[7] * trig_function_values[offset + 7 * stride];
-    result += basis[8] * trig_function_values[offset + 8 * stride];
-    result += basis[9] * trig_function_values[offset + 9 * stride];
-    result += basis[10] * trig_function_values[offset + 10 * stride];
-    result += basis[11] * trig_function_values[offset + 11 * stride];
-    result += basis[12] * trig_function_values[offset + 12 * stride];
-    result += basis[13] * trig_function_values[offset + 13 * stride];
-    result += basis[14] * trig_function_values[offset + 14 * stride];
-    result += basis[15] * trig_function_values[offset + 15 * stride];
-    result += basis[16] * trig_function_values[offset + 16 * stride];
-    result += basis[17] * trig_function_values[offset + 17 * stride];
-    result += basis[18] * trig_function_values[offset + 18 * stride];
-    result += basis[19] * trig_function_values[offset + 19 * stride];
-    result += basis[20] * trig_function_values[offset + 20 * stride];
-    result += basis[21] * trig_function_values[offset + 21 * stride];
-    result += basis[22] * trig_function_values[offset + 22 * stride];
-    result += basis[23] * trig_function_values[offset + 23 * stride];
-    result += basis[24] * trig_function_values[offset + 24 * stride];
-    result += basis[25] * trig_function_values[offset + 25 * stride];
-    result += basis[26] * trig_function_values[offset + 26 * stride];
-    result += basis[27] * trig_function_values[offset + 27 * stride];
+    var result: f32 = basis[0] * getTrigValue(offset + 0 * stride, format);
+    result += basis[1] * getTrigValue(offset + 1 * stride, format);
+    result += basis[2] * getTrigValue(offset + 2 * stride, format);
+    result += basis[3] * getTrigValue(offset + 3 * stride, format);
+    result += basis[4] * getTrigValue(offset + 4 * stride, format);
+    result += basis[5] * getTrigValue(offset + 5 * stride, format);
+    result += basis[6] * getTrigValue(offset + 6 * stride, format);
+    result += basis[7] * getTrigValue(offset + 7 * stride, format);
+    result += basis[8] * getTrigValue(offset + 8 * stride, format);
+    result += basis[9] * getTrigValue(offset + 9 * stride, format);
+    result += basis[10] * getTrigValue(offset + 10 * stride, format);
+    result += basis[11] * getTrigValue(offset + 11 * stride, format);
+    result += basis[12] * getTrigValue(offset + 12 * stride, format);
+    result += basis[13] * getTrigValue(offset + 13 * stride, format);
+    result += basis[14] * getTrigValue(offset + 14 * stride, format);
+    result += basis[15] * getTrigValue(offset + 15 * stride, format);
+    result += basis[16] * getTrigValue(offset + 16 * stride, format);
+    result += basis[17] * getTrigValue(offset + 17 * stride, format);
+    result += basis[18] * getTrigValue(offset + 18 * stride, format);
+    result += basis[19] * getTrigValue(offset + 19 * stride, format);
+    result += basis[20] * getTrigValue(offset + 20 * stride, format);
+    result += basis[21] * getTrigValue(offset + 21 * stride, format);
+    result += basis[22] * getTrigValue(offset + 22 * stride, format);
+    result += basis[23] * getTrigValue(offset + 23 * stride, format);
+    result += basis[24] * getTrigValue(offset + 24 * stride, format);
+    result += basis[25] * getTrigValue(offset + 25 * stride, format);
+    result += basis[26] * getTrigValue(offset + 26 * stride, format);
+    result += basis[27] * getTrigValue(offset + 27 * stride, format);
     return result;
 }
 
 
+fn getTrigValue(i: u32, format: u32) -> f32 {
+    if format == FORMAT_F16 {
+        let k: u32 = i - VALUES_OFFSET;
+        return unpack2x16float(trig_function_values[VALUES_OFFSET + k / 2])[k % 2];
+    }
+    if format == FORMAT_UNORM16 {
+        let k: u32 = i - VALUES_OFFSET;
+        let vmin: f32 = bitcast<f32>(trig_function_values[VALUES_OFFSET]);
+        let vmax: f32 = bitcast<f32>(trig_function_values[VALUES_OFFSET + 1]);
+        let v: f32 = unpack2x16unorm(trig_function_values[VALUES_OFFSET + 2 + k / 2])[k % 2];
+        return vmin + v * (vmax - vmin);
+    }
+    return bitcast<f32>(trig_function_values[i]);
+}
+
+
 fn evalTrig(id: u32, icomp: u32, lam: vec2<f32>) -> f32 {
-    let order: u32 = u32(trig_function_values[1]);
-    let ncomp: u32 = u32(trig_function_values[0]);
+    let ncomp: u32 = u32(bitcast<f32>(trig_function_values[0]));
+    let order_format: u32 = u32(bitcast<f32>(trig_function_values[1]));
+    var order: u32 = order_format & 0xffu;
+    let format: u32 = order_format >> 8u;
     let ndof: u32 = (order + 1) * (order + 2) / 2;
 
-    let offset: u32 = ndof * id + VALUES_OFFSET;
+    var offset: u32 = ndof * id + VALUES_OFFSET;
     let stride: u32 = ncomp;
 
-    if order == 1 { return evalTrigP1(offset, stride, lam); }
-    if order == 2 { return evalTrigP2(offset, stride, lam); }
-    if order == 3 { return evalTrigP3(offset, stride, lam); }
-    if order == 4 { return evalTrigP4(offset, stride, lam); }
-    if order == 5 { return evalTrigP5(offset, stride, lam); }
-    if order == 6 { return evalTrigP6(offset, stride, lam); }
+    if order == 0 {
+        // adaptive order, the element table after the header stores (offset << 3) | order
+        let entry: u32 = trig_function_values[VALUES_OFFSET + id];
+        order = entry & 7u;
+        offset = entry >> 3u;
+    }
+
+    if order == 1 { return evalTrigP1(offset, stride, format, lam); }
+#if MAX_ORDER >= 2
+    if order == 2 { return evalTrigP2(offset, stride, format, lam); }
+#endif
+#if MAX_ORDER >= 3
+    if order == 3 { return evalTrigP3(offset, stride, format, lam); }
+#endif
+#if MAX_ORDER >= 4
+    if order == 4 { return evalTrigP4(offset, stride, format, lam); }
+#endif
+#if MAX_ORDER >= 5
+    if order == 5 { return evalTrigP5(offset, stride, format, lam); }
+#endif
+#if MAX_ORDER >= 6
+    if order == 6 { return evalTrigP6(offset, stride, format, lam); }
+#endif
 
     return 0.0;
 }
@@ -4,8 +4,10 @@ import js
 
 from .colormap import Colormap
 from .input_handler import InputHandler
+from .profiler import GpuProfiler
+from .scheduler import FrameScheduler
 from .uniforms import Uniforms
-from .utils import to_js
+from .utils import PipelineCache, create_once_callable, create_proxy, mark_stage, to_js
 
 
 async def init_webgpu(canvas):
@@ -58,13 +60,24 @@ async def init_webgpu(canvas):
 
 
 class WebGPU:
-    """WebGPU management class, handles "global" state, like device, canvas, frame/depth buffer, colormap and uniforms"""
+    """WebGPU management class, handles "global" state, like device, canvas, frame/depth buffer, colormap and uniforms.
+    Frames are rendered on demand by the scheduler, call invalidate() after changing the scene"""
 
     def __init__(self, device, canvas):
-        self.render_function = None
+        self._render_function = None
+        self.scheduler = FrameScheduler(
+            self._render_frame, self._request_frame, js.cancelAnimationFrame
+        )
+        self._frame_callback = create_proxy(self.scheduler.on_frame)
         self.device = device
         self.format = js.navigator.gpu.getPreferredCanvasFormat()
         self.canvas = canvas
+        # compiled shaders and pipelines, shared by all render objects on this device
+        self.pipeline_cache = PipelineCache()
+        # GPU time per pass (if the device supports timestamp queries), see profiler.stats()
+        self.profiler = GpuProfiler(
+            device, to_js=to_js, once_callable=create_once_callable
+        )
 
         print("canvas", canvas.width, canvas.height, canvas)
 
@@ -97,12 +110,39 @@ class WebGPU:
                 }
             )
         )
-        self.input_handler = InputHandler(canvas, self.uniforms)
-
-    def begin_render_pass(self, command_encoder, loadOp):
+        self.input_handler = InputHandler(canvas, self.uniforms, self.scheduler)
+
+    def _request_frame(self):
+        return js.requestAnimationFrame(self._frame_callback)
+
+    def _render_frame(self, time):
+        if self._render_function is None:
+            return
+        # copy camera position etc. to the GPU (if changed)
+        self.uniforms.update_buffer()
+        self.profiler.begin_frame()
+        encoder = self.device.createCommandEncoder()
+        self._render_function(encoder)
+        self.profiler.end_frame(encoder)
+        self.device.queue.submit([encoder.finish()])
+        self.profiler.submitted()
+        mark_stage("first_frame")
+
+    def set_render_function(self, render_function):
+        """render_function(encoder) records the render commands of a frame, the frame is rendered in the next animation frame"""
+        self._render_function = render_function
+        self.invalidate()
+
+    def invalidate(self):
+        """The scene changed, render it in the next animation frame"""
+        self.scheduler.invalidate()
+
+    def begin_render_pass(self, command_encoder, loadOp, label="render"):
+        """Render pass on the canvas with depth buffer, label is the pass name in the profiler statistics"""
         render_pass_encoder = command_encoder.beginRenderPass(
             to_js(
                 {
+                    "label": label,
                     "colorAttachments": [
                         {
                             "view": self.context.getCurrentTexture().createView(),
@@ -119,6 +159,7 @@ class WebGPU:
                         "depthStoreOp": "store",
                         "depthClearValue": 1.0,
                     },
+                    **self.profiler.timestamp_writes(label),
                 },
             )
         )
@@ -128,6 +169,9 @@ class WebGPU:
         return render_pass_encoder
 
     def __del__(self):
+        self.scheduler.cancel()
+        self._frame_callback.destroy()
+        self.profiler.destroy()
         self.depth_texture.destroy()
         del self.uniforms
         del self.colormap
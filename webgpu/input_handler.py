@@ -1,13 +1,12 @@
-import js
-
 from .utils import create_proxy
 
 
 class InputHandler:
-    def __init__(self, canvas, uniforms, render_function=None):
+    def __init__(self, canvas, uniforms, scheduler=None):
         self.canvas = canvas
         self.uniforms = uniforms
-        self.render_function = render_function
+        # FrameScheduler, invalidated when the camera changes
+        self.scheduler = scheduler
         self._is_moving = False
 
         self._callbacks = {}
@@ -24,8 +23,8 @@ class InputHandler:
         if self._is_moving:
             self.uniforms.mat[12] += ev.movementX / self.canvas.width * 1.8
             self.uniforms.mat[13] -= ev.movementY / self.canvas.height * 1.8
-            if self.render_function:
-                js.requestAnimationFrame(self.render_function)
+            if self.scheduler:
+                self.scheduler.invalidate()
 
     def unregister_callbacks(self):
         for event in self._callbacks:
@@ -49,7 +48,3 @@ class InputHandler:
 
     def __del__(self):
         self.unregister_callbacks()
-        if self.render_function:
-            js.cancelAnimationFrame(self.render_function)
-            self.render_function.destroy()
-            self.render_function = None
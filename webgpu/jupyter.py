@@ -10,76 +10,187 @@ except:
     _is_pyodide = False
 
 import base64
+import hashlib
+import os
 
+# directory of the cached package archives, must be below the root directory of the notebook server
+# such that the browser can fetch the archives from there (see _get_package_url), otherwise
+# the archive is embedded into the notebook
+cache_dir = os.path.abspath(os.environ.get("WEBGPU_CACHE_DIR", "webgpu_cache"))
+# archives not used for this time [s] are removed, other kernels (possibly with other package versions)
+# share cache_dir and their notebooks keep fetching their own archive
+cache_max_age = 7 * 24 * 3600
+# url of pyodide.mjs, default: pyodide/ in the root directory of the notebook server
+pyodide_url = os.environ.get("WEBGPU_PYODIDE_URL")
 
-def create_package_zip():
-    """
-    Creates a zip file containing all files in the specified Python package.
 
-    Parameters:
-    - package_name (str): Name of the Python package.
-    - output_filename (str): Name of the output zip file.
-    """
+def _get_package_dir():
     import importlib.util
-    import os
-    import tempfile
-    import zipfile
 
     spec = importlib.util.find_spec("webgpu")
     if spec is None or spec.origin is None:
         raise ValueError(f"Package webgpu not found.")
+    return os.path.dirname(spec.origin)
+
+
+def _get_package_files(package_dir):
+    """Sorted list of (archive name, file path) of all package files (without Python caches)"""
+    files = []
+    for root, dirs, file_names in os.walk(package_dir):
+        dirs[:] = [d for d in dirs if d != "__pycache__"]
+        for file in file_names:
+            if file.endswith(".pyc"):
+                continue
+            file_path = os.path.join(root, file)
+            arcname = os.path.relpath(file_path, start=os.path.dirname(package_dir))
+            files.append((arcname.replace(os.sep, "/"), file_path))
+    return sorted(files)
+
+
+def get_package_hash(package_dir=None):
+    """Content hash of all files in the webgpu package"""
+    package_dir = package_dir or _get_package_dir()
+    h = hashlib.sha256()
+    for arcname, file_path in _get_package_files(package_dir):
+        h.update(arcname.encode("utf-8") + b"\0")
+        with open(file_path, "rb") as f:
+            h.update(f.read())
+        h.update(b"\0")
+    return h.hexdigest()[:16]
+
+
+def create_package_zip(output_filename=None):
+    """
+    Creates a zip file containing all files of the webgpu package.
 
-    package_dir = os.path.dirname(spec.origin)
-
-    with tempfile.TemporaryDirectory() as temp_dir:
-        output_filename = os.path.join(temp_dir, "webgpu.zip")
-        with zipfile.ZipFile(output_filename, "w", zipfile.ZIP_DEFLATED) as zipf:
-            for root, _, files in os.walk(package_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(
-                        file_path, start=os.path.dirname(package_dir)
-                    )
-                    zipf.write(file_path, arcname)
-
-        return open(output_filename, "rb").read()
-
-
-_package_b64 = base64.b64encode(create_package_zip()).decode("utf-8")
-
-_init_js_code = (
-    r"""
-function decodeB64(base64String) {
-    const binaryString = atob(base64String);
-    const len = binaryString.length;
-    const bytes = new Uint8Array(len);
-    for (let i = 0; i < len; i++) {
-        bytes[i] = binaryString.charCodeAt(i);
-    }
-    return bytes;
-}
+    Parameters:
+    - output_filename (str): Name of the output zip file, if None the zip file is returned as bytes.
+    """
+    import io
+    import zipfile
 
-async function main() {
-  if(window.webgpu_ready === undefined) {
-      const pyodide_module = await import("../../files/pyodide/pyodide.mjs");
+    package_dir = _get_package_dir()
+    output = output_filename or io.BytesIO()
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as zipf:
+        for arcname, file_path in _get_package_files(package_dir):
+            zipf.write(file_path, arcname)
+
+    if output_filename is None:
+        return output.getvalue()
+
+
+def get_package_zip():
+    """Returns path and content hash of the package zip, the zip is only created if no archive
+    with the same hash exists in cache_dir. Archives not used for cache_max_age seconds are removed then"""
+    import glob
+    import time
+
+    package_hash = get_package_hash()
+    filename = os.path.join(cache_dir, f"webgpu-{package_hash}.zip")
+    if not os.path.exists(filename):
+        os.makedirs(cache_dir, exist_ok=True)
+        # write to temporary file first, such that a concurrent kernel never serves a partial archive
+        tmp_filename = f"{filename}.{os.getpid()}.tmp"
+        create_package_zip(tmp_filename)
+        os.replace(tmp_filename, filename)
+        expired = time.time() - cache_max_age
+        for old_filename in glob.glob(os.path.join(cache_dir, "webgpu-*.zip")):
+            try:
+                if old_filename != filename and os.path.getmtime(old_filename) < expired:
+                    os.remove(old_filename)
+            except OSError:
+                pass
+    else:
+        # the modification time is the time of last use
+        os.utime(filename)
+    return filename, package_hash
+
+
+def _get_server():
+    """Root directory and base url of the running Jupyter server which serves the working directory
+    of the kernel (the innermost one if there are several), None if no server is found"""
+    import importlib
+
+    servers = []
+    for module_name in ("jupyter_server.serverapp", "notebook.notebookapp"):
+        try:
+            servers += importlib.import_module(module_name).list_running_servers()
+        except Exception:
+            pass
+    cwd = os.path.abspath(os.getcwd())
+    result = None
+    for info in servers:
+        root = info.get("root_dir") or info.get("notebook_dir")
+        if not root:
+            continue
+        root = os.path.abspath(root)
+        if os.path.commonpath([root, cwd]) == root and (result is None or len(root) > len(result[0])):
+            result = (root, info.get("base_url", "/"))
+    return result
+
+
+def _get_files_url(path, server):
+    # jupyter serves the files below its root directory at <base url>files/
+    root, base_url = server
+    relpath = os.path.relpath(os.path.abspath(path), root)
+    if relpath.startswith(os.pardir):
+        return None
+    return base_url.rstrip("/") + "/files/" + relpath.replace(os.sep, "/")
+
+
+def _get_package_url(filename, server):
+    """Url of the package archive, a data url with the archive if the notebook server
+    cannot serve the file (no server found, or cache_dir is not below its root directory)"""
+    url = _get_files_url(filename, server) if server else None
+    if url is None:
+        with open(filename, "rb") as f:
+            url = "data:application/zip;base64," + base64.b64encode(f.read()).decode("ascii")
+    return url
+
+
+def _get_pyodide_url(server):
+    if pyodide_url is not None:
+        return pyodide_url
+    if server:
+        return server[1].rstrip("/") + "/files/pyodide/pyodide.mjs"
+    return "../../files/pyodide/pyodide.mjs"
+
+
+_init_js_code_template = r"""
+{timings_js}
+async function main() {{
+  if(window.webgpu_ready === undefined) {{
+      webgpu_mark("start");
+      const pyodide_module = await import("{pyodide_url}");
       window.pyodide = await pyodide_module.loadPyodide();
       pyodide.setDebug(true);
-      await pyodide.loadPackage(['netgen', 'ngsolve', 'numpy', 'packaging']);
-  }
-  else {
+      webgpu_mark("pyodide");
+      // netgen/ngsolve are loaded on demand (see webgpu_load_ngsolve), drawing precomputed buffers does not need them
+      await pyodide.loadPackage(['numpy', 'packaging']);
+      webgpu_mark("packages");
+  }}
+  else {{
       await webgpu_ready;
-  }
-  const webgpu_b64 = `"""
-    + _package_b64
-    + r"""`;
-  const webpgu_zip = decodeB64(webgpu_b64);
-  await pyodide.unpackArchive(webpgu_zip, 'zip');
-  pyodide.runPython("import glob; print(glob.glob('**', recursive=True))");
-}
+  }}
+  // the archive url contains the content hash, only fetch and unpack it if the package changed
+  const package_hash = "{package_hash}";
+  if(window.webgpu_package_hash !== package_hash) {{
+      const webgpu_zip = await (await fetch("{package_url}")).arrayBuffer();
+      await pyodide.unpackArchive(webgpu_zip, 'zip');
+      window.webgpu_package_hash = package_hash;
+      pyodide.runPython("import glob; print(glob.glob('**', recursive=True))");
+  }}
+  webgpu_mark("webgpu");
+}}
 window.webgpu_ready = main();
 
+window.webgpu_load_ngsolve = async function() {{
+  await window.webgpu_ready;
+  if(window.webgpu_ngsolve_ready === undefined)
+      window.webgpu_ngsolve_ready = pyodide.loadPackage(['netgen', 'ngsolve']).then(() => webgpu_mark("ngsolve"));
+  await window.webgpu_ngsolve_ready;
+}}
 """
-)
 
 
 def _encode_data(data):
@@ -103,11 +214,27 @@ def _decode_function(func_str):
     return types.FunctionType(code, globals(), "_decoded_function")
 
 
-def _draw_client(data):
-    import js
-    import pyodide.ffi
+def _precompute_data(cf, mesh, order):
+    """Evaluate mesh geometry and function values in the kernel, the result contains only bytes and ints
+    (can be unpickled and rendered in the browser without ngsolve)"""
+    import ngsolve as ngs
+
+    from .render_data import create_mesh_data, evaluate_cf
+
+    data = create_mesh_data(mesh)
+    values = evaluate_cf(cf, mesh.Region(ngs.VOL), order)
+    return {
+        "n_trigs": data["n_trigs"],
+        "order": order,
+        "trigs": data["trigs"],
+        "edges": data["edges"],
+        "trig_function_values": values.tobytes(),
+    }
+
 
+def _draw_client(data):
     import webgpu.mesh
+    import webgpu.scene
     from webgpu.jupyter import _decode_data, _decode_function, gpu
 
     data = _decode_data(data)
@@ -116,30 +243,29 @@ def _draw_client(data):
         func = _decode_function(data["_init_function"])
         func(data)
     else:
-        import ngsolve as ngs
-
-        mesh = data["mesh"]
-        cf = data["cf"]
-        order = data.get("order", 1)
-
-        region = mesh.Region(ngs.VOL)
-
-        n_trigs, buffers = webgpu.mesh.create_mesh_buffers(gpu.device, region)
-        buffers = buffers | webgpu.mesh.create_function_value_buffers(
-            gpu.device, cf, region, order
-        )
-        mesh_object = webgpu.mesh.MeshRenderObject(gpu, buffers, n_trigs)
+        if "trig_function_values" in data:
+            # precomputed in the kernel, only upload the buffers
+            n_trigs = data["n_trigs"]
+            order = data["order"]
+            buffers = webgpu.mesh.create_storage_buffers(
+                gpu.device, data, ["trigs", "edges", "trig_function_values"]
+            )
+        else:
+            import ngsolve as ngs
 
-        def render_function(t):
-            gpu.uniforms.update_buffer()
+            mesh = data["mesh"]
+            cf = data["cf"]
+            order = data.get("order", 1)
 
-            encoder = gpu.device.createCommandEncoder()
-            mesh_object.render(encoder)
-            gpu.device.queue.submit([encoder.finish()])
+            region = mesh.Region(ngs.VOL)
 
-        render_function = pyodide.ffi.create_proxy(render_function)
-        gpu.input_handler.render_function = render_function
-        js.requestAnimationFrame(render_function)
+            n_trigs, buffers = webgpu.mesh.create_mesh_buffers(gpu.device, region)
+            buffers = buffers | webgpu.mesh.create_function_value_buffers(
+                gpu.device, cf, region, order
+            )
+        # the shader is compiled only for the orders up to order
+        mesh_object = webgpu.mesh.CFRenderObject(gpu, buffers, n_trigs, max_order=order)
+        gpu.set_render_function(webgpu.scene.Scene(gpu, [mesh_object]).render)
 
 
 gpu = None
@@ -176,6 +302,7 @@ async function draw() {{
     console.log("got id", canvas_id);
     element.appendChild(canvas);
     await window.webgpu_ready;
+    if ({needs_ngsolve}) await window.webgpu_load_ngsolve();
     await window.pyodide.runPythonAsync('import webgpu.jupyter; await webgpu.jupyter._init("{canvas_id}")');
     const data_string = "{data}";
     window.pyodide.runPython("import webgpu.jupyter; webgpu.jupyter._draw_client")(data_string);
@@ -186,7 +313,18 @@ draw();
 if not _is_pyodide:
     from IPython.core.magics.display import Javascript, display
 
-    display(Javascript(_init_js_code))
+    _package_filename, _package_hash = get_package_zip()
+    _server = _get_server()
+    display(
+        Javascript(
+            _init_js_code_template.format(
+                package_hash=_package_hash,
+                package_url=_get_package_url(_package_filename, _server),
+                pyodide_url=_get_pyodide_url(_server),
+                timings_js=open(os.path.join(_get_package_dir(), "timings.js")).read(),
+            )
+        )
+    )
 
     _call_counter = 0
 
@@ -195,17 +333,26 @@ if not _is_pyodide:
         _call_counter += 1
         return f"canvas_{_call_counter}"
 
-    def _run_js_code(data):
+    def _run_js_code(data, needs_ngsolve=True):
         display(
             Javascript(
                 _draw_js_code_template.format(
-                    canvas_id=_get_canvas_id(), data=_encode_data(data)
+                    canvas_id=_get_canvas_id(),
+                    data=_encode_data(data),
+                    needs_ngsolve="true" if needs_ngsolve else "false",
                 )
             )
         )
 
-    def Draw(cf, mesh, init_function=None):
-        data = {"cf": cf, "mesh": mesh}
+    def Draw(cf, mesh, init_function=None, order=1, precompute=False):
+        """Draw a coefficient function on a mesh in the notebook.
+        With precompute=True the mesh geometry and function values are evaluated in the kernel
+        and only the finished buffers are sent, the browser then does not need to load ngsolve."""
+        if precompute:
+            _run_js_code(_precompute_data(cf, mesh, order), needs_ngsolve=False)
+            return
+
+        data = {"cf": cf, "mesh": mesh, "order": order}
 
         if init_function is not None:
             data["init_function"] = _encode_function(init_function)
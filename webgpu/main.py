@@ -5,20 +5,20 @@ import urllib.parse
 import js
 import ngsolve as ngs
 from netgen.occ import unit_square
-from pyodide.ffi import create_once_callable, create_proxy
 
 from .gpu import init_webgpu
 from .mesh import *
+from .scene import Scene
 
 gpu = None
 mesh_object = None
+scene = None
 
 cf = None
-render_function = None
 
 
 async def main():
-    global gpu, mesh_object, cf, render_function
+    global gpu, mesh_object, scene, cf
 
     gpu = await init_webgpu(js.document.getElementById("canvas"))
 
@@ -30,7 +30,7 @@ async def main():
         cf = cf or ngs.sin(10 * ngs.x) * ngs.sin(10 * ngs.y)
         n_trigs, buffers = create_mesh_buffers(gpu.device, region)
         buffers = buffers | create_function_value_buffers(gpu.device, cf, region, order)
-        mesh_object = CFRenderObject(gpu, buffers, n_trigs)
+        mesh_object = CFRenderObject(gpu, buffers, n_trigs, max_order=order)
 
     else:
         # create testing mesh, this one also supports indexed or deferred rendering
@@ -59,47 +59,9 @@ async def main():
     gpu.uniforms.mat[12] = -0.5 * 1.8
     gpu.uniforms.mat[13] = -0.5 * 1.8
 
-    t_last = 0
-    fps = 0
-    frame_counter = 0
-
-    def render(time):
-        nonlocal t_last, fps, frame_counter
-        dt = time - t_last
-        t_last = time
-        frame_counter += 1
-        # if dt < 20:
-        #     print('returning')
-        #     return
-        print(f"frame time {dt:.2f} ms")
-        # if dt > 1e-3:
-        #     frame_counter += 1
-        #     fps = 0.9 * fps + 0.1 * 1000 / dt
-        #     if frame_counter % 30 == 0:
-        #         print(f"fps {fps:.2f}")
-
-        # this is the render function, it's called for every frame
-
-        # copy camera position etc. to GPU
-        gpu.uniforms.update_buffer()
-
-        command_encoder = gpu.device.createCommandEncoder()
-
-        mesh_object.render(command_encoder)
-
-        gpu.device.queue.submit([command_encoder.finish()])
-        if frame_counter < 20:
-            js.requestAnimationFrame(render_function)
-            # gpu.device.queue.onSubmittedWorkDone().then(
-            #     create_once_callable(
-            #         lambda _: js.requestAnimationFrame(render_function)
-            #     )
-            # )
-
-    render_function = create_proxy(render)
-    gpu.input_handler.render_function = render_function
-
-    render_function.request_id = js.requestAnimationFrame(render_function)
+    # rendered in every frame in which the scene changed
+    scene = Scene(gpu, [mesh_object])
+    gpu.set_render_function(scene.render)
 
 
 def cleanup():
@@ -1,22 +1,43 @@
 import math
 
 import js
-import ngsolve as ngs
-import ngsolve.webgui
 import numpy as np
 
+# render_data (and with it ngsolve) is imported in the create_* functions only,
+# such that the render objects can be used with precomputed buffers without ngsolve
 from .uniforms import Binding
-from .utils import BufferBinding, Device, ShaderStage, TextureBinding, to_js
+from .utils import (
+    BufferBinding,
+    Device,
+    ShaderStage,
+    TextureBinding,
+    to_js,
+    write_buffer,
+)
+
+# highest polynomial order supported by eval.wgsl
+MAX_ORDER = 6
+
 
 class WireFrameRenderer:
-    def __init__(self, gpu, buffers, n_trigs):
+    """Render the (unique) mesh edges, either from the "edges" buffer (two points per edge)
+    or from the "vertices" and "edge_index" buffers if an edge index is given"""
+
+    def __init__(self, gpu, buffers, n_edges):
         self._buffers = buffers
         self.gpu = gpu
-        self.device = Device(gpu.device)
-        self.n_edges = n_trigs * 3
+        self.device = Device(gpu.device, gpu.pipeline_cache)
+        self.n_edges = n_edges
+        self._indexed = "edge_index" in buffers
         self._create_pipeline()
         
     def get_bindings(self):
+        if self._indexed:
+            return [
+                *self.gpu.uniforms.get_bindings(),
+                BufferBinding(Binding.VERTICES, self._buffers["vertices"]),
+                BufferBinding(Binding.EDGE_INDEX, self._buffers["edge_index"]),
+            ]
         return [
             *self.gpu.uniforms.get_bindings(),
             BufferBinding(Binding.EDGES, self._buffers["edges"]),
@@ -27,51 +48,68 @@ class WireFrameRenderer:
             self.get_bindings(), "WireFrameRenderer"
         )
         pipeline_layout = self.device.create_pipeline_layout(bind_layout)
+        vertex_entry_point = (
+            "mainVertexEdgeP1Indexed" if self._indexed else "mainVertexEdgeP1"
+        )
         shader_module = self.device.compile_files(
-            "webgpu/shader.wgsl", "webgpu/eval.wgsl"
+            "shader.wgsl", entry_points=[vertex_entry_point, "mainFragmentEdge"]
         )
         depth_stencil = self.gpu.depth_stencil.copy()
         depth_stencil.update( { "depthWriteEnabled": False } )
-        self._pipeline = self.gpu.device.createRenderPipeline(
-            to_js(
-                {
-                    "label": "WireFrameRenderer",
-                    "layout": pipeline_layout,
-                    "vertex": {
-                        "module": shader_module,
-                        "entryPoint": "mainVertexEdgeP1",
-                    },
-                    "fragment": {
-                        "module": shader_module,
-                        "entryPoint": "mainFragmentEdge",
-                        "targets": [{"format": self.gpu.format}],
-                    },
-                    "primitive": {
-                        "topology": "line-list",
-                        "cullMode": "none",
-                        "frontFace": "ccw",
-                    },
-                    "depthStencil" : self.gpu.depth_stencil
-                }
-            )
+        self._pipeline = self.device.create_render_pipeline(
+            {
+                "label": "WireFrameRenderer",
+                "layout": pipeline_layout,
+                "vertex": {
+                    "module": shader_module,
+                    "entryPoint": vertex_entry_point,
+                },
+                "fragment": {
+                    "module": shader_module,
+                    "entryPoint": "mainFragmentEdge",
+                    "targets": [{"format": self.gpu.format}],
+                },
+                "primitive": {
+                    "topology": "line-list",
+                    "cullMode": "none",
+                    "frontFace": "ccw",
+                },
+                "depthStencil" : self.gpu.depth_stencil
+            }
         )
         
+    @property
+    def pipeline(self):
+        return self._pipeline
+
+    @property
+    def bind_group(self):
+        return self._bind_group
+
+    def draw(self, render_pass):
+        """Record the draw call into a render pass with pipeline and bind group set (see Scene)"""
+        render_pass.draw(2, self.n_edges, 0, 0)
+
     def render(self, encoder, loadOp="clear"):
         # loadOp can be "clear" or "load"
-        render_pass = self.gpu.begin_render_pass(encoder, loadOp=loadOp)
+        render_pass = self.gpu.begin_render_pass(
+            encoder, loadOp=loadOp, label=type(self).__name__
+        )
         render_pass.setBindGroup(0, self._bind_group)
         render_pass.setPipeline(self._pipeline)
-        render_pass.draw(2, self.n_edges, 0, 0)
+        self.draw(render_pass)
         render_pass.end()
         
 class MeshRenderObject:
     """Use "trigs" and "trig_function_values" buffers to render a function on a mesh"""
 
-    def __init__(self, gpu, buffers, n_trigs):
+    def __init__(self, gpu, buffers, n_trigs, max_order=MAX_ORDER):
         self._buffers = buffers
         self.gpu = gpu
-        self.device = Device(gpu.device)
+        self.device = Device(gpu.device, gpu.pipeline_cache)
         self.n_trigs = n_trigs
+        # highest order of the function values, the shader is compiled without higher orders
+        self.max_order = max_order
         self._create_pipeline()
 
     def get_bindings(self):
@@ -88,42 +126,54 @@ class MeshRenderObject:
         )
         pipeline_layout = self.device.create_pipeline_layout(bind_layout)
         shader_module = self.device.compile_files(
-            "webgpu/shader.wgsl", "webgpu/eval.wgsl"
+            "shader.wgsl", entry_points=["mainVertexTrigP1", "mainFragmentTrigMesh"]
         )
-        self._pipeline = self.gpu.device.createRenderPipeline(
-            to_js(
-                {
-                    "label": "MeshRenderObject",
-                    "layout": pipeline_layout,
-                    "vertex": {
-                        "module": shader_module,
-                        "entryPoint": "mainVertexTrigP1",
-                    },
-                    "fragment": {
-                        "module": shader_module,
-                        "entryPoint": "mainFragmentTrigMesh",
-                        "targets": [{"format": self.gpu.format}],
-                    },
-                    "primitive": {
-                        "topology": "triangle-list",
-                        "cullMode": "none",
-                        "frontFace": "ccw",
-                    },
-                    "depthStencil": {
-                        **self.gpu.depth_stencil,
-                        # shift trigs behind to ensure that edges are rendered properly
-                        "depthBias": 1.0,
-                        "depthBiasSlopeScale": 1,
-                    },
-                }
-            )
+        self._pipeline = self.device.create_render_pipeline(
+            {
+                "label": "MeshRenderObject",
+                "layout": pipeline_layout,
+                "vertex": {
+                    "module": shader_module,
+                    "entryPoint": "mainVertexTrigP1",
+                },
+                "fragment": {
+                    "module": shader_module,
+                    "entryPoint": "mainFragmentTrigMesh",
+                    "targets": [{"format": self.gpu.format}],
+                },
+                "primitive": {
+                    "topology": "triangle-list",
+                    "cullMode": "none",
+                    "frontFace": "ccw",
+                },
+                "depthStencil": {
+                    **self.gpu.depth_stencil,
+                    # shift trigs behind to ensure that edges are rendered properly
+                    "depthBias": 1.0,
+                    "depthBiasSlopeScale": 1,
+                },
+            }
         )
 
+    @property
+    def pipeline(self):
+        return self._pipeline
+
+    @property
+    def bind_group(self):
+        return self._bind_group
+
+    def draw(self, render_pass):
+        """Record the draw call into a render pass with pipeline and bind group set (see Scene)"""
+        render_pass.draw(3, self.n_trigs, 0, 0)
+
     def render(self, encoder, loadOp="clear"):
-        render_pass = self.gpu.begin_render_pass(encoder, loadOp=loadOp)
+        render_pass = self.gpu.begin_render_pass(
+            encoder, loadOp=loadOp, label=type(self).__name__
+        )
         render_pass.setBindGroup(0, self._bind_group)
         render_pass.setPipeline(self._pipeline)
-        render_pass.draw(3, self.n_trigs, 0, 0)
+        self.draw(render_pass)
         render_pass.end()
 
 class CFRenderObject(MeshRenderObject):
@@ -140,45 +190,47 @@ class CFRenderObject(MeshRenderObject):
         )
         pipeline_layout = self.device.create_pipeline_layout(bind_layout)
         shader_module = self.device.compile_files(
-            "webgpu/shader.wgsl", "webgpu/eval.wgsl"
+            "shader.wgsl",
+            entry_points=["mainVertexTrigP1", "mainFragmentTrig"],
+            defines={"MAX_ORDER": self.max_order},
         )
-        self._pipeline = self.gpu.device.createRenderPipeline(
-            to_js(
-                {
-                    "label": "MeshRenderObject",
-                    "layout": pipeline_layout,
-                    "vertex": {
-                        "module": shader_module,
-                        "entryPoint": "mainVertexTrigP1",
-                    },
-                    "fragment": {
-                        "module": shader_module,
-                        "entryPoint": "mainFragmentTrig",
-                        "targets": [{"format": self.gpu.format}],
-                    },
-                    "primitive": {
-                        "topology": "triangle-list",
-                        "cullMode": "none",
-                        "frontFace": "ccw",
-                    },
-                    "depthStencil": {
-                        **self.gpu.depth_stencil,
-                        # shift trigs behind to ensure that edges are rendered properly
-                        "depthBias": 1.0,
-                        "depthBiasSlopeScale": 1,
-                    },
-                }
-            )
+        self._pipeline = self.device.create_render_pipeline(
+            {
+                "label": "MeshRenderObject",
+                "layout": pipeline_layout,
+                "vertex": {
+                    "module": shader_module,
+                    "entryPoint": "mainVertexTrigP1",
+                },
+                "fragment": {
+                    "module": shader_module,
+                    "entryPoint": "mainFragmentTrig",
+                    "targets": [{"format": self.gpu.format}],
+                },
+                "primitive": {
+                    "topology": "triangle-list",
+                    "cullMode": "none",
+                    "frontFace": "ccw",
+                },
+                "depthStencil": {
+                    **self.gpu.depth_stencil,
+                    # shift trigs behind to ensure that edges are rendered properly
+                    "depthBias": 1.0,
+                    "depthBiasSlopeScale": 1,
+                },
+            }
         )
 
 class MeshRenderObjectIndexed:
     """Use "vertices", "index" and "trig_function_values" buffers to render a mesh"""
 
-    def __init__(self, gpu, buffers, n_trigs):
+    def __init__(self, gpu, buffers, n_trigs, max_order=MAX_ORDER):
         self._buffers = buffers
         self.gpu = gpu
-        self.device = Device(gpu.device)
+        self.device = Device(gpu.device, gpu.pipeline_cache)
         self.n_trigs = n_trigs
+        # highest order of the function values, the shader is compiled without higher orders
+        self.max_order = max_order
 
         self._create_pipeline()
 
@@ -199,42 +251,56 @@ class MeshRenderObjectIndexed:
         )
         pipeline_layout = self.device.create_pipeline_layout(bind_layout)
         shader_module = self.device.compile_files(
-            "webgpu/shader.wgsl", "webgpu/eval.wgsl"
+            "shader.wgsl",
+            entry_points=["mainVertexTrigP1Indexed", "mainFragmentTrig"],
+            defines={"MAX_ORDER": self.max_order},
         )
-        self._pipeline = self.gpu.device.createRenderPipeline(
-            to_js(
-                {
-                    "label": "MeshRenderObjectIndexed",
-                    "layout": pipeline_layout,
-                    "vertex": {
-                        "module": shader_module,
-                        "entryPoint": "mainVertexTrigP1Indexed",
-                    },
-                    "fragment": {
-                        "module": shader_module,
-                        "entryPoint": "mainFragmentTrig",
-                        "targets": [{"format": self.gpu.format}],
-                    },
-                    "primitive": {
-                        "topology": "triangle-list",
-                        "cullMode": "none",
-                        "frontFace": "ccw",
-                    },
-                    "depthStencil": {
-                        **self.gpu.depth_stencil,
-                        # shift trigs behind to ensure that edges are rendered properly
-                        "depthBias": 1.0,
-                        "depthBiasSlopeScale": 1,
-                    },
-                }
-            )
+        self._pipeline = self.device.create_render_pipeline(
+            {
+                "label": "MeshRenderObjectIndexed",
+                "layout": pipeline_layout,
+                "vertex": {
+                    "module": shader_module,
+                    "entryPoint": "mainVertexTrigP1Indexed",
+                },
+                "fragment": {
+                    "module": shader_module,
+                    "entryPoint": "mainFragmentTrig",
+                    "targets": [{"format": self.gpu.format}],
+                },
+                "primitive": {
+                    "topology": "triangle-list",
+                    "cullMode": "none",
+                    "frontFace": "ccw",
+                },
+                "depthStencil": {
+                    **self.gpu.depth_stencil,
+                    # shift trigs behind to ensure that edges are rendered properly
+                    "depthBias": 1.0,
+                    "depthBiasSlopeScale": 1,
+                },
+            }
         )
 
-    def render(self, encoder):
-        render_pass = self.gpu.begin_render_pass(encoder)
+    @property
+    def pipeline(self):
+        return self._pipeline
+
+    @property
+    def bind_group(self):
+        return self._bind_group
+
+    def draw(self, render_pass):
+        """Record the draw call into a render pass with pipeline and bind group set (see Scene)"""
+        render_pass.draw(3, self.n_trigs)
+
+    def render(self, encoder, loadOp="clear"):
+        render_pass = self.gpu.begin_render_pass(
+            encoder, loadOp=loadOp, label=type(self).__name__
+        )
         render_pass.setBindGroup(0, self._bind_group)
         render_pass.setPipeline(self._pipeline)
-        render_pass.draw(3, self.n_trigs)
+        self.draw(render_pass)
         render_pass.end()
 
 
@@ -247,11 +313,16 @@ class MeshRenderObjectDeferred:
     because the function values are only evaluated for the pixels that are visible.
     """
 
-    def __init__(self, gpu, buffers, n_trigs):
+    # uses its own render passes, see Scene
+    render_passes = 2
+
+    def __init__(self, gpu, buffers, n_trigs, max_order=MAX_ORDER):
         self._buffers = buffers
         self.gpu = gpu
-        self.device = Device(gpu.device)
+        self.device = Device(gpu.device, gpu.pipeline_cache)
         self.n_trigs = n_trigs
+        # highest order of the function values, the shader is compiled without higher orders
+        self.max_order = max_order
         self._g_buffer_format = "rgba32float"
 
         # texture to store g-buffer (trig index and barycentric coordinates)
@@ -297,36 +368,41 @@ class MeshRenderObjectDeferred:
         )
         pipeline_layout_pass1 = self.device.create_pipeline_layout(bind_layout_pass1)
         shader_module = self.device.compile_files(
-            "webgpu/shader.wgsl", "webgpu/eval.wgsl"
+            "shader.wgsl",
+            entry_points=[
+                "mainVertexTrigP1Indexed",
+                "mainFragmentTrigToGBuffer",
+                "mainVertexDeferred",
+                "mainFragmentDeferred",
+            ],
+            defines={"MAX_ORDER": self.max_order},
         )
-        self._pipeline_pass1 = self.gpu.device.createRenderPipeline(
-            to_js(
-                {
-                    "label": "MeshRenderObjectDeferredPass1",
-                    "layout": pipeline_layout_pass1,
-                    "vertex": {
-                        "module": shader_module,
-                        "entryPoint": "mainVertexTrigP1Indexed",
-                    },
-                    "fragment": {
-                        "module": shader_module,
-                        "entryPoint": "mainFragmentTrigToGBuffer",
-                        "targets": [{"format": self._g_buffer_format}],
-                    },
+        self._pipeline_pass1 = self.device.create_render_pipeline(
+            {
+                "label": "MeshRenderObjectDeferredPass1",
+                "layout": pipeline_layout_pass1,
+                "vertex": {
+                    "module": shader_module,
+                    "entryPoint": "mainVertexTrigP1Indexed",
+                },
+                "fragment": {
+                    "module": shader_module,
+                    "entryPoint": "mainFragmentTrigToGBuffer",
                     "targets": [{"format": self._g_buffer_format}],
-                    "primitive": {
-                        "topology": "triangle-list",
-                        "cullMode": "none",
-                        "frontFace": "ccw",
-                    },
-                    "depthStencil": {
-                        **self.gpu.depth_stencil,
-                        # shift trigs behind to ensure that edges are rendered properly
-                        "depthBias": 1.0,
-                        "depthBiasSlopeScale": 1,
-                    },
-                }
-            )
+                },
+                "targets": [{"format": self._g_buffer_format}],
+                "primitive": {
+                    "topology": "triangle-list",
+                    "cullMode": "none",
+                    "frontFace": "ccw",
+                },
+                "depthStencil": {
+                    **self.gpu.depth_stencil,
+                    # shift trigs behind to ensure that edges are rendered properly
+                    "depthBias": 1.0,
+                    "depthBiasSlopeScale": 1,
+                },
+            }
         )
 
         bind_layout_pass2, self._bind_group_pass2 = self.device.create_bind_group(
@@ -336,33 +412,31 @@ class MeshRenderObjectDeferred:
 
         deferred_pipeline_layout = self.device.create_pipeline_layout(bind_layout_pass2)
 
-        self._pipeline_pass2 = self.gpu.device.createRenderPipeline(
-            to_js(
-                {
-                    "label": "trigs_deferred",
-                    "layout": deferred_pipeline_layout,
-                    "vertex": {
-                        "module": shader_module,
-                        "entryPoint": "mainVertexDeferred",
-                    },
-                    "fragment": {
-                        "module": shader_module,
-                        "entryPoint": "mainFragmentDeferred",
-                        "targets": [{"format": self.gpu.format}],
-                    },
-                    "primitive": {
-                        "topology": "triangle-strip",
-                        "cullMode": "none",
-                        "frontFace": "ccw",
-                    },
-                    "depthStencil": {
-                        **self.gpu.depth_stencil,
-                        # shift trigs behind to ensure that edges are rendered properly
-                        "depthBias": 1.0,
-                        "depthBiasSlopeScale": 1,
-                    },
-                }
-            )
+        self._pipeline_pass2 = self.device.create_render_pipeline(
+            {
+                "label": "trigs_deferred",
+                "layout": deferred_pipeline_layout,
+                "vertex": {
+                    "module": shader_module,
+                    "entryPoint": "mainVertexDeferred",
+                },
+                "fragment": {
+                    "module": shader_module,
+                    "entryPoint": "mainFragmentDeferred",
+                    "targets": [{"format": self.gpu.format}],
+                },
+                "primitive": {
+                    "topology": "triangle-strip",
+                    "cullMode": "none",
+                    "frontFace": "ccw",
+                },
+                "depthStencil": {
+                    **self.gpu.depth_stencil,
+                    # shift trigs behind to ensure that edges are rendered properly
+                    "depthBias": 1.0,
+                    "depthBiasSlopeScale": 1,
+                },
+            }
         )
 
     def render(self, encoder):
@@ -383,6 +457,7 @@ class MeshRenderObjectDeferred:
                 "depthStoreOp": "store",
                 "depthClearValue": 1.0,
             },
+            **self.gpu.profiler.timestamp_writes("MeshRenderObjectDeferredPass1"),
         }
         pass1 = encoder.beginRenderPass(to_js(pass1_options))
         pass1.setViewport(0, 0, self.gpu.canvas.width, self.gpu.canvas.height, 0.0, 1.0)
@@ -408,6 +483,7 @@ class MeshRenderObjectDeferred:
                 "depthStoreOp": "store",
                 "depthClearValue": 1.0,
             },
+            **self.gpu.profiler.timestamp_writes("MeshRenderObjectDeferredPass2"),
         }
         pass2 = encoder.beginRenderPass(to_js(pass2_options))
         pass2.setBindGroup(0, self._bind_group_pass2)
@@ -417,25 +493,15 @@ class MeshRenderObjectDeferred:
         pass2.end()
 
 
-def _get_bernstein_matrix_trig(n, intrule):
-    """Create inverse vandermonde matrix for the Bernstein basis functions on a triangle of degree n and given integration points"""
-    ndtrig = int((n + 1) * (n + 2) / 2)
+def _create_storage_buffer(device, data):
+    return Device(device).create_buffer(
+        data, js.GPUBufferUsage.STORAGE | js.GPUBufferUsage.COPY_DST
+    )
+
 
-    mat = ngs.Matrix(ndtrig, ndtrig)
-    fac_n = math.factorial(n)
-    for row, ip in enumerate(intrule):
-        col = 0
-        x = ip.point[0]
-        y = ip.point[1]
-        z = 1.0 - x - y
-        for i in range(n + 1):
-            factor = fac_n / math.factorial(i) * x**i
-            for j in range(n + 1 - i):
-                k = n - i - j
-                factor2 = 1.0 / (math.factorial(j) * math.factorial(k))
-                mat[row, col] = factor * factor2 * y**j * z**k
-                col += 1
-    return mat
+def create_storage_buffers(device, data, names):
+    """Create storage buffers from precomputed byte buffers (e.g. the output of render_data.create_mesh_data)"""
+    return {name: _create_storage_buffer(device, data[name]) for name in names}
 
 
 def create_mesh_buffers(device, region, curve_order=1):
@@ -443,100 +509,60 @@ def create_mesh_buffers(device, region, curve_order=1):
     # TODO: implement other element types than triangles
     # TODO: handle region correctly to draw only part of the mesh
     # TODO: handle 3d meshes correctly
-    # TODO: set up proper index buffer
-    mesh = region.mesh
-    points = evaluate_cf(ngs.CF((ngs.x, ngs.y, ngs.z)), mesh.Region(ngs.VOL), order=1)
-
-    n_trigs = len(mesh.ngmesh.Elements2D())
-
-    edge_points = points[2:].reshape(-1, 3, 3)
-    edges = np.zeros((n_trigs, 3, 2, 3), dtype=np.float32)
-    for i in range(3):
-        edges[:, i, 0, :] = edge_points[:, i, :]
-        edges[:, i, 1, :] = edge_points[:, (i + 1) % 3, :]
-    edge_data = js.Uint8Array.new(edges.flatten().tobytes())
-    edge_buffer = device.createBuffer(
-        to_js(
-            {
-                "size": edge_data.length,
-                "usage": js.GPUBufferUsage.STORAGE | js.GPUBufferUsage.COPY_DST,
-            }
-        )
-    )
-    device.queue.writeBuffer(edge_buffer, 0, edge_data)
-
-    trigs = np.zeros(
-        n_trigs,
-        dtype=[
-            ("p", np.float32, 9),  # 3 vec3<f32> (each 4 floats due to padding)
-            ("index", np.int32),  # index (i32)
-        ],
-    )
-    trigs["p"] = points[2:].flatten().reshape(-1, 9)
-    trigs["index"] = [1] * n_trigs
-    data = js.Uint8Array.new(trigs.tobytes())
+    from .render_data import create_mesh_data
 
-    trigs_buffer = device.createBuffer(
-        to_js(
-            {
-                "size": data.length,
-                "usage": js.GPUBufferUsage.STORAGE | js.GPUBufferUsage.COPY_DST,
-            }
-        )
-    )
-    device.queue.writeBuffer(trigs_buffer, 0, data)
-    return n_trigs, {"trigs": trigs_buffer, "edges": edge_buffer}
+    data = create_mesh_data(region.mesh)
+    edge_buffer = _create_storage_buffer(device, data["edges"])
+    trigs_buffer = _create_storage_buffer(device, data["trigs"])
+    return data["n_trigs"], {"trigs": trigs_buffer, "edges": edge_buffer}
+
+
+def create_indexed_mesh_buffers(device, region):
+    """Create "vertices", "index" and "edge_index" buffers for the mesh geometry (see MeshRenderObjectIndexed and WireFrameRenderer),
+    returns the number of triangles, the number of edges and the buffers"""
+    # TODO: handle region correctly to draw only part of the mesh
+    from .render_data import create_indexed_mesh_data
+
+    data = create_indexed_mesh_data(region.mesh)
+    buffers = {
+        name: _create_storage_buffer(device, data[name])
+        for name in ["vertices", "index", "edge_index"]
+    }
+    return data["n_trigs"], data["n_edges"], buffers
 
 
-def create_function_value_buffers(device, cf, region, order):
+def create_function_value_buffers(
+    device, cf, region, order, format=None, adaptive_tol=None
+):
     """Evaluate a coefficient function on a mesh and create GPU buffer with the values,
-    returns a dictionary with the buffer as value and the name/element type as key"""
+    returns a dictionary with the buffer as value and the name/element type as key.
+    format selects the storage format of the values (FORMAT_F32 (default), FORMAT_F16 or FORMAT_UNORM16, see render_data.encode_values),
+    with adaptive_tol given the order is chosen per element up to order (see render_data.evaluate_cf_adaptive)"""
     # TODO: implement other element types than triangles
-    values = evaluate_cf(cf, region, order)
-    data = js.Uint8Array.new(values.tobytes())
-    buffer = device.createBuffer(
-        to_js(
-            {
-                "size": data.length,
-                "usage": js.GPUBufferUsage.STORAGE | js.GPUBufferUsage.COPY_DST,
-            }
-        )
+    from .render_data import (
+        FORMAT_F32,
+        encode_values,
+        evaluate_cf,
+        evaluate_cf_adaptive,
+        evaluate_cf_chunks,
     )
-    device.queue.writeBuffer(buffer, 0, data)
-    return {"trig_function_values": buffer}
 
+    if adaptive_tol is not None:
+        values = evaluate_cf_adaptive(cf, region, order, adaptive_tol)
+        return {"trig_function_values": _create_storage_buffer(device, values)}
 
-def evaluate_cf(cf, region, order):
-    """Evaluate a coefficient function on a mesh and returns the values as a flat array, ready to copy to the GPU as storage buffer.
-    The first two entries are the function dimension and the polynomial order of the stored values.
-    """
-    comps = cf.dim
-    int_points = ngsolve.webgui._make_trig(order)
-    intrule = ngs.IntegrationRule(
-        int_points,
-        [
-            0,
-        ]
-        * len(int_points),
-    )
-    ibmat = _get_bernstein_matrix_trig(order, intrule).I
+    if format not in (None, FORMAT_F32):
+        values = encode_values(evaluate_cf(cf, region, order), format)
+        return {"trig_function_values": _create_storage_buffer(device, values)}
 
-    ndof = ibmat.h
-
-    pts = region.mesh.MapToAllElements(
-        {ngs.ET.TRIG: intrule, ngs.ET.QUAD: intrule}, region
+    # evaluate and upload chunk by chunk to keep the peak memory bounded
+    nbytes, chunks = evaluate_cf_chunks(cf, region, order)
+    buffer = Device(device).create_buffer(
+        nbytes, js.GPUBufferUsage.STORAGE | js.GPUBufferUsage.COPY_DST
     )
-    pmat = cf(pts)
-    pmat = pmat.reshape(-1, ndof, comps)
-
-    values = np.zeros((ndof, pmat.shape[0], comps), dtype=np.float32)
-    for i in range(comps):
-        ngsmat = ngs.Matrix(pmat[:, :, i].transpose())
-        values[:, :, i] = ibmat * ngsmat
-
-    values = values.transpose((1, 0, 2)).flatten()
-    ret = np.concatenate(([np.float32(cf.dim), np.float32(order)], values))
-    return ret
+    for offset, values in chunks:
+        write_buffer(device, buffer, values, offset)
+    return {"trig_function_values": buffer}
 
 
 def create_testing_square_mesh(gpu, n):
@@ -568,7 +594,7 @@ def create_testing_square_mesh(gpu, n):
         "index": index_buffer,
     }
 
-    shader_module = device.compile_files("webgpu/compute.wgsl")
+    shader_module = device.compile_files("compute.wgsl")
 
     bindings = []
     for name in ["trigs", "trig_function_values", "vertices", "index"]:
@@ -594,13 +620,18 @@ def create_testing_square_mesh(gpu, n):
         )
     )
 
+    gpu.profiler.begin_frame()
     command_encoder = gpu.device.createCommandEncoder()
-    pass_encoder = command_encoder.beginComputePass()
+    pass_encoder = command_encoder.beginComputePass(
+        to_js(gpu.profiler.timestamp_writes("create_test_mesh"))
+    )
     pass_encoder.setPipeline(pipeline)
     pass_encoder.setBindGroup(0, group)
 
     pass_encoder.dispatchWorkgroups(n // 16, 1, 1)
     pass_encoder.end()
+    gpu.profiler.end_frame(command_encoder)
     gpu.device.queue.submit([command_encoder.finish()])
+    gpu.profiler.submitted()
 
     return n_trigs, buffers
@@ -0,0 +1,193 @@
+"""GPU time of render and compute passes, measured with timestamp queries
+
+Does not depend on js (the device is passed in), so the ring management and statistics
+can be tested with a stand-in device.
+"""
+
+import math
+import struct
+from collections import deque
+
+# WebGPU constants (GPUBufferUsage, GPUMapMode)
+_MAP_READ = 0x1
+_COPY_SRC = 0x4
+_COPY_DST = 0x8
+_QUERY_RESOLVE = 0x200
+_MAP_MODE_READ = 0x1
+
+
+class _Slot:
+    # resolve and readback buffer of one frame
+    def __init__(self, resolve_buffer, readback_buffer):
+        self.resolve_buffer = resolve_buffer
+        self.readback_buffer = readback_buffer
+        self.names = []
+        self.state = "free"
+
+
+class GpuProfiler:
+    """Measures the GPU duration of passes with timestamp queries.
+
+    Usage per frame (see WebGPU._render_frame):
+        profiler.begin_frame()
+        pass = encoder.beginRenderPass(descriptor | profiler.timestamp_writes("name"))
+        ...
+        profiler.end_frame(encoder)
+        device.queue.submit(...)
+        profiler.submitted()
+
+    The queries of a frame are resolved into one slot of a ring of readback buffers, which are read
+    asynchronously (mapAsync). If all slots are still in flight, the frame is not measured (never stalls).
+    If the device has no timestamp-query feature, timestamp_writes returns an empty dict and nothing is measured.
+
+    In the browser, to_js converts the descriptors (utils.to_js) and once_callable wraps the callback
+    of the mapAsync promise (pyodide.ffi.create_once_callable), see WebGPU.
+    """
+
+    def __init__(
+        self,
+        device,
+        ring_size=4,
+        max_passes=16,
+        history=120,
+        enabled=None,
+        to_js=lambda value: value,
+        once_callable=lambda func: func,
+    ):
+        self.device = device
+        self.enabled = device.features.has("timestamp-query") if enabled is None else enabled
+        self.max_passes = max_passes
+        self._once_callable = once_callable
+        self._history = history
+        self._durations = {}
+        self._current = None
+        self.counters = {"frames": 0, "skipped_frames": 0, "dropped_passes": 0}
+        self._slots = []
+        if not self.enabled:
+            return
+
+        size = 2 * 8 * max_passes
+        self._query_set = device.createQuerySet(
+            to_js({"type": "timestamp", "count": 2 * max_passes})
+        )
+        for _ in range(ring_size):
+            resolve_buffer = device.createBuffer(
+                to_js({"size": size, "usage": _QUERY_RESOLVE | _COPY_SRC})
+            )
+            readback_buffer = device.createBuffer(
+                to_js({"size": size, "usage": _MAP_READ | _COPY_DST})
+            )
+            self._slots.append(_Slot(resolve_buffer, readback_buffer))
+
+    def begin_frame(self):
+        """Selects a free slot for the queries of the next command buffer"""
+        if self._current is not None:
+            # last frame was not submitted
+            self._current.state = "free"
+        self._current = None
+        if not self.enabled:
+            return
+        for slot in self._slots:
+            if slot.state == "free":
+                slot.state = "recording"
+                slot.names = []
+                self._current = slot
+                return
+        self.counters["skipped_frames"] += 1
+
+    def timestamp_writes(self, name):
+        """Entries for a render or compute pass descriptor to measure the pass,
+        empty if the frame is not measured"""
+        slot = self._current
+        if slot is None:
+            return {}
+        if len(slot.names) >= self.max_passes:
+            self.counters["dropped_passes"] += 1
+            return {}
+        index = 2 * len(slot.names)
+        slot.names.append(name)
+        return {
+            "timestampWrites": {
+                "querySet": self._query_set,
+                "beginningOfPassWriteIndex": index,
+                "endOfPassWriteIndex": index + 1,
+            }
+        }
+
+    def end_frame(self, encoder):
+        """Resolves the queries of the frame into the readback buffer of its slot, call before encoder.finish()"""
+        slot = self._current
+        if slot is None:
+            return
+        if not slot.names:
+            slot.state = "free"
+            self._current = None
+            return
+        count = 2 * len(slot.names)
+        encoder.resolveQuerySet(self._query_set, 0, count, slot.resolve_buffer, 0)
+        encoder.copyBufferToBuffer(slot.resolve_buffer, 0, slot.readback_buffer, 0, 8 * count)
+        slot.state = "resolved"
+
+    def submitted(self):
+        """Starts reading back the timestamps, call after the command buffer was submitted"""
+        slot = self._current
+        self._current = None
+        if slot is None or slot.state != "resolved":
+            return
+        slot.state = "mapping"
+        size = 16 * len(slot.names)
+        promise = slot.readback_buffer.mapAsync(_MAP_MODE_READ, 0, size)
+        # mapping fails e.g. if the buffer is destroyed or the device is lost, the slot is free again
+        promise.then(
+            self._once_callable(lambda _: self._read(slot, size)),
+            self._once_callable(lambda _: self._release(slot)),
+        )
+
+    def _release(self, slot):
+        if slot in self._slots:
+            slot.state = "free"
+
+    def _read(self, slot, size):
+        if slot not in self._slots:
+            # destroyed while mapping
+            return
+        data = slot.readback_buffer.getMappedRange(0, size).to_bytes()
+        timestamps = struct.unpack(f"<{size // 8}Q", bytes(data))
+        slot.readback_buffer.unmap()
+        for i, name in enumerate(slot.names):
+            begin, end = timestamps[2 * i], timestamps[2 * i + 1]
+            if end >= begin:
+                self.add_duration(name, (end - begin) * 1e-6)
+        slot.state = "free"
+        self.counters["frames"] += 1
+
+    def add_duration(self, name, duration):
+        """Record the duration [ms] of a pass"""
+        if name not in self._durations:
+            self._durations[name] = deque(maxlen=self._history)
+        self._durations[name].append(duration)
+
+    def stats(self):
+        """GPU durations [ms] per pass name: latest, mean and 95th percentile of the last history frames"""
+        result = {}
+        for name, durations in self._durations.items():
+            values = sorted(durations)
+            result[name] = {
+                "latest": durations[-1],
+                "mean": sum(values) / len(values),
+                "p95": values[math.ceil(0.95 * len(values)) - 1],
+                "count": len(values),
+            }
+        return result
+
+    def reset(self):
+        self._durations.clear()
+
+    def destroy(self):
+        for slot in self._slots:
+            slot.resolve_buffer.destroy()
+            slot.readback_buffer.destroy()
+        if self.enabled:
+            self._query_set.destroy()
+        self._slots = []
+        self.enabled = False
@@ -0,0 +1,202 @@
+"""Binary message framing used between the Python clients, the NiceGUI server and the browser
+
+A frame consists of a fixed prefix (magic, version, flags, header length), a small json header
+(message type, scalar data and a table of array sections) and the raw little-endian array sections.
+All sections start at multiples of ALIGNMENT bytes, such that they can be used as NumPy views
+(or JS typed arrays) of the received buffer without copying.
+
+Sections can optionally be compressed (byte-shuffle filter + zlib), compressed sections
+have to be decoded with decode_section. Sections can carry a content hash, sections the receiver
+already has (known_hashes) are sent as references without data.
+"""
+
+import hashlib
+import json
+import struct
+import time
+import zlib
+
+import numpy as np
+
+MAGIC = b"NGWB"
+VERSION = 3
+ALIGNMENT = 8
+
+# magic, version, flags (reserved), header length in bytes
+_PREFIX = struct.Struct("<4sHHI")
+PREFIX_SIZE = _PREFIX.size
+
+# section codecs, COMPRESSION_NONE sections are stored raw
+COMPRESSION_NONE = ""
+COMPRESSION_SHUFFLE_ZLIB = "shuffle-zlib"
+SUPPORTED_COMPRESSION = [COMPRESSION_SHUFFLE_ZLIB]
+# codec of sections sent as content hash only
+SECTION_REFERENCE = "ref"
+
+# sections smaller than this are never compressed
+COMPRESSION_MIN_SIZE = 2**16
+# higher levels are much slower for little gain on shuffled float data
+COMPRESSION_LEVEL = 1
+
+
+def _align(n):
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _as_array(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return np.frombuffer(value, dtype=np.uint8)
+    value = np.ascontiguousarray(value)
+    if value.dtype.byteorder == ">":
+        value = value.astype(value.dtype.newbyteorder("<"))
+    return value
+
+
+def shuffle(a):
+    """Byte-shuffle filter: stores byte k of all items contiguously (for k in range(itemsize))"""
+    a = a.reshape(-1)
+    return np.ascontiguousarray(a.view(np.uint8).reshape(a.shape[0], a.dtype.itemsize).T)
+
+
+def unshuffle(buffer, dtype, shape):
+    """Inverse of shuffle"""
+    dtype = np.dtype(dtype)
+    b = np.frombuffer(buffer, dtype=np.uint8).reshape(dtype.itemsize, -1)
+    return np.ascontiguousarray(b.T).view(dtype).reshape(shape)
+
+
+def section_hash(a):
+    """Content hash of an array section (raw bytes, independent of the compression)"""
+    return hashlib.blake2b(a.reshape(-1).view(np.uint8), digest_size=16).hexdigest()
+
+
+def _compress(a, level):
+    if a.dtype.itemsize > 1:
+        return zlib.compress(shuffle(a), level)
+    return zlib.compress(a, level)
+
+
+def encode_message(
+    type,
+    data=None,
+    arrays=None,
+    compression=COMPRESSION_NONE,
+    min_size=COMPRESSION_MIN_SIZE,
+    stats=None,
+    hash_sections=False,
+    known_hashes=None,
+):
+    """Encodes a message into a single bytearray.
+
+    data: json serializable dict with scalar values
+    arrays: dict name -> NumPy array or bytes-like object (stored as uint8)
+    compression: codec for array sections with at least min_size bytes, a section is stored raw
+        if compression does not make it smaller
+    stats: if given, this dict is filled with raw and encoded size, compression ratio and encode time
+    hash_sections: store the content hash of each section in the header
+    known_hashes: sections with a hash in this set are sent as reference only (implies hash_sections)
+
+    Uncompressed array data is copied exactly once (into the frame).
+    """
+    if compression not in (COMPRESSION_NONE, *SUPPORTED_COMPRESSION):
+        raise ValueError(f"unknown compression {compression}")
+    t0 = time.perf_counter()
+    arrays = {name: _as_array(value) for name, value in (arrays or {}).items()}
+
+    # section offsets are relative to the end of the (padded) header
+    sections = {}
+    stored = {}
+    offset = 0
+    for name, a in arrays.items():
+        codec = COMPRESSION_NONE
+        stored[name] = a.reshape(-1).view(np.uint8)
+        content_hash = ""
+        if hash_sections or known_hashes is not None:
+            content_hash = section_hash(a)
+        if known_hashes is not None and content_hash in known_hashes:
+            codec = SECTION_REFERENCE
+            stored[name] = stored[name][:0]
+        elif compression != COMPRESSION_NONE and a.nbytes >= min_size:
+            compressed = _compress(a, COMPRESSION_LEVEL)
+            if len(compressed) < a.nbytes:
+                codec = compression
+                stored[name] = np.frombuffer(compressed, dtype=np.uint8)
+        nbytes = stored[name].nbytes
+        sections[name] = [a.dtype.str, list(a.shape), offset, nbytes, codec, content_hash]
+        offset = _align(offset + nbytes)
+
+    header = json.dumps({"type": type, "data": data or {}, "arrays": sections}).encode("utf-8")
+    start = _align(_PREFIX.size + len(header))
+    header += b" " * (start - _PREFIX.size - len(header))
+
+    frame = bytearray(start + offset)
+    _PREFIX.pack_into(frame, 0, MAGIC, VERSION, 0, len(header))
+    frame[_PREFIX.size : start] = header
+    for name, section in stored.items():
+        target = np.frombuffer(
+            frame, np.uint8, count=section.nbytes, offset=start + sections[name][2]
+        )
+        target[:] = section
+
+    if stats is not None:
+        raw_nbytes = start + sum(a.nbytes for a in arrays.values())
+        stats["raw_nbytes"] = raw_nbytes
+        stats["nbytes"] = len(frame)
+        stats["ratio"] = raw_nbytes / len(frame)
+        stats["encode_time"] = time.perf_counter() - t0
+    return frame
+
+
+def header_size(prefix):
+    """Number of bytes of prefix and json header (= start of the array sections),
+    prefix must contain at least the first PREFIX_SIZE bytes of the frame"""
+    magic, version, _, size = _PREFIX.unpack_from(prefix, 0)
+    if magic != MAGIC:
+        raise ValueError("not a binary webgpu message")
+    if version != VERSION:
+        raise ValueError(f"unsupported message version {version}")
+    return _PREFIX.size + size
+
+
+def decode_header(buffer):
+    """Returns type, data and the array sections {name: (dtype, shape, offset, nbytes, codec, hash)} of a frame,
+    offsets are relative to the start of the frame, nbytes is the stored (possibly compressed) size,
+    hash is the content hash or "" if the sender did not hash the section.
+    buffer must contain at least the prefix and json header"""
+    start = header_size(buffer)
+    header = json.loads(bytes(buffer[_PREFIX.size : start]))
+    sections = {
+        name: (dtype, tuple(shape), start + offset, nbytes, codec, content_hash)
+        for name, (dtype, shape, offset, nbytes, codec, content_hash) in header["arrays"].items()
+    }
+    return header["type"], header["data"], sections
+
+
+def decode_section(buffer, dtype, shape, codec):
+    """Returns the array stored in buffer (the bytes of one section), raw sections are returned as views"""
+    dtype = np.dtype(dtype)
+    if codec == COMPRESSION_NONE:
+        return np.frombuffer(buffer, dtype=dtype).reshape(shape)
+    if codec == COMPRESSION_SHUFFLE_ZLIB:
+        raw = zlib.decompress(buffer)
+        if dtype.itemsize > 1:
+            return unshuffle(raw, dtype, shape)
+        return np.frombuffer(raw, dtype=dtype).reshape(shape)
+    if codec == SECTION_REFERENCE:
+        raise ValueError("referenced sections have to be looked up by their hash")
+    raise ValueError(f"unknown compression {codec}")
+
+
+def decode_message(buffer, stats=None):
+    """Returns type, data and arrays of a frame, uncompressed arrays are NumPy views into buffer (no copy).
+    If stats is given, the decode time is stored in it"""
+    t0 = time.perf_counter()
+    type, data, sections = decode_header(buffer)
+    view = memoryview(buffer)
+    arrays = {
+        name: decode_section(view[offset : offset + nbytes], dtype, shape, codec)
+        for name, (dtype, shape, offset, nbytes, codec, _) in sections.items()
+    }
+    if stats is not None:
+        stats["decode_time"] = time.perf_counter() - t0
+    return type, data, arrays
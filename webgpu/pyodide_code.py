@@ -2,12 +2,25 @@
 from .gpu import init_webgpu
 from .utils import *
 from .mesh import *
+from .scene import Scene
+from .protocol import (
+    COMPRESSION_NONE,
+    PREFIX_SIZE,
+    SECTION_REFERENCE,
+    decode_header,
+    decode_section,
+    header_size,
+)
+from collections import OrderedDict
+from pyodide.ffi import JsProxy
 import js
-import base64
+import time
 
 gpu = None
 mesh_object = None
-render_function = None
+scene = None
+# GPU buffers of the last draw call, reused by update_values
+buffers = None
 
 
 def cleanup():
@@ -55,22 +68,148 @@ async def reload(*args, **kwargs):
 
     await main()
 
-async def draw_cf(canvas_name, render_data):
-    global gpu, mesh_object, render_function
-    gpu = await init_webgpu(js.document.getElementById(canvas_name))
+class BufferStore:
+    """LRU store of GPU buffers keyed by the content hash of the message section they were created from.
+    Added and evicted hashes are collected and reported to the server (see pop_changes),
+    such that the server sends only the hash for sections that are stored here."""
+
+    def __init__(self, max_bytes=512 * 1024**2, max_entries=64):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._buffers = OrderedDict()
+        self._nbytes = 0
+        self._added = []
+        self._removed = []
+        self._reset = False
+
+    def get(self, key):
+        buffer = self._buffers.get(key)
+        if buffer is not None:
+            self._buffers.move_to_end(key)
+        return buffer
+
+    def put(self, key, buffer, in_use=()):
+        """Store buffer, buffers in in_use are not destroyed when they are evicted"""
+        self._buffers[key] = buffer
+        self._nbytes += buffer.size
+        self._added.append(key)
+        while len(self._buffers) > 1 and (
+            len(self._buffers) > self.max_entries or self._nbytes > self.max_bytes
+        ):
+            old_key, old_buffer = self._buffers.popitem(last=False)
+            self._nbytes -= old_buffer.size
+            self._removed.append(old_key)
+            if not any(old_buffer == b for b in in_use):
+                old_buffer.destroy()
+
+    def discard(self, buffer):
+        """Remove buffer (without destroying it), e.g. because its content is changed"""
+        for key, b in list(self._buffers.items()):
+            if b == buffer:
+                del self._buffers[key]
+                self._nbytes -= b.size
+                self._removed.append(key)
+
+    def clear(self):
+        """Forget all buffers (e.g. for a new device)"""
+        self._buffers.clear()
+        self._nbytes = 0
+        self._added = []
+        self._removed = []
+        self._reset = True
+
+    def pop_changes(self):
+        changes = {"reset": self._reset, "added": self._added, "removed": self._removed}
+        self._added = []
+        self._removed = []
+        self._reset = False
+        return changes
+
+
+buffer_store = BufferStore()
+
+
+async def _get_gpu(canvas_name):
+    """WebGPU instance of the canvas, the device is reused such that stored buffers stay valid"""
+    global gpu
+    canvas = js.document.getElementById(canvas_name)
+    if gpu is None or gpu.canvas != canvas:
+        gpu = await init_webgpu(canvas)
+        buffer_store.clear()
+    return gpu
+
+
+def _get_buffers(frame, in_use=()):
+    """Returns data and GPU buffers of all sections of a binary message.
+    Sections with content hash are taken from the buffer_store or added to it,
+    hashes of referenced sections that are not in the store are returned as missing."""
     device = Device(gpu.device)
-    edges = base64.b64decode(render_data.edges)
-    trigs = base64.b64decode(render_data.trigs)
-    cf_vals = base64.b64decode(render_data.trig_function_values)
-    edge_buffer = device.create_buffer(js.Uint8Array.new(edges),
-                                       js.GPUBufferUsage.STORAGE | js.GPUBufferUsage.COPY_DST)
-    trigs_buffer = device.create_buffer(js.Uint8Array.new(trigs),
-                                        js.GPUBufferUsage.STORAGE | js.GPUBufferUsage.COPY_DST)
-    cf_data_buffer = device.create_buffer(js.Uint8Array.new(cf_vals),
-                                          js.GPUBufferUsage.STORAGE | js.GPUBufferUsage.COPY_DST)
-    mesh_object = CFRenderObject(gpu, {"edges": edge_buffer, "trigs": trigs_buffer,
-                                   "trig_function_values" : cf_data_buffer }, render_data.n_trigs)
-    wireframe_object = WireFrameRenderer(gpu, {"edges": edge_buffer, "trigs": trigs_buffer}, render_data.n_trigs)
+    data, arrays, hashes = read_frame(frame)
+    buffers = {}
+    missing = []
+    for name, array in arrays.items():
+        key = hashes[name]
+        buffer = buffer_store.get(key) if key else None
+        if buffer is None:
+            if array is None:
+                missing.append(key)
+                continue
+            buffer = device.create_buffer(array, js.GPUBufferUsage.STORAGE | js.GPUBufferUsage.COPY_DST)
+            if key:
+                buffer_store.put(key, buffer, [*in_use, *buffers.values()])
+        buffers[name] = buffer
+    return data, buffers, missing
+
+
+def _buffer_changes(missing=()):
+    # returned to webgpu_scene.js, which reports it to the server
+    return to_js(buffer_store.pop_changes() | {"missing": list(missing)})
+
+
+def read_frame(frame):
+    """Decodes a binary message (JS ArrayBuffer), returns the data dict, the array sections
+    (Uint8Arrays for raw sections, NumPy arrays for compressed sections, None for sections sent as reference only)
+    and the content hashes of the sections.
+    Uncompressed sections are views into frame, only the header and compressed sections are copied to Python."""
+    t0 = time.perf_counter()
+    start = header_size(js.Uint8Array.new(frame, 0, PREFIX_SIZE).to_py())
+    _, data, sections = decode_header(js.Uint8Array.new(frame, 0, start).to_py())
+    arrays = {}
+    hashes = {}
+    raw_nbytes = start
+    for name, (dtype, shape, offset, nbytes, codec, content_hash) in sections.items():
+        hashes[name] = content_hash
+        if codec == SECTION_REFERENCE:
+            arrays[name] = None
+            continue
+        section = js.Uint8Array.new(frame, offset, nbytes)
+        if codec != COMPRESSION_NONE:
+            # NumPy array, uploaded from the WASM memory without another copy to JS
+            section = decode_section(section.to_py(), dtype, shape, codec)
+            raw_nbytes += section.nbytes
+        else:
+            raw_nbytes += section.length
+        arrays[name] = section
+    print(
+        f"received {frame.byteLength} bytes (ratio {raw_nbytes / frame.byteLength:.2f}), "
+        f"decode {1000 * (time.perf_counter() - t0):.1f} ms"
+    )
+    return data, arrays, hashes
+
+
+async def draw_cf(canvas_name, frame):
+    global gpu, mesh_object, scene, buffers
+    gpu = await _get_gpu(canvas_name)
+    render_data, new_buffers, missing = _get_buffers(frame, (buffers or {}).values())
+    if missing:
+        return _buffer_changes(missing)
+    buffers = new_buffers
+    edge_buffer = buffers["edges"]
+    trigs_buffer = buffers["trigs"]
+    # the shader is compiled only for the orders up to the one of the values (0: adaptive order, any order up to MAX_ORDER)
+    max_order = render_data.get("order") or MAX_ORDER
+    mesh_object = CFRenderObject(gpu, buffers, render_data["n_trigs"], max_order=max_order)
+    wireframe_object = WireFrameRenderer(gpu, {"edges": edge_buffer, "trigs": trigs_buffer}, render_data["n_edges"])
 
     # move mesh to center and scale it
     for i in [0, 5, 10]:
@@ -82,44 +221,53 @@ async def draw_cf(canvas_name, render_data):
     gpu.uniforms.mat[12] = -0.5 * 1.8
     gpu.uniforms.mat[13] = -0.5 * 1.8
 
-    t_last = 0
-    fps = 0
-    frame_counter = 0
-
-    def render(time):
-        nonlocal t_last, fps, frame_counter
-        dt = time - t_last
-        t_last = time
-        frame_counter += 1
-        print(f"frame time {dt:.2f} ms")
-        gpu.uniforms.update_buffer()
-        gpu.uniforms.update_buffer()
-
-        command_encoder = gpu.device.createCommandEncoder()
-
-        mesh_object.render(command_encoder)
-        wireframe_object.render(command_encoder, loadOp="load")
-
-        gpu.device.queue.submit([command_encoder.finish()])
-        if frame_counter < 20:
-            js.requestAnimationFrame(render_function)
-    render_function = create_proxy(render)
-    gpu.input_handler.render_function = render_function
-    render_function.request_id = js.requestAnimationFrame(render_function)
+    scene = Scene(gpu, [mesh_object, wireframe_object])
+    gpu.set_render_function(scene.render)
+    return _buffer_changes()
     
 
-async def draw_mesh(canvas_name, render_data):
-    global gpu, mesh_object, render_function
-    gpu = await init_webgpu(js.document.getElementById(canvas_name))
+async def update_values(canvas_name, frame):
+    """Replace the function values of the last draw_cf call, reuses device, geometry buffers and pipelines"""
+    global mesh_object
+    if not isinstance(mesh_object, CFRenderObject) or buffers is None:
+        raise RuntimeError("update_values needs a function drawn with draw_cf")
+    render_data, arrays, hashes = read_frame(frame)
+    values = arrays["trig_function_values"]
+    if values is None:
+        # sent as reference only, the server sends the message again with data
+        return _buffer_changes([hashes["trig_function_values"]])
+    # the content changes, the buffer must not be reused for its old hash
+    buffer_store.discard(buffers["trig_function_values"])
     device = Device(gpu.device)
-    edges = base64.b64decode(render_data.edges)
-    trigs = base64.b64decode(render_data.trigs)
-    edge_buffer = device.create_buffer(js.Uint8Array.new(edges),
-                                       js.GPUBufferUsage.STORAGE | js.GPUBufferUsage.COPY_DST)
-    trigs_buffer = device.create_buffer(js.Uint8Array.new(trigs),
-                                        js.GPUBufferUsage.STORAGE | js.GPUBufferUsage.COPY_DST)
-    mesh_object = MeshRenderObject(gpu, {"edges": edge_buffer, "trigs": trigs_buffer}, render_data.n_trigs)
-    wireframe_object = WireFrameRenderer(gpu, {"edges": edge_buffer, "trigs": trigs_buffer}, render_data.n_trigs)
+    nbytes = values.length if isinstance(values, JsProxy) else values.nbytes
+    max_order = render_data.get("order") or MAX_ORDER
+    if nbytes == buffers["trig_function_values"].size and max_order == mesh_object.max_order:
+        device.write_buffer(buffers["trig_function_values"], values)
+    else:
+        # different order or number of components, the bind group must reference the new buffer
+        # and the shader must support the new order
+        buffers["trig_function_values"].destroy()
+        buffers["trig_function_values"] = device.create_buffer(
+            values, js.GPUBufferUsage.STORAGE | js.GPUBufferUsage.COPY_DST
+        )
+        new_object = CFRenderObject(gpu, buffers, mesh_object.n_trigs, max_order=max_order)
+        scene.replace(mesh_object, new_object)
+        mesh_object = new_object
+    gpu.invalidate()
+    return _buffer_changes()
+
+
+async def draw_mesh(canvas_name, frame):
+    global gpu, mesh_object, scene, buffers
+    gpu = await _get_gpu(canvas_name)
+    render_data, new_buffers, missing = _get_buffers(frame, (buffers or {}).values())
+    if missing:
+        return _buffer_changes(missing)
+    buffers = new_buffers
+    edge_buffer = buffers["edges"]
+    trigs_buffer = buffers["trigs"]
+    mesh_object = MeshRenderObject(gpu, {"edges": edge_buffer, "trigs": trigs_buffer}, render_data["n_trigs"])
+    wireframe_object = WireFrameRenderer(gpu, {"edges": edge_buffer, "trigs": trigs_buffer}, render_data["n_edges"])
 
     # move mesh to center and scale it
     for i in [0, 5, 10]:
@@ -131,27 +279,6 @@ async def draw_mesh(canvas_name, render_data):
     gpu.uniforms.mat[12] = -0.5 * 1.8
     gpu.uniforms.mat[13] = -0.5 * 1.8
 
-    t_last = 0
-    fps = 0
-    frame_counter = 0
-
-    def render(time):
-        nonlocal t_last, fps, frame_counter
-        dt = time - t_last
-        t_last = time
-        frame_counter += 1
-        print(f"frame time {dt:.2f} ms")
-        gpu.uniforms.update_buffer()
-        gpu.uniforms.update_buffer()
-
-        command_encoder = gpu.device.createCommandEncoder()
-
-        mesh_object.render(command_encoder)
-        wireframe_object.render(command_encoder, loadOp="load")
-
-        gpu.device.queue.submit([command_encoder.finish()])
-        if frame_counter < 20:
-            js.requestAnimationFrame(render_function)
-    render_function = create_proxy(render)
-    gpu.input_handler.render_function = render_function
-    render_function.request_id = js.requestAnimationFrame(render_function)
+    scene = Scene(gpu, [mesh_object, wireframe_object])
+    gpu.set_render_function(scene.render)
+    return _buffer_changes()
@@ -1,20 +1,105 @@
 
+import hashlib
+import math
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 import ngsolve as ngs
 import numpy as np
-import math
 
-def create_mesh_data(mesh):
-    points = evaluate_cf(ngs.CF((ngs.x, ngs.y, ngs.z)), mesh.Region(ngs.VOL), order=1)
+# number of header entries (number of components and order) in front of the function values
+VALUES_OFFSET = 2
+
+# storage formats of the function values, must match the FORMAT_* constants in shader.wgsl
+# the format is stored together with the order in the second header entry (order + 256 * format)
+FORMAT_F32 = 0
+FORMAT_F16 = 1
+FORMAT_UNORM16 = 2
+
+# number of elements evaluated at once in evaluate_cf, bounds the size of temporary arrays
+CHUNK_SIZE = 2**16
+
+_element_rule = ngs.IntegrationRule([(0, 0)], [0])
+
+# netgen surface element types TRIG and TRIG6 (the first three nodes are the vertices)
+_TRIG_TYPES = [10, 12]
+
+
+def get_vertices_and_index(mesh):
+    """Returns the unique mesh vertices as (n_vertices, 3) float32 array and the
+    triangle vertex numbers as (n_trigs, 3) uint32 array, both taken directly from the netgen mesh.
+    The vertex order within a triangle matches the barycentric coordinates used in the shaders.
+    Raises ValueError for meshes with other surface elements than triangles (e.g. quads).
+    """
+    ngmesh = mesh.ngmesh
+    elements = ngmesh.Elements2D().NumPy()
+    types = np.unique(elements["type"])
+    unsupported = np.setdiff1d(types, _TRIG_TYPES)
+    if unsupported.size:
+        raise ValueError(
+            f"Only triangle meshes are supported, found netgen element types {unsupported.tolist()}"
+        )
+    coords = ngmesh.Coordinates()
+    vertices = np.zeros((coords.shape[0], 3), dtype=np.float32)
+    vertices[:, : coords.shape[1]] = coords
+
+    # netgen point numbers are 1-based, reverse vertex order to match the Bernstein basis ordering
+    nodes = elements["nodes"]
+    index = np.empty((nodes.shape[0], 3), dtype=np.uint32)
+    np.subtract(nodes[:, 2::-1], 1, out=index, casting="unsafe")
+    return vertices, index
+
+
+def get_edge_index(index):
+    """Returns the unique edges of the triangles given by index as (n_edges, 2) uint32 array,
+    edges shared by two triangles are only stored once"""
+    pairs = index[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    pairs.sort(axis=1)
+    keys = (pairs[:, 0].astype(np.uint64) << np.uint64(32)) | pairs[:, 1]
+    keys = np.unique(keys)
+    edges = np.empty((keys.shape[0], 2), dtype=np.uint32)
+    edges[:, 0] = keys >> np.uint64(32)
+    edges[:, 1] = keys & np.uint64(0xFFFFFFFF)
+    return edges
+
 
-    n_trigs = len(mesh.ngmesh.Elements2D())
+def create_indexed_mesh_data(mesh, use_cache=True):
+    """Mesh geometry as unique vertices, triangle index and edge index buffers (for MeshRenderObjectIndexed and WireFrameRenderer)"""
+    if use_cache:
+        return geometry_cache.get(mesh, "indexed", _create_indexed_mesh_data)
+    return _create_indexed_mesh_data(mesh)
+
+
+def _create_indexed_mesh_data(mesh):
+    vertices, index = get_vertices_and_index(mesh)
+    edge_index = get_edge_index(index)
+    return {
+        "vertices": vertices.tobytes(),
+        "index": index.tobytes(),
+        "edge_index": edge_index.tobytes(),
+        "n_trigs": index.shape[0],
+        "n_edges": edge_index.shape[0],
+        "n_vertices": vertices.shape[0],
+    }
+
+
+def create_mesh_data(mesh, use_cache=True):
+    """Mesh geometry as "trigs" (3 points per triangle) and "edges" (2 points per unique edge) buffers"""
+    if use_cache:
+        return geometry_cache.get(mesh, "trigs", _create_mesh_data)
+    return _create_mesh_data(mesh)
+
+
+def _create_mesh_data(mesh):
+    vertices, index = get_vertices_and_index(mesh)
+    n_trigs = index.shape[0]
+    trig_points = vertices[index]
+    edge_index = get_edge_index(index)
+    edge_data = vertices[edge_index].tobytes()
 
-    edge_points = points[2:].reshape(-1, 3, 3)
-    edges = np.zeros((n_trigs, 3, 2, 3), dtype=np.float32)
-    for i in range(3):
-        edges[:, i, 0, :] = edge_points[:, i, :]
-        edges[:, i, 1, :] = edge_points[:, (i + 1) % 3, :]
-    edge_data = edges.flatten().tobytes()
-    
     trigs = np.zeros(
         n_trigs,
         dtype=[
@@ -22,65 +107,498 @@ def create_mesh_data(mesh):
             ("index", np.int32),  # index (i32)
         ],
     )
-    trigs["p"] = points[2:].flatten().reshape(-1, 9)
-    trigs["index"] = [1] * n_trigs
-    return { "edges" : edge_data, "trigs" : trigs.tobytes(), "n_trigs" : n_trigs }
+    trigs["p"] = trig_points.reshape(-1, 9)
+    trigs["index"] = 1
+    return {
+        "edges": edge_data,
+        "trigs": trigs.tobytes(),
+        "n_trigs": n_trigs,
+        "n_edges": edge_index.shape[0],
+    }
+
+
+def encode_values(values, format=FORMAT_F16):
+    """Compact encoding of the function values returned by evaluate_cf, decoded in get{Trig,Seg}Value in eval.wgsl.
+    Returns a uint32 array (the header entries are float32 values).
+
+    FORMAT_F16: values are rounded to float16, two values per u32. Relative error <= 2**-11 for |v| >= 2**-14,
+    absolute error <= 2**-25 below. Finite values with |v| > 65504 cannot be represented (ValueError),
+    NaN and inf are stored as they are.
+    FORMAT_UNORM16: values are normalized to [0,1] using the global min/max (stored as two float32 after the header)
+    and stored as 16 bit unsigned ints, two values per u32. Absolute error <= (max - min) / 131070
+    plus the float32 rounding of the decoding (<= 2**-23 * max(|min|, |max|)), constant values are exact.
+    NaN and inf cannot be normalized (ValueError).
+    """
+    if format == FORMAT_F32:
+        return values.view(np.uint32)
+    data = values[VALUES_OFFSET:]
+    n = data.shape[0]
+    scale_size = 2 if format == FORMAT_UNORM16 else 0
+    ret = np.zeros(VALUES_OFFSET + scale_size + (n + 1) // 2, dtype=np.uint32)
+    header = ret[: VALUES_OFFSET + scale_size].view(np.float32)
+    header[0] = values[0]
+    header[1] = values[1] + 256 * format
+    halves = ret[VALUES_OFFSET + scale_size :].view("<u2")
+
+    if format == FORMAT_F16:
+        finite = data[np.isfinite(data)]
+        if finite.size and np.abs(finite).max() > np.finfo(np.float16).max:
+            raise ValueError("Values exceed float16 range, use FORMAT_UNORM16")
+        halves.view("<f2")[:n] = data
+    elif format == FORMAT_UNORM16:
+        if not np.isfinite(data).all():
+            raise ValueError("FORMAT_UNORM16 needs finite values")
+        vmin = data.min() if n else 0.0
+        vmax = data.max() if n else 0.0
+        header[VALUES_OFFSET] = vmin
+        header[VALUES_OFFSET + 1] = vmax
+        scale = 65535.0 / (vmax - vmin) if vmax > vmin else 0.0
+        halves[:n] = np.rint((data - vmin) * scale)
+    else:
+        raise ValueError(f"Unknown format {format}")
+    return ret
+
 
-def create_cf_data(cf, mesh, order):
+def decode_values(encoded):
+    """Inverse of encode_values (same computations as in the shader), returns the float32 values as returned by evaluate_cf"""
+    encoded = np.asarray(encoded).view(np.uint32)
+    header = encoded[:VALUES_OFFSET].view(np.float32)
+    ncomp = int(header[0])
+    order = int(header[1]) & 0xFF
+    format = int(header[1]) >> 8
+    if format == FORMAT_F32:
+        return encoded.view(np.float32)
+
+    n = _count_values(encoded, ncomp, order, format)
+    values = np.empty(VALUES_OFFSET + n, dtype=np.float32)
+    values[0] = ncomp
+    values[1] = order
+    if format == FORMAT_F16:
+        values[VALUES_OFFSET:] = encoded[VALUES_OFFSET:].view("<f2")[:n]
+    elif format == FORMAT_UNORM16:
+        vmin, vmax = encoded[VALUES_OFFSET : VALUES_OFFSET + 2].view(np.float32)
+        v = encoded[VALUES_OFFSET + 2 :].view("<u2")[:n] / np.float32(65535.0)
+        values[VALUES_OFFSET:] = vmin + v * (vmax - vmin)
+    else:
+        raise ValueError(f"Unknown format {format}")
+    return values
+
+
+def _count_values(encoded, ncomp, order, format):
+    """Number of values in an encoded buffer (the last u32 may contain only one 16 bit value)"""
+    ndof = (order + 1) * (order + 2) // 2
+    n_words = encoded.shape[0] - VALUES_OFFSET - (2 if format == FORMAT_UNORM16 else 0)
+    values_per_element = ndof * ncomp
+    return (2 * n_words // values_per_element) * values_per_element
+
+
+def _mesh_stamp(mesh):
+    """Changes whenever the mesh is modified (refined, curved, ...)"""
+    return (getattr(mesh.ngmesh, "_timestamp", None), mesh.ne, mesh.nv)
+
+
+def mesh_content_key(mesh):
+    """Hash of the vertex coordinates and triangles of the mesh, equal for copies of a mesh
+    (e.g. unpickled again for every draw call in the NiceGUI app)"""
+    ngmesh = mesh.ngmesh
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(ngmesh.Coordinates()).tobytes())
+    digest.update(np.ascontiguousarray(ngmesh.Elements2D().NumPy()["nodes"]).tobytes())
+    return digest.hexdigest()
+
+
+class GeometryCache:
+    """LRU cache for mesh geometry data (dictionaries with bytes values as returned by create_mesh_data),
+    keyed by the content of the mesh (see mesh_content_key), such that copies of a mesh share the entries.
+    The content key is computed once per mesh object and modification stamp.
+
+    Least recently used entries are dropped as soon as the total size exceeds max_bytes or the number of entries exceeds max_entries.
+    Thread safe, the data is created outside of the lock (concurrent misses of the same entry may create it twice).
+    """
+
+    def __init__(self, max_bytes=512 * 1024**2, max_entries=16):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # (content key, kind) -> (data, nbytes)
+        self._entries = OrderedDict()
+        # id(mesh) -> (weakref to mesh, stamp, content key)
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def content_key(self, mesh):
+        """mesh_content_key(mesh), computed once per mesh object and modification stamp"""
+        stamp = _mesh_stamp(mesh)
+        mesh_id = id(mesh)
+        with self._lock:
+            entry = self._keys.get(mesh_id)
+        if entry is not None and entry[0]() is mesh and entry[1] == stamp:
+            return entry[2]
+        key = mesh_content_key(mesh)
+        # the weakref callback may run during any allocation (also with the lock held), dict.pop is atomic
+        ref = weakref.ref(mesh, lambda _: self._keys.pop(mesh_id, None))
+        with self._lock:
+            self._keys[mesh_id] = (ref, stamp, key)
+        return key
+
+    def get(self, mesh, kind, create_function):
+        """Returns a (shallow) copy of the cached data, calls create_function(mesh) on a miss"""
+        key = (self.content_key(mesh), kind)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return dict(entry[0])
+            self.misses += 1
+
+        data = create_function(mesh)
+        nbytes = sum(len(v) for v in data.values() if isinstance(v, bytes))
+        if nbytes <= self.max_bytes:
+            with self._lock:
+                if key in self._entries:
+                    # created concurrently by another thread
+                    self._remove(key)
+                self._entries[key] = (data, nbytes)
+                self.nbytes += nbytes
+                self._evict()
+        return dict(data)
+
+    def resize(self, max_bytes=None, max_entries=None):
+        with self._lock:
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            if max_entries is not None:
+                self.max_entries = max_entries
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "nbytes": self.nbytes,
+            }
+
+    # _remove and _evict are called with the lock held
+    def _remove(self, key):
+        self.nbytes -= self._entries.pop(key)[1]
+
+    def _evict(self):
+        while self._entries and (
+            self.nbytes > self.max_bytes or len(self._entries) > self.max_entries
+        ):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+
+geometry_cache = GeometryCache()
+
+
+def create_cf_data(cf, mesh, order, workers=1, format=FORMAT_F32, adaptive_tol=None):
+    """Mesh data and function values, with adaptive_tol given the order is chosen per element (see evaluate_cf_adaptive)"""
     data = create_mesh_data(mesh)
-    data["cf"] = evaluate_cf(cf, mesh.Region(ngs.VOL), order).tobytes()
+    region = mesh.Region(ngs.VOL)
+    if adaptive_tol is not None:
+        if format != FORMAT_F32:
+            raise ValueError("Adaptive order is only supported with FORMAT_F32")
+        data["cf"] = evaluate_cf_adaptive(cf, region, order, adaptive_tol).tobytes()
+        return data
+    values = evaluate_cf(cf, region, order, workers=workers)
+    data["cf"] = encode_values(values, format).tobytes()
     return data
 
-def evaluate_cf(cf, region, order):
+def evaluate_cf(cf, region, order, chunk_size=CHUNK_SIZE, workers=1, use_processes=False):
     """Evaluate a coefficient function on a mesh and returns the values as a flat array, ready to copy to the GPU as storage buffer.
     The first two entries are the function dimension and the polynomial order of the stored values.
+    The elements are processed in chunks of chunk_size elements to bound the memory needed for temporary arrays.
+
+    With workers > 1 (None: number of cores) the element range is split into one range per worker (at most chunk_size elements each),
+    which are distributed to a thread pool (NGSolve and NumPy release the GIL),
+    or to a process pool if use_processes is set (cf and region must be picklable then).
+    The result does not depend on the number of workers.
     """
     comps = cf.dim
-    import ngsolve.webgui as ngwg
-    int_points = ngwg._make_trig(order)
-    intrule = ngs.IntegrationRule(
-        int_points,
-        [
-            0,
-        ]
-        * len(int_points),
-    )
-    ibmat = _get_bernstein_matrix_trig(order, intrule).I
+    bernstein = get_bernstein_trig(order)
+    element_points = _map_elements(region)
+    n_elements = len(element_points)
 
-    ndof = ibmat.h
+    ret = np.empty(VALUES_OFFSET + n_elements * bernstein.ndof * comps, dtype=np.float32)
+    ret[0] = comps
+    ret[1] = order
+    if n_elements == 0:
+        # empty region, header only
+        return ret
+    values = ret[VALUES_OFFSET:].reshape(n_elements, -1)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    # at least one range per worker, at most chunk_size elements per range
+    range_size = max(min(chunk_size, math.ceil(n_elements / workers)), 1)
+    ranges = [
+        (first, min(first + range_size, n_elements))
+        for first in range(0, n_elements, range_size)
+    ]
 
-    pts = region.mesh.MapToAllElements(
-        {ngs.ET.TRIG: intrule, ngs.ET.QUAD: intrule}, region
+    if workers == 1 or len(ranges) <= 1:
+        for first, last in ranges:
+            _evaluate_chunk(cf, element_points[first:last], bernstein, values[first:last])
+    elif use_processes:
+        with ProcessPoolExecutor(
+            workers, initializer=_init_worker, initargs=(cf, region, order)
+        ) as pool:
+            for (first, last), chunk in zip(ranges, pool.map(_evaluate_range, ranges)):
+                values[first:last] = chunk
+    else:
+
+        def evaluate_range(first_last):
+            first, last = first_last
+            _evaluate_chunk(cf, element_points[first:last], bernstein, values[first:last])
+
+        with ThreadPoolExecutor(workers) as pool:
+            # consume the results to propagate exceptions
+            list(pool.map(evaluate_range, ranges))
+    return ret
+
+
+_worker_data = None
+
+
+def _init_worker(cf, region, order):
+    global _worker_data
+    _worker_data = (cf, _map_elements(region), get_bernstein_trig(order))
+
+
+def _evaluate_range(first_last):
+    first, last = first_last
+    cf, element_points, bernstein = _worker_data
+    values = np.empty((last - first, bernstein.ndof * cf.dim), dtype=np.float32)
+    _evaluate_chunk(cf, element_points[first:last], bernstein, values)
+    return values
+
+
+def evaluate_cf_chunks(cf, region, order, chunk_size=CHUNK_SIZE):
+    """Streaming version of evaluate_cf, returns the total size in bytes of the data and a generator yielding
+    (byte_offset, values) tuples, values being float32 arrays with the header or the data of at most chunk_size elements.
+    Copying all chunks to the given offsets results in the same buffer as evaluate_cf.
+    """
+    comps = cf.dim
+    bernstein = get_bernstein_trig(order)
+    element_points = _map_elements(region)
+    n_elements = len(element_points)
+    values_per_element = bernstein.ndof * comps
+    nbytes = 4 * (VALUES_OFFSET + n_elements * values_per_element)
+
+    def chunks():
+        yield 0, np.array([comps, order], dtype=np.float32)
+        for first in range(0, n_elements, chunk_size):
+            elements = element_points[first : first + chunk_size]
+            values = np.empty(len(elements) * values_per_element, dtype=np.float32)
+            _evaluate_chunk(cf, elements, bernstein, values)
+            yield 4 * (VALUES_OFFSET + first * values_per_element), values
+
+    return nbytes, chunks()
+
+
+def _map_elements(region):
+    """One mesh point per element of the region, used as template to map the interpolation points chunk by chunk"""
+    return region.mesh.MapToAllElements(
+        {ngs.ET.TRIG: _element_rule, ngs.ET.QUAD: _element_rule}, region
     )
-    pmat = cf(pts)
-    pmat = pmat.reshape(-1, ndof, comps)
 
-    values = np.zeros((ndof, pmat.shape[0], comps), dtype=np.float32)
-    for i in range(comps):
-        ngsmat = ngs.Matrix(pmat[:, :, i].transpose())
-        values[:, :, i] = ibmat * ngsmat
 
-    values = values.transpose((1, 0, 2)).flatten()
-    ret = np.concatenate(([np.float32(cf.dim), np.float32(order)], values))
+def _evaluate_points(cf, element_points, bernstein):
+    """Evaluate cf in the interpolation points of the given elements, returns array of shape (n_elements, ndof, cf.dim)"""
+    ndof = bernstein.ndof
+    n_elements = len(element_points)
+    pts = np.repeat(element_points, ndof)
+    pts["x"] = np.tile(bernstein.points[:, 0], n_elements)
+    pts["y"] = np.tile(bernstein.points[:, 1], n_elements)
+    return cf(pts).reshape(n_elements, ndof, cf.dim)
+
+
+def _evaluate_chunk(cf, element_points, bernstein, out):
+    """Evaluate cf in the interpolation points of the given elements and write the Bernstein coefficients to out"""
+    pmat = _evaluate_points(cf, element_points, bernstein)
+    _bernstein_coefficients(bernstein.ibmat, pmat, out)
+
+
+def evaluate_cf_adaptive(cf, region, max_order, tol, chunk_size=CHUNK_SIZE):
+    """Like evaluate_cf, but every element stores the lowest order <= max_order which reproduces
+    the order max_order interpolant in its interpolation points up to the absolute tolerance tol.
+
+    Returns a uint32 array (float32 values stored as bit patterns) with layout
+      [ncomp, 0 (order 0 means adaptive order)]  header (float32)
+      [offset << 3 | order] * n_elements          element table, offset is the index of the first coefficient
+      coefficient blocks of variable size         float32, same layout per element as in evaluate_cf
+    The table is decoded in eval{Trig,Seg} in eval.wgsl
+    """
+    comps = cf.dim
+    bernstein = get_bernstein_trig(max_order)
+    element_points = _map_elements(region)
+    n_elements = len(element_points)
+
+    orders = np.empty(n_elements, dtype=np.uint32)
+    coefficients = []
+    for first in range(0, n_elements, chunk_size):
+        pmat = _evaluate_points(cf, element_points[first : first + chunk_size], bernstein)
+        chunk_orders = np.full(pmat.shape[0], max_order, dtype=np.uint32)
+        undecided = np.ones(pmat.shape[0], dtype=bool)
+        chunk_coefficients = {}
+        for order in range(1, max_order + 1):
+            if order < max_order:
+                reduction, to_coefficients = _get_order_reduction(order, max_order)
+                error = np.abs(pmat - np.matmul(reduction, pmat)).max(axis=(1, 2))
+                selected = undecided & (error <= tol)
+            else:
+                to_coefficients = bernstein.ibmat
+                selected = undecided.copy()
+            undecided &= ~selected
+            chunk_orders[selected] = order
+            if selected.any():
+                chunk_coefficients[order] = (
+                    np.flatnonzero(selected) + first,
+                    np.matmul(to_coefficients, pmat[selected]).astype(np.float32),
+                )
+        orders[first : first + pmat.shape[0]] = chunk_orders
+        coefficients.append(chunk_coefficients)
+
+    sizes = (orders + 1) * (orders + 2) // 2 * comps
+    offsets = np.empty(n_elements, dtype=np.uint64)
+    offsets[:1] = 0
+    np.cumsum(sizes[:-1], out=offsets[1:])
+    offsets += VALUES_OFFSET + n_elements
+    total_size = int(offsets[-1] + sizes[-1]) if n_elements else VALUES_OFFSET
+    if total_size >= 2**29:
+        raise ValueError("Too many values for adaptive order table")
+
+    ret = np.empty(total_size, dtype=np.uint32)
+    fret = ret.view(np.float32)
+    fret[0] = comps
+    fret[1] = 0
+    ret[VALUES_OFFSET : VALUES_OFFSET + n_elements] = (offsets << np.uint64(3)) | orders
+    for chunk_coefficients in coefficients:
+        for order, (elements, values) in chunk_coefficients.items():
+            block = np.arange(values[0].size)
+            fret[offsets[elements].astype(np.int64)[:, None] + block] = values.reshape(
+                len(elements), -1
+            )
     return ret
 
-def _get_bernstein_matrix_trig(n, intrule):
-    """Create inverse vandermonde matrix for the Bernstein basis functions on a triangle of degree n and given integration points"""
-    ndtrig = int((n + 1) * (n + 2) / 2)
-
-    mat = ngs.Matrix(ndtrig, ndtrig)
-    fac_n = math.factorial(n)
-    for row, ip in enumerate(intrule):
-        col = 0
-        x = ip.point[0]
-        y = ip.point[1]
-        z = 1.0 - x - y
-        for i in range(n + 1):
-            factor = fac_n / math.factorial(i) * x**i
-            for j in range(n + 1 - i):
-                k = n - i - j
-                factor2 = 1.0 / (math.factorial(j) * math.factorial(k))
-                mat[row, col] = factor * factor2 * y**j * z**k
-                col += 1
-    return mat
 
+_order_reduction_cache = {}
+
+
+def _get_order_reduction(order, max_order):
+    """Matrices to reduce point values at the order max_order interpolation points to order order:
+    reduction: point values -> values of the order interpolant in the same points
+    to_coefficients: point values -> Bernstein coefficients of the order interpolant
+    """
+    key = (order, max_order)
+    if key not in _order_reduction_cache:
+        high = get_bernstein_trig(max_order)
+        low = get_bernstein_trig(order)
+        # values of the max_order polynomial in the low order interpolation points
+        restrict = _get_bernstein_matrix_trig(max_order, low.points) @ high.ibmat
+        to_coefficients = low.ibmat @ restrict
+        reduction = _get_bernstein_matrix_trig(order, high.points) @ to_coefficients
+        _order_reduction_cache[key] = (reduction, to_coefficients)
+    return _order_reduction_cache[key]
+
+
+def _bernstein_coefficients(ibmat, pmat, out):
+    """Convert point values pmat (nel, ndof, comps) to Bernstein coefficients,
+    written into the flat (float32) array out in the element-major layout expected by evalTrig in eval.wgsl
+    """
+    nel, ndof, comps = pmat.shape
+    if comps == 1:
+        # single matrix-matrix product, no broadcasting over elements needed
+        np.matmul(pmat.reshape(nel, ndof), ibmat.T, out=out.reshape(nel, ndof))
+    else:
+        np.matmul(ibmat, pmat, out=out.reshape(nel, ndof, comps))
+    return out
+
+
+class BernsteinTrig:
+    """Precomputed data to convert point values on a triangle to Bernstein coefficients of given order
+
+    points: (ndof, 2) array with the reference coordinates of the interpolation points
+    ibmat: (ndof, ndof) inverse Vandermonde matrix, coefficients = ibmat @ point_values
+    intrule: ngsolve IntegrationRule with the interpolation points (used for MapToAllElements)
+    """
+
+    def __init__(self, order):
+        self.order = order
+        self.points = _make_trig_points(order)
+        self.ndof = len(self.points)
+        self.ibmat = np.linalg.inv(_get_bernstein_matrix_trig(order, self.points))
+        self.intrule = ngs.IntegrationRule(
+            [tuple(p) for p in self.points.tolist()], [0] * self.ndof
+        )
+
+
+_bernstein_cache = OrderedDict()
+_bernstein_cache_size = 8
+# get_bernstein_trig is called from worker threads (evaluate_cf, NiceGUI executor)
+_bernstein_lock = threading.Lock()
+
+
+def get_bernstein_trig(order):
+    """Returns the (cached) BernsteinTrig data for the given order"""
+    with _bernstein_lock:
+        data = _bernstein_cache.get(order)
+        if data is not None:
+            _bernstein_cache.move_to_end(order)
+            return data
+    data = BernsteinTrig(order)
+    with _bernstein_lock:
+        # keep the instance of a concurrent call, if any
+        data = _bernstein_cache.setdefault(order, data)
+        _bernstein_cache.move_to_end(order)
+        while len(_bernstein_cache) > _bernstein_cache_size:
+            _bernstein_cache.popitem(last=False)
+    return data
+
+
+def set_bernstein_cache_size(size):
+    """Set the maximum number of orders kept in the Bernstein cache, least recently used orders are dropped first"""
+    global _bernstein_cache_size
+    with _bernstein_lock:
+        _bernstein_cache_size = max(int(size), 0)
+        while len(_bernstein_cache) > _bernstein_cache_size:
+            _bernstein_cache.popitem(last=False)
+
+
+def clear_bernstein_cache():
+    with _bernstein_lock:
+        _bernstein_cache.clear()
+
+
+def _make_trig_points(n):
+    """Equidistant points on the reference triangle, same ordering as ngsolve.webgui._make_trig"""
+    j, i = np.array([(j, i) for j in range(n + 1) for i in range(n + 1 - j)]).T
+    return np.stack((i / n, j / n), axis=1)
+
+
+def _get_bernstein_matrix_trig(n, points):
+    """Create vandermonde matrix for the Bernstein basis functions on a triangle of degree n and given points"""
+    ij = np.array([(i, j) for i in range(n + 1) for j in range(n + 1 - i)])
+    i, j = ij.T
+    k = n - i - j
+    fac = np.array([math.factorial(m) for m in range(n + 1)], dtype=np.float64)
+    coeffs = fac[n] / (fac[i] * fac[j] * fac[k])
+
+    x = points[:, 0:1]
+    y = points[:, 1:2]
+    z = 1.0 - x - y
+    return coeffs * x**i * y**j * z**k
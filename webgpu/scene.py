@@ -0,0 +1,76 @@
+class Scene:
+    """List of render objects that are drawn in a single render pass per frame.
+
+    Objects with pipeline, bind_group and draw(render_pass) are recorded into one shared pass,
+    sorted by pipeline and bind group (in order of first appearance) such that state changes are minimal.
+    Other objects (e.g. MeshRenderObjectDeferred, which needs its own passes) are rendered before with render(encoder),
+    their number of passes is given by the attribute render_passes (default 1).
+
+    Use scene.render as render function of the WebGPU instance (gpu.set_render_function(scene.render)),
+    stats contains the numbers of the last frame."""
+
+    def __init__(self, gpu, objects=()):
+        self.gpu = gpu
+        self.objects = list(objects)
+        self.stats = {
+            "passes": 0,
+            "draws": 0,
+            "pipeline_changes": 0,
+            "bind_group_changes": 0,
+        }
+
+    def add(self, obj):
+        self.objects.append(obj)
+        self.gpu.invalidate()
+
+    def remove(self, obj):
+        self.objects.remove(obj)
+        self.gpu.invalidate()
+
+    def replace(self, old, new):
+        self.objects[self.objects.index(old)] = new
+        self.gpu.invalidate()
+
+    def clear(self):
+        self.objects.clear()
+        self.gpu.invalidate()
+
+    def _sorted_draws(self):
+        draws = [obj for obj in self.objects if hasattr(obj, "draw")]
+        pipelines = {}
+        bind_groups = {}
+        for obj in draws:
+            pipelines.setdefault(id(obj.pipeline), len(pipelines))
+            bind_groups.setdefault(id(obj.bind_group), len(bind_groups))
+        return sorted(
+            draws, key=lambda obj: (pipelines[id(obj.pipeline)], bind_groups[id(obj.bind_group)])
+        )
+
+    def render(self, encoder):
+        stats = dict.fromkeys(self.stats, 0)
+        load_op = "clear"
+        for obj in self.objects:
+            if not hasattr(obj, "draw"):
+                obj.render(encoder)
+                stats["passes"] += getattr(obj, "render_passes", 1)
+                load_op = "load"
+
+        draws = self._sorted_draws()
+        if draws or not stats["passes"]:
+            # an empty scene still clears the canvas
+            render_pass = self.gpu.begin_render_pass(encoder, loadOp=load_op, label="scene")
+            pipeline = bind_group = None
+            for obj in draws:
+                if obj.pipeline is not pipeline:
+                    pipeline = obj.pipeline
+                    render_pass.setPipeline(pipeline)
+                    stats["pipeline_changes"] += 1
+                if obj.bind_group is not bind_group:
+                    bind_group = obj.bind_group
+                    render_pass.setBindGroup(0, bind_group)
+                    stats["bind_group_changes"] += 1
+                obj.draw(render_pass)
+                stats["draws"] += 1
+            render_pass.end()
+            stats["passes"] += 1
+        self.stats = stats
@@ -0,0 +1,72 @@
+"""On-demand frame scheduling: frames are only rendered after the scene changed
+
+Does not depend on js, the browser functions are passed in (see WebGPU in gpu.py),
+so the scheduling can be tested with a fake clock and frame queue.
+"""
+
+import time
+
+
+def _clock():
+    return 1000 * time.perf_counter()
+
+
+class FrameScheduler:
+    """Calls render(timestamp) in the next animation frame after invalidate() was called.
+
+    Any number of invalidations between two frames result in one frame, at most one
+    frame request is pending at any time and nothing is rendered while the scene does not change.
+
+    request_frame() requests a call of on_frame(timestamp) in the next animation frame
+    (js.requestAnimationFrame) and returns an id for cancel_frame(id) (js.cancelAnimationFrame).
+    clock() returns the current time in ms, it is used for the render time statistics only.
+    """
+
+    def __init__(self, render, request_frame, cancel_frame=None, clock=_clock):
+        self.render = render
+        self.request_frame = request_frame
+        self.cancel_frame = cancel_frame
+        self.clock = clock
+        self.dirty = False
+        self._pending = None
+        self.stats = {
+            "invalidations": 0,
+            "requests": 0,
+            "frames": 0,
+            "render_time": 0.0,
+            "last_render_time": 0.0,
+        }
+
+    @property
+    def pending(self):
+        """A frame is requested and not rendered yet"""
+        return self._pending is not None
+
+    def invalidate(self):
+        """Marks the scene as changed, the next animation frame renders it"""
+        self.dirty = True
+        self.stats["invalidations"] += 1
+        if self._pending is None:
+            self.stats["requests"] += 1
+            self._pending = self.request_frame()
+
+    def on_frame(self, timestamp=None):
+        """Animation frame callback, returns True if a frame was rendered"""
+        self._pending = None
+        if not self.dirty:
+            return False
+        # cleared before rendering, render may invalidate again (e.g. for animations)
+        self.dirty = False
+        t0 = self.clock()
+        self.render(t0 if timestamp is None else timestamp)
+        dt = self.clock() - t0
+        self.stats["frames"] += 1
+        self.stats["render_time"] += dt
+        self.stats["last_render_time"] = dt
+        return True
+
+    def cancel(self):
+        """Cancels a pending frame request, the scene stays dirty"""
+        if self._pending is not None and self.cancel_frame is not None:
+            self.cancel_frame(self._pending)
+        self._pending = None
@@ -16,19 +16,25 @@ struct Uniforms {
 
 const VALUES_OFFSET: u32 = 2; // storing number of components and order of basis functions in first two entries
 
+// storage format of the function values, stored as order + 256 * format in the second header entry
+const FORMAT_F32: u32 = 0;
+const FORMAT_F16: u32 = 1; // two f16 values per u32
+const FORMAT_UNORM16: u32 = 2; // global min, max (f32) followed by two normalized u16 values per u32
+
 @group(0) @binding(0) var<uniform> uniforms : Uniforms;
 @group(0) @binding(1) var colormap : texture_1d<f32>;
 @group(0) @binding(2) var colormap_sampler : sampler;
 
 @group(0) @binding(4) var<storage> edges_p1 : array<EdgeP1>;
 @group(0) @binding(5) var<storage> trigs_p1 : array<TrigP1>;
-@group(0) @binding(6) var<storage> trig_function_values : array<f32>;
-@group(0) @binding(7) var<storage> seg_function_values : array<f32>;
+@group(0) @binding(6) var<storage> trig_function_values : array<u32>; // f32 or packed 16 bit values, see FORMAT_*
+@group(0) @binding(7) var<storage> seg_function_values : array<u32>;
 @group(0) @binding(8) var<storage> vertices : array<f32>;
 @group(0) @binding(9) var<storage> index : array<u32>;
 
 @group(0) @binding(10) var gBufferLam : texture_2d<f32>;
-// @group(0) @binding(11) var gBufferDepth : texture_depth_2d;
+@group(0) @binding(11) var<storage> edge_index : array<u32>;
+// @group(0) @binding(12) var gBufferDepth : texture_depth_2d;
 
 struct VertexOutput1d {
   @builtin(position) fragPosition: vec4<f32>,
@@ -82,6 +88,20 @@ fn mainVertexEdgeP1(@builtin(vertex_index) vertexId: u32, @builtin(instance_inde
     return VertexOutput1d(position, p, lam, edgeId);
 }
 
+@vertex
+fn mainVertexEdgeP1Indexed(@builtin(vertex_index) vertexId: u32, @builtin(instance_index) edgeId: u32) -> VertexOutput1d {
+    let vid = edge_index[2 * edgeId + vertexId];
+    var p = vec3<f32>(vertices[3 * vid], vertices[3 * vid + 1], vertices[3 * vid + 2]);
+
+    var lam: f32 = 0.0;
+    if vertexId == 0 {
+        lam = 1.0;
+    }
+
+    var position = calcPosition(p);
+    return VertexOutput1d(position, p, lam, edgeId);
+}
+
 @vertex
 fn mainVertexTrigP1(@builtin(vertex_index) vertexId: u32, @builtin(instance_index) trigId: u32) -> VertexOutput2d {
     let trig = trigs_p1[trigId];
@@ -177,4 +197,4 @@ fn mainVertexDeferred(@builtin(vertex_index) vertexId: u32) -> VertexOutputDefer
     return VertexOutputDeferred(position);
 }
 
-
+#include "eval.wgsl"
@@ -0,0 +1,8 @@
+// time of each loading stage (ms since page load), the first call per stage counts.
+// Shared by the loaders (init.js, nicegui/webgpu_scene.js, webgpu/jupyter.py)
+window.webgpu_timings = window.webgpu_timings || {};
+window.webgpu_mark = function (stage) {
+  if (stage in webgpu_timings) return;
+  webgpu_timings[stage] = performance.now();
+  console.log(`webgpu stage ${stage}: ${webgpu_timings[stage].toFixed(0)} ms`);
+};
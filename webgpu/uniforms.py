@@ -2,7 +2,7 @@ import ctypes as ct
 
 import js
 
-from .utils import UniformBinding, to_js
+from .utils import UniformBinding, to_js, write_buffer
 
 
 # These values must match the numbers defined in the shader
@@ -17,6 +17,7 @@ class Binding:
     VERTICES = 8
     INDEX = 9
     GBUFFERLAM = 10
+    EDGE_INDEX = 11
 
 
 class ClippingPlaneUniform(ct.Structure):
@@ -47,6 +48,8 @@ class Uniforms(ct.Structure):
 
     def __init__(self, device):
         self.device = device
+        # data of the last upload, see update_buffer
+        self._uploaded = None
         self.do_clipping = 1
         self.clipping_plane.normal[0] = 1
         self.clipping_plane.normal[1] = 0
@@ -81,9 +84,12 @@ class Uniforms(ct.Structure):
         return [UniformBinding(Binding.UNIFORMS, self.buffer)]
 
     def update_buffer(self):
-        """Copy the current data to the GPU buffer"""
-        data = js.Uint8Array.new(bytes(self))
-        self.device.queue.writeBuffer(self.buffer, 0, data)
+        """Copy the current data to the GPU buffer if it changed since the last upload"""
+        data = bytes(self)
+        if data == self._uploaded:
+            return
+        write_buffer(self.device, self.buffer, data)
+        self._uploaded = data
 
     def __del__(self):
         self.buffer.destroy()
@@ -1,9 +1,13 @@
-from pathlib import Path
+import json
+import time
+from contextlib import contextmanager
 
 import js
-from pyodide.ffi import create_proxy
+from pyodide.ffi import JsProxy, create_once_callable, create_proxy
 from pyodide.ffi import to_js as _to_js
 
+from .wgsl import assemble, content_hash
+
 
 class ShaderStage:
     VERTEX = 0x1
@@ -16,6 +20,41 @@ def to_js(value):
     return _to_js(value, dict_converter=js.Object.fromEntries)
 
 
+@contextmanager
+def js_bytes(data):
+    """Yields data as JS Uint8Array without intermediate copies.
+    NumPy arrays and other bytes-like objects are exposed as view into the WASM memory,
+    the view is only valid inside the with block (it is detached when the WASM memory grows).
+    JS typed arrays are passed through (reinterpreted as bytes)"""
+    if isinstance(data, JsProxy):
+        yield js.Uint8Array.new(data.buffer, data.byteOffset, data.byteLength)
+        return
+    view = memoryview(data)
+    if not view.c_contiguous:
+        view = memoryview(view.tobytes())
+    proxy = create_proxy(view.cast("B"))
+    buffer = proxy.getBuffer("u8")
+    try:
+        yield buffer.data
+    finally:
+        buffer.release()
+        proxy.destroy()
+
+
+def write_buffer(device, buffer, data, offset=0):
+    """Copy data (NumPy array, bytes-like object or JS typed array) to a GPU buffer with COPY_DST usage,
+    the data is copied once (by writeBuffer) directly from the WASM memory"""
+    with js_bytes(data) as view:
+        device.queue.writeBuffer(buffer, offset, view)
+
+
+def mark_stage(name):
+    """Record the time of a loading stage like "first_frame" (only the first call per stage counts),
+    see webgpu_mark in the javascript loaders"""
+    if hasattr(js, "webgpu_mark"):
+        js.webgpu_mark(name)
+
+
 # any object that has a binding number (uniform, storage buffer, texture etc.)
 class BaseBinding:
     def __init__(
@@ -97,21 +136,82 @@ class BufferBinding(BaseBinding):
         )
 
 
+class PipelineCache:
+    """Shader modules, bind group layouts, pipeline layouts and render pipelines of one GPU device,
+    keyed by their descriptors (shader modules by the hash of the source code).
+    The objects are kept alive by the cache, so they can be identified by id() in the keys of dependent objects"""
+
+    def __init__(self):
+        self._objects = {}
+        self._keys = {}
+        self.stats = {}
+        self.clear()
+
+    def clear(self):
+        self._objects.clear()
+        self._keys.clear()
+        self.stats.update(
+            shader_hits=0,
+            shader_misses=0,
+            pipeline_hits=0,
+            pipeline_misses=0,
+            compile_time=0.0,
+        )
+
+    def key(self, kind, descriptor):
+        """Cache key of a descriptor, GPU objects in it are replaced by their own keys (must be cached)"""
+
+        def object_key(obj):
+            key = self._keys.get(id(obj))
+            if key is None:
+                raise ValueError(
+                    f"{kind} descriptor references an object that was not created by this cache: {obj!r}"
+                )
+            return key
+
+        descriptor = {k: v for k, v in descriptor.items() if k != "label"}
+        return kind + ":" + json.dumps(descriptor, sort_keys=True, default=object_key)
+
+    def get(self, key, create, stat=None):
+        """Returns the cached object for key or creates it (create()),
+        stat is the prefix of the hit/miss counters, creation time is added to compile_time"""
+        obj = self._objects.get(key)
+        if obj is not None:
+            if stat:
+                self.stats[stat + "_hits"] += 1
+            return obj
+        t0 = time.perf_counter()
+        obj = create()
+        if stat:
+            self.stats[stat + "_misses"] += 1
+            self.stats["compile_time"] += time.perf_counter() - t0
+        self._objects[key] = obj
+        self._keys[id(obj)] = key
+        return obj
+
+
 class Device:
-    """Helper class to wrap device functions"""
+    """Helper class to wrap device functions,
+    pass the pipeline_cache of the WebGPU instance to share compiled pipelines between render objects"""
 
-    def __init__(self, device):
+    def __init__(self, device, pipeline_cache=None):
         self.device = device
+        self.pipeline_cache = pipeline_cache if pipeline_cache is not None else PipelineCache()
 
     def create_bind_group(self, bindings: list, label=""):
-        """creates bind group layout and bind group from a list of BaseBinding objects"""
+        """creates bind group layout and bind group from a list of BaseBinding objects,
+        the layout is cached"""
         layouts = []
         resources = []
         for binding in bindings:
             layouts.append(binding.layout)
             resources.append(binding.binding)
 
-        layout = self.device.createBindGroupLayout(to_js({"entries": layouts}))
+        descriptor = {"entries": layouts}
+        layout = self.pipeline_cache.get(
+            self.pipeline_cache.key("bind_group_layout", descriptor),
+            lambda: self.device.createBindGroupLayout(to_js(descriptor)),
+        )
         group = self.device.createBindGroup(
             to_js(
                 {
@@ -124,17 +224,62 @@ class Device:
         return layout, group
 
     def create_pipeline_layout(self, binding_layout, label=""):
-        return self.device.createPipelineLayout(
-            to_js({"label": label, "bindGroupLayouts": [binding_layout]})
+        descriptor = {"label": label, "bindGroupLayouts": [binding_layout]}
+        return self.pipeline_cache.get(
+            self.pipeline_cache.key("pipeline_layout", descriptor),
+            lambda: self.device.createPipelineLayout(to_js(descriptor)),
+        )
+
+    def create_render_pipeline(self, descriptor):
+        """Returns a cached render pipeline for the descriptor (label is ignored)
+        or creates a new one, layout and shader modules must be created by this class"""
+        return self.pipeline_cache.get(
+            self.pipeline_cache.key("render_pipeline", descriptor),
+            lambda: self.device.createRenderPipeline(to_js(descriptor)),
+            "pipeline",
+        )
+
+    def create_buffer(self, data, usage=js.GPUBufferUsage.STORAGE, label=""):
+        """Creates a GPU buffer, data is either the size in bytes or the content
+        (NumPy array, bytes-like object or JS typed array).
+        The content is copied once into the buffer mapped at creation, no intermediate bytes objects are created"""
+        if isinstance(data, int):
+            return self.device.createBuffer(
+                to_js({"label": label, "size": data, "usage": usage})
+            )
+        size = data.byteLength if isinstance(data, JsProxy) else memoryview(data).nbytes
+        buffer = self.device.createBuffer(
+            to_js(
+                {
+                    "label": label,
+                    # mapped buffers must have a size that is a multiple of 4
+                    "size": (size + 3) // 4 * 4,
+                    "usage": usage,
+                    "mappedAtCreation": True,
+                }
+            )
         )
+        target = js.Uint8Array.new(buffer.getMappedRange(), 0, size)
+        # the view into the WASM memory is only opened for the copy, allocations
+        # (e.g. in to_js or createBuffer) may grow the WASM memory and detach it
+        with js_bytes(data) as view:
+            target.set(view)
+        buffer.unmap()
+        return buffer
+
+    def write_buffer(self, buffer, data, offset=0):
+        write_buffer(self.device, buffer, data, offset)
 
-    def create_buffer(self, data, usage=js.GPUBufferUsage.STORAGE):
-        buf = self.device.createBuffer(to_js({"size": len(data), "usage": usage}))
-        self.device.queue.writeBuffer(buf, 0, data)
-        return buf
+    def compile_files(self, *files, entry_points=None, defines=None):
+        """Compiles the .wgsl files of the package (see wgsl.assemble), with entry_points given
+        all code not used by them is stripped from the module"""
+        return self.compile_code(assemble(files, entry_points, defines))
 
-    def compile_files(self, *files):
-        code = ""
-        for file in files:
-            code += Path(file).read_text()
-        return self.device.createShaderModule(to_js({"code": code}))
+    def compile_code(self, code):
+        """Returns the (cached) shader module for the WGSL source code"""
+        key = "shader:" + content_hash(code)
+        return self.pipeline_cache.get(
+            key,
+            lambda: self.device.createShaderModule(to_js({"code": code})),
+            "shader",
+        )
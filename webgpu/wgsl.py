@@ -0,0 +1,285 @@
+"""Assembly of WGSL shader modules from the .wgsl files of this package
+
+Supports a small preprocessor (#include "file.wgsl", #define NAME value, #if/#ifdef/#ifndef/#else/#endif)
+and strips all declarations that are not reachable from the given entry points, such that the driver
+only compiles the functions a pipeline actually uses (e.g. evalTrigP2 instead of evalTrigP1..P6).
+
+Does not depend on js or ngsolve, module sizes can be reported without a GPU:
+    python wgsl.py shader.wgsl --entry-points mainVertexTrigP1 mainFragmentTrig -D MAX_ORDER=2
+"""
+
+import ast
+import hashlib
+import operator
+import re
+from pathlib import Path
+
+SHADER_DIR = Path(__file__).parent
+
+_identifier = re.compile(r"\b[A-Za-z_]\w*\b")
+_comments = re.compile(r"//[^\n]*|/\*.*?\*/", re.DOTALL)
+_member_access = re.compile(r"\.\s*[A-Za-z_]\w*")
+_declaration = re.compile(
+    r"^(?:@\w+(?:\([^)]*\))?\s*)*(fn|struct|const|override|alias|var(?:<[^>]*>)?)\s+(\w+)"
+)
+
+# file contents (read once) and assembled modules, keyed by their inputs
+_sources = {}
+_modules = {}
+
+
+def clear_cache():
+    _sources.clear()
+    _modules.clear()
+
+
+def _resolve(file, parent=SHADER_DIR):
+    path = Path(file)
+    if not path.is_absolute():
+        path = parent / path
+    return path.resolve()
+
+
+def read_source(path):
+    path = _resolve(path)
+    if path not in _sources:
+        _sources[path] = path.read_text()
+    return _sources[path]
+
+
+_operators = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+}
+
+
+def _evaluate(node):
+    # integer expressions with comparisons and and/or/not, e.g. "MAX_ORDER >= 2 and FORMAT == 1"
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return node.value
+    if isinstance(node, ast.BoolOp):
+        values = [_evaluate(v) for v in node.values]
+        return all(values) if isinstance(node.op, ast.And) else any(values)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return not _evaluate(node.operand)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        return -_evaluate(node.operand)
+    if isinstance(node, ast.BinOp) and type(node.op) in _operators:
+        return _operators[type(node.op)](_evaluate(node.left), _evaluate(node.right))
+    if isinstance(node, ast.Compare):
+        left = _evaluate(node.left)
+        for op, right in zip(node.ops, node.comparators):
+            right = _evaluate(right)
+            if type(op) not in _operators or not _operators[type(op)](left, right):
+                return False
+            left = right
+        return True
+    raise ValueError(f"unsupported expression in #if: {ast.unparse(node)}")
+
+
+def _substitute(line, defines):
+    if not defines:
+        return line
+    return _identifier.sub(lambda m: str(defines.get(m.group(0), m.group(0))), line)
+
+
+def preprocess(code, defines=None, path=None, _included=None, _including=None):
+    """Expands #include, #define and conditional blocks, returns plain WGSL.
+    defines (dict name -> value) are applied before the #define directives in the code,
+    included files are resolved relative to the including file (or SHADER_DIR) and included only once,
+    a file including itself (directly or indirectly) raises SyntaxError"""
+    defines = {} if defines is None else defines
+    included = set() if _included is None else _included
+    # files currently being expanded, to detect include cycles
+    including = (() if path is None else (path,)) if _including is None else _including
+    if path is not None:
+        included.add(path)
+    parent = path.parent if path is not None else SHADER_DIR
+    lines = []
+    # stack of (active, branch taken) for the conditional blocks
+    stack = []
+    active = True
+    for number, line in enumerate(code.splitlines(), 1):
+        stripped = line.strip()
+        if not stripped.startswith("#"):
+            if active:
+                lines.append(_substitute(line, defines))
+            continue
+
+        directive, _, argument = stripped[1:].partition(" ")
+        argument = argument.strip()
+        if directive in ("if", "ifdef", "ifndef"):
+            if directive == "ifdef":
+                condition = argument in defines
+            elif directive == "ifndef":
+                condition = argument not in defines
+            else:
+                expression = ast.parse(_substitute(argument, defines), mode="eval")
+                condition = bool(_evaluate(expression))
+            stack.append((active, condition))
+            active = active and condition
+        elif directive == "else":
+            if not stack:
+                raise SyntaxError(f"{path or 'wgsl'}:{number}: #else without #if")
+            outer, taken = stack[-1]
+            stack[-1] = (outer, True)
+            active = outer and not taken
+        elif directive == "endif":
+            if not stack:
+                raise SyntaxError(f"{path or 'wgsl'}:{number}: #endif without #if")
+            active = stack.pop()[0]
+        elif not active:
+            continue
+        elif directive == "define":
+            name, _, value = argument.partition(" ")
+            defines[name] = value.strip()
+        elif directive == "include":
+            include = _resolve(argument.strip('"<>'), parent)
+            if include in including:
+                cycle = " -> ".join(p.name for p in including + (include,))
+                raise SyntaxError(f"{path or 'wgsl'}:{number}: #include cycle {cycle}")
+            if include not in included:
+                included.add(include)
+                lines.append(
+                    preprocess(read_source(include), defines, include, included, including + (include,))
+                )
+        else:
+            raise SyntaxError(f"{path or 'wgsl'}:{number}: unknown directive #{directive}")
+    if stack:
+        raise SyntaxError(f"{path or 'wgsl'}: missing #endif")
+    return "\n".join(lines)
+
+
+def parse_declarations(code):
+    """Splits WGSL code (without comments) into top level declarations,
+    returns a list of (name, text), name is None for directives like "enable f16;" """
+    declarations = []
+    depth = 0
+    start = 0
+    for i, c in enumerate(code):
+        if c in "({[":
+            depth += 1
+        elif c in ")}]":
+            depth -= 1
+        if depth:
+            continue
+        if c == ";" or (c == "}" and re.match(r"\s*(?:@\w+(?:\([^)]*\))?\s*)*fn\b", code[start:])):
+            end = i + 1
+        elif c == "}":
+            # struct declarations may or may not end with ;
+            following = code[i + 1 :].lstrip()
+            if following.startswith(";"):
+                continue
+            end = i + 1
+        else:
+            continue
+        text = code[start:end].strip()
+        if text and text != ";":
+            match = _declaration.match(text)
+            declarations.append((match.group(2) if match else None, text))
+        start = end
+    if code[start:].strip():
+        raise SyntaxError(f"incomplete declaration at the end of the shader: {code[start:].strip()[:50]}")
+    return declarations
+
+
+def _references(text):
+    # identifiers used in a declaration without member accesses (a.name), may contain
+    # local names (parameters, fields) that shadow global ones, which only keeps a bit more code
+    return set(_identifier.findall(_member_access.sub("", text)))
+
+
+def strip_unused(code, entry_points):
+    """Removes comments and all declarations that are not reachable from the entry points"""
+    declarations = parse_declarations(_comments.sub("", code))
+    names = {name for name, _ in declarations if name}
+    missing = set(entry_points) - names
+    if missing:
+        raise ValueError(f"entry points not found in shader: {sorted(missing)}")
+
+    dependencies = {
+        name: _references(text) & names - {name} for name, text in declarations if name
+    }
+    reachable = set()
+    todo = list(entry_points)
+    while todo:
+        name = todo.pop()
+        if name not in reachable:
+            reachable.add(name)
+            todo.extend(dependencies[name])
+    return "\n\n".join(text for name, text in declarations if name is None or name in reachable) + "\n"
+
+
+def assemble(files, entry_points=None, defines=None):
+    """Returns the WGSL code of a shader module: the preprocessed files
+    (relative to SHADER_DIR, each included once), stripped to the declarations used by entry_points if given.
+    The result is cached, files are read only once"""
+    key = (
+        tuple(str(_resolve(file)) for file in files),
+        tuple(sorted(entry_points)) if entry_points else None,
+        tuple(sorted((name, str(value)) for name, value in (defines or {}).items())),
+    )
+    if key not in _modules:
+        included = set()
+        parts = []
+        # #define directives of one file apply to the following files as well
+        all_defines = dict(defines or {})
+        for file in files:
+            path = _resolve(file)
+            if path not in included:
+                included.add(path)
+                parts.append(preprocess(read_source(path), all_defines, path, included))
+        code = "\n".join(parts)
+        if entry_points:
+            code = strip_unused(code, entry_points)
+        _modules[key] = code
+    return _modules[key]
+
+
+def content_hash(code):
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def size_report(files, entry_points, defines=None):
+    """Sizes of a module before and after stripping (bytes and number of functions)"""
+    full = assemble(files, None, defines)
+    stripped = assemble(files, entry_points, defines)
+    return {
+        "full_bytes": len(full.encode("utf-8")),
+        "stripped_bytes": len(stripped.encode("utf-8")),
+        "full_functions": len(re.findall(r"\bfn\s+\w+", full)),
+        "stripped_functions": len(re.findall(r"\bfn\s+\w+", stripped)),
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("files", nargs="+", help="wgsl files (relative to the webgpu package)")
+    parser.add_argument("--entry-points", nargs="+", required=True)
+    parser.add_argument("-D", dest="defines", action="append", default=[], help="NAME=VALUE")
+    parser.add_argument("--print", action="store_true", help="print the stripped module")
+    args = parser.parse_args()
+
+    defines = dict(define.partition("=")[::2] for define in args.defines)
+    report = size_report(args.files, args.entry_points, defines)
+    print(
+        f"{report['full_bytes']} -> {report['stripped_bytes']} bytes, "
+        f"{report['full_functions']} -> {report['stripped_functions']} functions"
+    )
+    if args.print:
+        print(assemble(args.files, args.entry_points, defines))
+
+
+if __name__ == "__main__":
+    main()